@@ -1,12 +1,24 @@
+import os
+import queue
+import struct
+from fractions import Fraction
+import threading
 import time
 import wave
-from pyaudio import PyAudio, paInt16, paContinue
+from typing import Iterator
+import numpy as np
 #from pynput import keyboard
 
+from sound2font.tracemodule import span
+
+# pyaudio (and with it PortAudio) is only imported, when a Microphone or Speaker is created.
+# AudioData, AudioBuffer and the WAV functions work without it, e.g. in batch workers.
+PA_INT16 = 8  # pyaudio.paInt16
+
 MIC_DEFAULTS = {
     "rate": 44100,
     "channels": 1,
-    "format": paInt16,
+    "format": PA_INT16,
     "input": True,
     "input_device_index": None,  # Use default device
     "frames_per_buffer": 1024
@@ -15,31 +27,174 @@ MIC_DEFAULTS = {
 SPEAKER_DEFAULTS = {
     "rate": 44100,
     "channels": 1,
-    "format": paInt16,
+    "format": PA_INT16,
     "output": True,
     "output_device_index": None,  # Use default device
     "frames_per_buffer": 1024
 }
 
+# NumPy sample types for the sample widths of paUInt8, paInt16 and paInt32.
+# 8-bit WAV samples are unsigned, with silence at 128 (see to_float32()).
+SAMPLE_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+# Resampling filter: a windowed sinc with RESAMPLE_ZEROS zero crossings on each side (Kaiser window, beta RESAMPLE_BETA),
+# cut off at RESAMPLE_ROLLOFF times the lower of the two Nyquist frequencies, so downsampling does not alias.
+RESAMPLE_ZEROS = 64
+RESAMPLE_BETA = 8.6
+RESAMPLE_ROLLOFF = 0.95
+RESAMPLE_BLOCK = 1 << 18  # Input samples per block.
+# Bytes moved at once, when a wrapped around AudioBuffer is unrolled in place.
+ROTATE_BLOCK = 1 << 16
+
+def _polyphase_filter(up: int, down: int, dtype: type) -> tuple[np.ndarray, int]:
+    # One filter per output phase r, i.e. per output time r * down / up (in input samples, after the block start).
+    # Returns the filters as columns of a (down + 2 * K) x up matrix over the input offsets -K ... down + K - 1, and K.
+    cutoff = 0.5 * min(1., up / down) * RESAMPLE_ROLLOFF  # Cycles per input sample.
+    half_width = RESAMPLE_ZEROS / (2 * cutoff)
+    k = int(np.ceil(half_width))
+    distance = (np.arange(up) * down / up)[:, None] - np.arange(-k, down + k)[None, :]
+    window = np.i0(RESAMPLE_BETA * np.sqrt(np.clip(1 - (distance / half_width) ** 2, 0, None))) / np.i0(RESAMPLE_BETA)
+    table = np.where(np.abs(distance) < half_width, np.sinc(2 * cutoff * distance) * window, 0.)
+    table /= table.sum(axis=1, keepdims=True)  # Unity gain at DC for every phase.
+    return table.T.astype(dtype), k
+
+def resample(samples: np.ndarray, rate: int, target_rate: int, block_size: int = RESAMPLE_BLOCK) -> np.ndarray:
+    # Band-limited polyphase resampling (windowed sinc, see RESAMPLE_ZEROS), block by block.
+    # Memory beyond the output is bounded by block_size, whatever the length of the recording.
+    # The signal is zero outside its ends, so the end does not leak into the start.
+    # float64 samples give float64, anything else (including integer samples, converted per block) float32.
+    if rate == target_rate:
+        return samples
+    dtype = np.float64 if samples.dtype == np.float64 else np.float32
+    n = len(samples)
+    m = int(round(n * target_rate / rate))
+    ratio = Fraction(int(target_rate), int(rate))
+    if ratio.denominator > 1000:
+        # Unusual rates: keep the filter table small. Changes the speed by a few parts per million.
+        ratio = ratio.limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+    table, k = _polyphase_filter(up, down, dtype)
+    # Output q * up + r is the dot product of input samples q * down - k ... q * down + down + k - 1 with filter r.
+    periods = -(-m // up)
+    out = np.empty(periods * up, dtype=dtype)
+    step = max(block_size // down, 1)
+    for q0 in range(0, periods, step):
+        q1 = min(q0 + step, periods)
+        start, stop = q0 * down - k, (q1 - 1) * down + down + k
+        segment = np.zeros(stop - start, dtype=dtype)
+        lo, hi = max(start, 0), min(stop, n)
+        if hi > lo:
+            segment[lo - start:hi - start] = samples[lo:hi]
+        windows = np.lib.stride_tricks.sliding_window_view(segment, len(table))[::down]
+        out[q0 * up:q1 * up] = (windows @ table).ravel()
+    return out[:m]
+
+def to_float32(samples: np.ndarray, rate: int = None, target_rate: int = None, channels: int = 1) -> np.ndarray:
+    # Mono float32 samples in [-1, 1) from integer samples, e.g. for faster_whisper.
+    # If target_rate differs from rate, the samples are resampled once, straight from the integer samples.
+    if samples.dtype == np.uint8:
+        # 8-bit WAV samples are unsigned. Silence is 128.
+        samples = samples.astype(np.float32) - 128
+        scale = np.float32(1 / 128)
+    else:
+        scale = np.float32(1 / -np.iinfo(samples.dtype).min)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    if target_rate is not None and target_rate != rate:
+        if rate is None:
+            raise ValueError(f"The sample rate is needed to resample to {target_rate} Hz.")
+        samples = resample(samples, rate, target_rate)
+        samples *= scale
+        return samples
+    return samples * scale  # The only copy: int to float32.
+
+def read_wav_header(filename: str) -> dict:
+    # Format and position of the sample data in a PCM WAV file, without reading the samples.
+    # Returns a dict with "channels", "rate", "sample_width", "offset" and "size" (of the data chunk, in bytes).
+    header = {}
+    with open(filename, "rb") as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:] != b"WAVE":
+            raise ValueError(f"{filename} is not a WAV file.")
+        file_size = os.fstat(f.fileno()).st_size
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"{filename} has no data chunk.")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size + chunk_size % 2)
+                format_tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                # 1: PCM, 0xFFFE: WAVE_FORMAT_EXTENSIBLE (PCM as well, for the sample widths in SAMPLE_DTYPES).
+                if format_tag not in (1, 0xFFFE):
+                    raise ValueError(f"{filename} is not PCM (format {format_tag}).")
+                header.update(channels=channels, rate=rate, sample_width=(bits + 7) // 8)
+            elif chunk_id == b"data":
+                if "sample_width" not in header:
+                    raise ValueError(f"{filename} has no fmt chunk before the data chunk.")
+                offset = f.tell()
+                # Truncated recordings may claim more data than there is. Whole frames only.
+                frame_size = header["channels"] * header["sample_width"]
+                size = min(chunk_size, file_size - offset) // frame_size * frame_size
+                header.update(offset=offset, size=size)
+                return header
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)  # Chunks are padded to an even size.
+
+def iter_wav_chunks(filename: str, chunk_frames: int = 8000) -> Iterator[bytes]:
+    # Yields the samples of a WAV file in chunks of chunk_frames frames, e.g. for Speech2Text_vosk.stream().
+    # Only one chunk is in memory at a time.
+    with wave.open(filename, "rb") as wf:
+        while True:
+            chunk = wf.readframes(chunk_frames)
+            if not chunk:
+                return
+            yield chunk
+
+def _sample_dtype(sample_width: int) -> type:
+    if sample_width not in SAMPLE_DTYPES:
+        raise ValueError(f"Sample width {sample_width} not supported. Supported: {list(SAMPLE_DTYPES)}")
+    return SAMPLE_DTYPES[sample_width]
+
+def _reverse(data: np.ndarray, block: int = ROTATE_BLOCK) -> None:
+    # Reverses data in place. Swaps blocks from both ends through a temporary of at most block elements.
+    n = len(data)
+    for i in range(0, n // 2, block):
+        size = min(block, n // 2 - i)
+        left, right = data[i:i + size], data[n - i - size:n - i]
+        saved = left[::-1].copy()
+        left[:] = right[::-1]
+        right[:] = saved
+
+def _rotate_left(data: np.ndarray, shift: int) -> None:
+    # data[:] = np.roll(data, -shift) in place, without a temporary of the size of data.
+    _reverse(data[:shift])
+    _reverse(data[shift:])
+    _reverse(data)
+
 class AudioData(bytearray):
     # Subclass of bytearray.
     # self.sample_width comes from pyaudio via the Microphone class.
-    # If an extension step in Microphone.record would make AudioData exceed self.max_var_size,
-    # a silent AudioData is returned to avoid memory overflow, e.g. because of a failure to stop the recording.
+    # extend() raises a MemoryError if AudioData would exceed self.max_var_size.
+    # write() appends as much as fits instead, and sets self.overflowed if not everything did.
 
     def __init__(self, sample_width: int, max_var_size: int = 5e7, max_file_size: int = 1e8):
         super().__init__()
         self.max_var_size = max_var_size
         self.max_file_size = max_file_size
         self.sample_width = sample_width
+        self.overflowed = False
 
     @classmethod
     def load(cls, filename):
+        # Reads all frames in one call. max_var_size is raised to the size of the file, if needed.
+        # For files that should not be copied into memory, see AudioBuffer.load().
         with wave.open(filename, "rb") as wf:
+            data = wf.readframes(wf.getnframes())
             loaded = cls(sample_width=wf.getsampwidth())
-            for _ in range(wf.getnframes()):
-                loaded.extend(wf.readframes(1))
-            return loaded
+        loaded.max_var_size = max(loaded.max_var_size, len(data))
+        loaded.extend(data)
+        return loaded
 
     def extend(self, in_data):
         self.check_size(in_data)
@@ -52,6 +207,15 @@ class AudioData(bytearray):
                               f"Max size: {self.max_var_size} Actual size: {new_size}\n"
                               "Did not append new chunk.")
 
+    def write(self, in_data) -> int:
+        # Appends whole samples, as long as there is space. Returns the number of bytes written.
+        space = int(self.max_var_size) - len(self)
+        if len(in_data) > space:
+            self.overflowed = True
+            in_data = memoryview(in_data)[:max(space, 0) // self.sample_width * self.sample_width]
+        super().extend(in_data)
+        return len(in_data)
+
     def save(self, filename, **input_kwargs):
         kwargs = dict(SPEAKER_DEFAULTS, **input_kwargs)
         with wave.open(filename, "wb") as wf:
@@ -63,12 +227,152 @@ class AudioData(bytearray):
     def as_bytes(self):
         return bytes(self)  # Convert bytearray to immutable bytes object.
 
+    def view(self) -> memoryview:
+        # The bytes without copy. As long as the view exists, the AudioData cannot be extended (BufferError).
+        return memoryview(self)
+
+    def as_array(self) -> np.ndarray:
+        # The samples as NumPy view of the buffer, no copy. Channels are interleaved.
+        # As long as the view exists, the AudioData cannot be extended (BufferError).
+        return np.frombuffer(self, dtype=_sample_dtype(self.sample_width))
+
+    def as_float32(self, rate: int = None, target_rate: int = None, channels: int = 1) -> np.ndarray:
+        # See to_float32().
+        return to_float32(self.as_array(), rate=rate, target_rate=target_rate, channels=channels)
+
+class AudioBuffer:
+    # Capture buffer for Microphone. One block of capacity bytes is allocated up front with np.empty,
+    # which only reserves the memory: the OS commits the pages as they are written.
+    # An append copies the chunk into place under a lock. It never reallocates or moves earlier audio,
+    # so the PortAudio callback thread can write while other threads read views.
+    # ring=False: Writing stops at capacity. write() returns how much fitted, and self.overflowed is set.
+    # ring=True:  Always-on listening. The oldest audio is overwritten, the last capacity bytes are kept.
+    # data:       Existing bytes (uint8 array) to use instead of a new block, e.g. a memory map. The buffer is full then.
+
+    def __init__(self, sample_width: int, capacity: int = 5e7, ring: bool = False, data: np.ndarray = None):
+        self.sample_width = sample_width
+        self.dtype = _sample_dtype(sample_width)
+        self.ring = ring
+        # Whole samples only.
+        if data is None:
+            self.capacity = int(capacity) // sample_width * sample_width
+            if self.capacity == 0:
+                raise ValueError(f"Capacity {capacity} is smaller than one sample.")
+            self._data = np.empty(self.capacity, dtype=np.uint8)
+            self._size = 0
+        else:
+            self.capacity = len(data) // sample_width * sample_width
+            self._data = data[:self.capacity]
+            self._size = self.capacity
+        self._view = memoryview(self._data)
+        self._lock = threading.Lock()
+        # Where the next byte goes. The buffer holds the _size bytes before, cyclically in ring mode.
+        self._end = self._size % self.capacity if self.capacity else 0
+        self.overflowed = False
+
+    @classmethod
+    def load(cls, filename: str) -> "AudioBuffer":
+        # Memory-maps the data chunk of a WAV file, read-only. Nothing is copied: views of the buffer
+        # are views of the file, and the OS pages samples in when they are used.
+        # self.rate and self.channels are set from the file.
+        header = read_wav_header(filename)
+        if header["size"] == 0:
+            data = np.empty(0, dtype=np.uint8)
+        else:
+            data = np.memmap(filename, dtype=np.uint8, mode="r", offset=header["offset"], shape=(header["size"],))
+        loaded = cls(header["sample_width"], data=data)
+        loaded.rate, loaded.channels = header["rate"], header["channels"]
+        return loaded
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size == self.capacity
+
+    def write(self, in_data) -> int:
+        # Appends a chunk. Returns the number of bytes written, which is less than len(in_data)
+        # only without ring mode, when the buffer is full.
+        chunk = memoryview(in_data).cast("B")
+        n = len(chunk)
+        with self._lock:
+            if not self.ring:
+                if n > self.capacity - self._size:
+                    self.overflowed = True
+                    n = self.capacity - self._size
+                    chunk = chunk[:n]
+                    if n == 0:
+                        return 0  # Also for read-only data.
+                self._view[self._size:self._size + n] = chunk
+                self._size += n
+                self._end = self._size % self.capacity
+                return n
+            # Ring mode: If overflowed, old audio was overwritten.
+            self.overflowed = self.overflowed or self._size + n > self.capacity
+            if n >= self.capacity:
+                self._view[:] = chunk[n - self.capacity:]
+                self._end = 0
+            else:
+                first = min(n, self.capacity - self._end)
+                self._view[self._end:self._end + first] = chunk[:first]
+                self._view[:n - first] = chunk[first:]
+                self._end = (self._end + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+            return n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._end = self._size = 0
+            self.overflowed = False
+
+    def _bytes_array(self) -> np.ndarray:
+        # The bytes in order. A view, unless the ring has wrapped around. Then it is unrolled in place
+        # (see _rotate_left()), so that later calls are views again until the next wrap around.
+        with self._lock:
+            start = (self._end - self._size) % self.capacity if self.capacity else 0
+            if start + self._size <= self.capacity:
+                return self._data[start:start + self._size]
+            _rotate_left(self._data, start)
+            self._end = self._size % self.capacity
+            return self._data[:self._size]
+
+    def view(self) -> memoryview:
+        # The recorded bytes without copy (see _bytes_array()).
+        return memoryview(self._bytes_array())
+
+    def as_array(self) -> np.ndarray:
+        # The samples without copy (see _bytes_array()). Channels are interleaved.
+        return self._bytes_array().view(self.dtype)
+
+    def as_float32(self, rate: int = None, target_rate: int = None, channels: int = 1) -> np.ndarray:
+        # See to_float32().
+        return to_float32(self.as_array(), rate=rate, target_rate=target_rate, channels=channels)
+
+    def as_bytes(self) -> bytes:
+        return self._bytes_array().tobytes()
+
+    def as_audio_data(self) -> AudioData:
+        # Copy as AudioData, e.g. for code that needs a bytearray.
+        audio = AudioData(self.sample_width, max_var_size=max(self.capacity, 1))
+        audio.write(self.view())
+        return audio
+
+    def save(self, filename, **input_kwargs):
+        kwargs = dict(SPEAKER_DEFAULTS, **input_kwargs)
+        with wave.open(filename, "wb") as wf:
+            wf.setnchannels(kwargs['channels'])
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(kwargs['rate'])
+            wf.writeframes(self.view())
+
 class Speaker:
     def __init__(self, **kwargs):
+        from pyaudio import PyAudio
         self.kwargs = dict(SPEAKER_DEFAULTS, **kwargs)
         self.pyaudio = PyAudio()
 
-    def play(self, audio: AudioData):
+    def play(self, audio: "AudioBuffer|AudioData"):
         if not audio:
             print("Warning: No audio data to play.")
             return None
@@ -80,85 +384,148 @@ class Speaker:
                                    output=True)
         
         stream.start_stream()
-        stream.write(audio.as_bytes())  # Convert bytearray to bytes before writing
+        stream.write(audio.as_bytes())  # pyaudio needs read-only bytes.
         stream.stop_stream()
         stream.close()
     
     def __del__(self):
-        self.pyaudio.terminate()
+        if getattr(self, "pyaudio", None) is not None:  # Not, if pyaudio failed to import.
+            self.pyaudio.terminate()
 
 class Microphone:
     def __init__(self, **kwargs):
+        from pyaudio import PyAudio
         self.kwargs = dict(MIC_DEFAULTS, **kwargs)
         self.pyaudio = PyAudio()
         self.sample_width = self.pyaudio.get_sample_size(self.kwargs['format'])
     
-    def record(self, interval: float = None, destination: AudioData = None):
+    def record(self, interval: float = None, destination: "AudioBuffer|AudioData" = None
+               , max_size: int = 5e7, ring: bool = False):
         """
         This method starts recording once it is called.
-        It returns a silent AudioData object if the recording exceeds the memory limit.
+        Recording stops early, keeping everything recorded so far, if the destination is full.
 
         interval:    If given, recording stops after interval seconds.
                      Otherwise, 'Enter' stops the recording and keeps it. Any other input discards the recording, and returns None.
-        destination: If given, the recorded audio is appended to this AudioData object, and None is returned.
-                     Otherwise, a new AudioData object is created and returned.
+        destination: If given, the recorded audio is appended to this AudioBuffer or AudioData object, and None is returned.
+                     Otherwise, a new AudioBuffer of max_size bytes is created and returned.
+        ring:        For a new AudioBuffer: Keep only the last max_size bytes, and never stop early.
         """
+        from pyaudio import paComplete, paContinue
         do_return = False
         self.discard = False
         if destination is None:
-            destination = AudioData(self.sample_width)
+            destination = AudioBuffer(self.sample_width, capacity=max_size, ring=ring)
             do_return = True
-        destination.sample_width = self.sample_width
+        self._check_destination(destination)
 
         def audio_callback(in_data, frame_count, time_info, status):
-            try:
-                destination.extend(in_data)
-                #print(time.perf_counter())
-            except MemoryError as e:
-                print("Error:", e)
-                return (b'\x00' * len(in_data), paContinue)  # Return silence to prevent breakage
-            return (in_data, paContinue)
+            if destination.write(in_data) < len(in_data):
+                return (None, paComplete)  # Full. Stop instead of dropping audio silently.
+            return (None, paContinue)
 
-        stream = self.pyaudio.open(**self.kwargs, stream_callback=audio_callback)
-        stream.start_stream()
+        with span("record") as s:
+            stream = self.pyaudio.open(**self.kwargs, stream_callback=audio_callback)
+            stream.start_stream()
 
-        start_time = time.perf_counter()
+            start_time = time.perf_counter()
 
-        if interval is not None:
-            while time.perf_counter() - start_time < interval:
-                time.sleep(0.1)  # Prevent high CPU usage
-        else:
-            selection = input("Press 'Enter' to print.\nPress 'Esc' to discard...")
-            # Enter means '' (empty input) because Enter is pressed after the actual input.
-            self.discard = not (selection == '')
-            """
-            # The below worked well from iPython, but not from the terminal.
-            def key_callback(key, injected):
-                if key == keyboard.Key.esc:
-                    self.discard = True
-                    return False # Stops the listener
-                elif key == keyboard.Key.enter:
-                    return False
-
-            with keyboard.Listener(on_press=key_callback) as listener:
-                listener.join()
-            """
-
-                # The below would be nice, but it requires root privileges.
-                # event = keyboard.read_event()
-                # if event and event.event_type == keyboard.KEY_DOWN:
-                #     if event.name == "enter":
-                #         break
-                #     elif event.name == "backspace":
-                #         discard = True
+            if interval is not None:
+                while time.perf_counter() - start_time < interval:
+                    time.sleep(0.1)  # Prevent high CPU usage
+            else:
+                selection = input("Press 'Enter' to print.\nPress 'Esc' to discard...")
+                # Enter means '' (empty input) because Enter is pressed after the actual input.
+                self.discard = not (selection == '')
+                """
+                # The below worked well from iPython, but not from the terminal.
+                def key_callback(key, injected):
+                    if key == keyboard.Key.esc:
+                        self.discard = True
+                        return False # Stops the listener
+                    elif key == keyboard.Key.enter:
+                        return False
 
-        stream.stop_stream()
-        stream.close()
+                with keyboard.Listener(on_press=key_callback) as listener:
+                    listener.join()
+                """
+
+                    # The below would be nice, but it requires root privileges.
+                    # event = keyboard.read_event()
+                    # if event and event.event_type == keyboard.KEY_DOWN:
+                    #     if event.name == "enter":
+                    #         break
+                    #     elif event.name == "backspace":
+                    #         discard = True
+
+            stream.stop_stream()
+            stream.close()
+            if destination.overflowed and not getattr(destination, "ring", False):
+                print(f"Warning: Recording stopped early, because the destination is full ({len(destination)} bytes).")
+            s.set(recorded_seconds=len(destination) / (destination.sample_width * self.kwargs["channels"] * self.kwargs["rate"]))
 
         if do_return and not self.discard:
             return destination
         else:
             return None
     
+    def stream(self, interval: float = None, stop: threading.Event = None
+               , destination: AudioData = None) -> Iterator[bytes]:
+        """
+        Yields the recorded chunks while recording, e.g. for Speech2Text_vosk.stream().
+        The audio callback only queues the chunks, so slow consumers do not lose audio.
+
+        interval:    If given, recording stops after interval seconds.
+        stop:        If given, recording stops when the event is set, e.g. from another thread.
+                     Without interval and stop, recording continues until the generator is closed.
+        destination: If given, every chunk is also written to this AudioBuffer or AudioData object.
+        """
+        from pyaudio import paContinue
+        chunks = queue.Queue()
+        if destination is not None:
+            self._check_destination(destination)
+
+        def audio_callback(in_data, frame_count, time_info, status):
+            chunks.put(in_data)
+            return (in_data, paContinue)
+
+        stream = self.pyaudio.open(**self.kwargs, stream_callback=audio_callback)
+        stream.start_stream()
+        start_time = time.perf_counter()
+        try:
+            while True:
+                if stop is not None and stop.is_set():
+                    break
+                if interval is not None and time.perf_counter() - start_time >= interval:
+                    break
+                try:
+                    chunk = chunks.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if destination is not None:
+                    destination.write(chunk)
+                yield chunk
+        finally:
+            stream.stop_stream()
+            stream.close()
+        # Chunks recorded before the stream was stopped.
+        while not chunks.empty():
+            chunk = chunks.get()
+            if destination is not None:
+                destination.write(chunk)
+            yield chunk
+
+    def _check_destination(self, destination: "AudioBuffer|AudioData") -> None:
+        # An empty AudioData takes the sample width of the microphone. Anything else must have it already,
+        # e.g. an AudioBuffer, whose dtype follows from its sample width.
+        if destination.sample_width == self.sample_width:
+            return
+        if isinstance(destination, AudioData) and len(destination) == 0:
+            destination.sample_width = self.sample_width
+            return
+        raise ValueError(f"The destination has sample width {destination.sample_width}, "
+                         f"but the microphone records {self.sample_width} bytes per sample.")
+
     def __del__(self):
-        self.pyaudio.terminate()
+        if getattr(self, "pyaudio", None) is not None:  # Not, if pyaudio failed to import.
+            self.pyaudio.terminate()
@@ -0,0 +1,164 @@
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import os
+import sys
+import time
+from typing import Iterator
+
+# Batch transcription of archived recordings with faster_whisper.
+# Recordings are spread over `workers` processes, each running the model with `threads` threads.
+# Results are appended to a JSONL file as soon as each recording is done, one line per recording:
+#   {"path": ..., "text": ..., "duration": seconds of audio, "seconds": transcription time}
+#   {"path": ..., "error": ...} if a recording failed. Failed recordings are retried in the next run.
+# A run skips every recording that already has a result in the output, so an interrupted run can be resumed.
+# Run as: python -m sound2font.batchmodule SOURCE OUTPUT [--workers 2 --threads 2 --batch-size 8 ...]
+
+
+def find_recordings(source: str) -> list[str]:
+    # source: A directory (all *.wav files in it and its subdirectories, sorted),
+    #         or a manifest: a text file with one path per line, or JSONL with a "path" per line.
+    #         Relative paths in a manifest are relative to the manifest.
+    if os.path.isdir(source):
+        paths = []
+        for directory, _, files in os.walk(source):
+            paths += [os.path.join(directory, name) for name in files if name.lower().endswith(".wav")]
+        return sorted(paths)
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+
+def completed_paths(output: str) -> set[str]:
+    # Paths with a successful result in an existing output file. A truncated last line is ignored.
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in result:
+                done.add(result["path"])
+    return done
+
+
+_worker_state = None
+
+def _init_worker(options: dict) -> None:
+    global _worker_state
+    from sound2font.speech2text import Speech2Text_fw
+    _worker_state = Speech2Text_fw(**options)
+
+def _transcribe_path(path: str) -> dict:
+    from sound2font.audiomodule import AudioBuffer
+    start = time.perf_counter()
+    try:
+        audio = AudioBuffer.load(path)
+        text = _worker_state.transcribe(audio).text()
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    duration = len(audio) / (audio.sample_width * audio.channels * audio.rate) if audio.rate else 0.
+    return {"path": path, "text": text, "duration": duration, "seconds": time.perf_counter() - start}
+
+
+def iter_transcriptions(paths: list[str], model_size: str = "tiny", language: str = "en"
+                        , workers: int = 1, threads: int = None, batch_size: int = None
+                        , compute_type: str = "int8") -> Iterator[dict]:
+    # Yields one result (see above) per path, in the order in which they are done.
+    # threads: Threads per worker. Default: the CPUs divided among the workers.
+    # batch_size: See Speech2Text_fw.
+    if threads is None:
+        threads = max((os.cpu_count() or 1) // max(workers, 1), 1)
+    options = {"model_size": model_size, "language": language, "compute_type": compute_type
+               , "cpu_threads": threads, "batch_size": batch_size}
+    if workers <= 1:
+        _init_worker(options)
+        for path in paths:
+            yield _transcribe_path(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as executor:
+        # Only a few recordings per worker are queued, so that results are written while the rest waits.
+        pending = set()
+        paths = iter(paths)
+        while True:
+            for path in paths:
+                pending.add(executor.submit(_transcribe_path, path))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def _truncate_partial_line(output: str) -> None:
+    # An interrupted run may have left a truncated last line. It is cut off, so new results start on a line of their own.
+    # (completed_paths() ignores it, so its recording is transcribed again.)
+    if not os.path.exists(output):
+        return
+    with open(output, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            f.seek(max(end - 4096, 0))
+            block = f.read(end - max(end - 4096, 0))
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                end = end - len(block) + newline + 1
+                break
+            end -= len(block)
+        if end < size:
+            f.truncate(end)
+
+
+def transcribe_batch(source: str, output: str, resume: bool = True, **kwargs) -> dict:
+    # Transcribes every recording of source (see find_recordings()) into the JSONL file output.
+    # With resume, recordings with a result in output are skipped, and new results are appended.
+    # kwargs go to iter_transcriptions(). Returns counts: {"skipped": ..., "done": ..., "failed": ...}.
+    paths = find_recordings(source)
+    done = completed_paths(output) if resume else set()
+    todo = [path for path in paths if path not in done]
+    counts = {"skipped": len(paths) - len(todo), "done": 0, "failed": 0}
+    if resume:
+        _truncate_partial_line(output)
+    with open(output, "a" if resume else "w") as f:
+        for result in iter_transcriptions(todo, **kwargs):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()  # Every finished recording survives an interruption.
+            counts["failed" if "error" in result else "done"] += 1
+    return counts
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m sound2font.batchmodule"
+                                     , description="Transcribe a directory or manifest of WAV files to JSONL.")
+    parser.add_argument("source", help="Directory of WAV files, or manifest with one path per line.")
+    parser.add_argument("output", help="JSONL file. Existing results are kept and skipped.")
+    parser.add_argument("--model", default="tiny", choices=["tiny", "base", "small"])
+    parser.add_argument("--language", default="en", choices=["en", "de"])
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes.")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per worker. Default: CPUs / workers.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Batched inference, if faster_whisper supports it.")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite output instead of resuming.")
+    args = parser.parse_args(argv)
+    counts = transcribe_batch(args.source, args.output, resume=not args.no_resume
+                              , model_size=args.model, language=args.language, workers=args.workers
+                              , threads=args.threads, batch_size=args.batch_size, compute_type=args.compute_type)
+    print(f"Done: {counts['done']}, failed: {counts['failed']}, skipped: {counts['skipped']}.")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
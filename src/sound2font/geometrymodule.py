@@ -0,0 +1,97 @@
+import numpy as np
+
+# Vectorized geometry of G-code segments. Every function works on many segments at once:
+# Points and vectors are (n, 2) arrays, one row per segment. Relative vectors as in G-code:
+# p12 points from the start to the first control point of a Bezier curve, p43 from the end to the second one.
+
+def arc_sweep(starts: np.ndarray, centers: np.ndarray, ends: np.ndarray, clockwise: np.ndarray) -> tuple[np.ndarray]:
+    # Returns radius, start angle and signed sweep angle (negative if clockwise) of circular arcs.
+    # clockwise is a boolean array (G2: True, G3: False). An arc that ends at its start is a full circle.
+    radius = np.linalg.norm(starts - centers, axis=1)
+    theta_start = np.arctan2(*np.flip(starts - centers, axis=1).T)
+    theta_end = np.arctan2(*np.flip(ends - centers, axis=1).T)
+    sweep = np.mod(theta_end - theta_start, 2 * np.pi) # Counterclockwise, in [0, 2pi)
+    sweep[sweep == 0] = 2 * np.pi
+    sweep = np.where(clockwise, sweep - 2 * np.pi, sweep)
+    sweep[sweep == 0] = -2 * np.pi
+    return radius, theta_start, sweep
+
+def bezier_bounds(starts: np.ndarray, p12s: np.ndarray, p43s: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray]:
+    # Exact bounding boxes of cubic Bezier curves. Returns the minima and the maxima as (n, 2) arrays.
+    # Inner extrema are at the roots of the derivative a t^2 + b t + c, per coordinate.
+    P = [starts, starts + p12s, ends + p43s, ends]
+    a = 3 * (-P[0] + 3 * P[1] - 3 * P[2] + P[3])
+    b = 6 * (P[0] - 2 * P[1] + P[2])
+    c = 3 * (P[1] - P[0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(b**2 - 4 * a * c) # nan if there are no real roots.
+        quadratic = np.abs(a) > 1e-12
+        t1 = np.where(quadratic, (-b + root) / (2 * a), -c / b)
+        t2 = np.where(quadratic, (-b - root) / (2 * a), np.nan)
+    mins = np.minimum(starts, ends)
+    maxs = np.maximum(starts, ends)
+    for t in [t1, t2]:
+        t = np.where((t > 0) & (t < 1), t, np.nan) # Outside the curve (or no root): nan
+        values = (1 - t)**3 * P[0] + 3 * (1 - t)**2 * t * P[1] + 3 * (1 - t) * t**2 * P[2] + t**3 * P[3]
+        mins = np.fmin(mins, values)
+        maxs = np.fmax(maxs, values)
+    return mins, maxs
+
+def arc_bounds(starts: np.ndarray, centers: np.ndarray, ends: np.ndarray, clockwise: np.ndarray) -> tuple[np.ndarray]:
+    # Exact bounding boxes of circular arcs. Like bezier_bounds().
+    # Inner extrema are where the arc crosses the axes through its center (angles 0, pi/2, pi, 3pi/2).
+    radius, theta_start, sweep = arc_sweep(starts, centers, ends, clockwise)
+    mins = np.minimum(starts, ends)
+    maxs = np.maximum(starts, ends)
+    for angle, direction in zip([0, np.pi / 2, np.pi, 3 * np.pi / 2], [[1, 0], [0, 1], [-1, 0], [0, -1]]):
+        # Angle from the start to the axis, in the direction of the arc.
+        distance = np.where(sweep > 0, np.mod(angle - theta_start, 2 * np.pi), np.mod(theta_start - angle, 2 * np.pi))
+        crossed = distance <= np.abs(sweep)
+        point = centers + radius[:, None] * np.array(direction)
+        mins = np.where(crossed[:, None], np.minimum(mins, point), mins)
+        maxs = np.where(crossed[:, None], np.maximum(maxs, point), maxs)
+    return mins, maxs
+
+def expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Concatenation of the ranges starts[i], ..., starts[i] + counts[i] - 1.
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+
+def flatten_beziers(starts: np.ndarray, p12s: np.ndarray, p43s: np.ndarray, ends: np.ndarray
+                    , tolerance: float = 0.01, interval: float = None) -> tuple[np.ndarray, np.ndarray]:
+    # Flatten cubic Bezier curves (one per row of the (n, 2) arrays) into straight segments, all in one batch.
+    # The number of segments of each curve keeps the distance between curve and segments below tolerance
+    # (Wang's formula for uniform parameter steps). If interval is given, it is the approximate segment length instead.
+    # Returns the end points of all segments (curve by curve, without the starts), and the number of segments per curve.
+    P = [starts, starts + p12s, ends + p43s, ends]
+    if interval is None:
+        second_differences = np.maximum(np.linalg.norm(P[0] - 2 * P[1] + P[2], axis=1)
+                                        , np.linalg.norm(P[1] - 2 * P[2] + P[3], axis=1))
+        counts = np.ceil(np.sqrt(0.75 * second_differences / tolerance))
+    else:
+        # The control polygon is always longer than the curve.
+        polygon = sum(np.linalg.norm(P[k+1] - P[k], axis=1) for k in range(3))
+        counts = np.ceil(polygon / interval)
+    counts = np.maximum(counts, 1).astype(np.int64)
+    curve = np.repeat(np.arange(len(counts)), counts)
+    t = (expand_ranges(np.ones_like(counts), counts) / counts[curve])[:, None]
+    points = (1 - t)**3 * P[0][curve] + 3 * (1 - t)**2 * t * P[1][curve] + 3 * (1 - t) * t**2 * P[2][curve] + t**3 * P[3][curve]
+    points[np.cumsum(counts) - 1] = ends # Exact end points.
+    return points, counts
+
+def flatten_arcs(starts: np.ndarray, centers: np.ndarray, ends: np.ndarray, clockwise: np.ndarray
+                 , tolerance: float = 0.01, interval: float = None) -> tuple[np.ndarray, np.ndarray]:
+    # Like flatten_beziers(), for circular arcs. clockwise is a boolean array (G2: True, G3: False).
+    radius, theta_start, sweep = arc_sweep(starts, centers, ends, clockwise)
+    if interval is None:
+        # The sagitta radius * (1 - cos(step / 2)) of each segment must not exceed tolerance.
+        max_step = 2 * np.arccos(np.clip(1 - tolerance / np.maximum(radius, 1e-12), -1, 1))
+        counts = np.ceil(np.abs(sweep) / max_step)
+    else:
+        counts = np.ceil(radius * np.abs(sweep) / interval)
+    counts = np.maximum(counts, 1).astype(np.int64)
+    curve = np.repeat(np.arange(len(counts)), counts)
+    theta = theta_start[curve] + expand_ranges(np.ones_like(counts), counts) / counts[curve] * sweep[curve]
+    points = centers[curve] + radius[curve, None] * np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    points[np.cumsum(counts) - 1] = ends # Exact end points.
+    return points, counts
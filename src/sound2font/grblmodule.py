@@ -0,0 +1,208 @@
+import argparse
+from collections import deque
+from collections.abc import Iterable, Iterator
+import os
+import select
+import sys
+import time
+from typing import Callable
+
+from sound2font.writemodule import GCode, PEN
+
+# Streaming GCode to a GRBL controller with character counting (see the GRBL wiki, "Streaming Protocol").
+# GRBL acknowledges every line with "ok" or "error:N" when it leaves its serial RX buffer (128 bytes).
+# The sender keeps track of the bytes of all unacknowledged lines, and sends the next line as soon as it fits,
+# so the buffer stays full and the planner never starves on short G1 segments (see GCode.curves2g1()).
+# PEN["PAUSE"] (M7) separates pages: the sender waits until all motion is done, then calls on_pause(page).
+# tests/fakegrbl.py has a GRBL stand-in on a pseudo terminal, to try the sender without a plotter.
+# Run as: python -m sound2font.grblmodule PORT FILE [--baudrate 115200 --stop-on-error]
+RX_BUFFER_SIZE = 128
+
+
+def open_serial(path: str, baudrate: int = 115200) -> int:
+    # Opens a serial device (or the slave of a pseudo terminal) in raw mode. Returns the file descriptor.
+    import termios
+    import tty
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+    tty.setraw(fd)
+    attributes = termios.tcgetattr(fd)
+    speed = getattr(termios, f"B{baudrate}")
+    attributes[4] = attributes[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attributes)
+    return fd
+
+
+def gcode_lines(gcode: "GCode|str|Iterable[GCode|str]", compact: bool = True) -> Iterator[str]:
+    # Lines to send, from GCode, a GCode string or blocks of either (e.g. Text2Font.convert_iter()).
+    # Comments and empty lines are dropped. compact: Spaces are dropped too. GRBL ignores them, and they take buffer space.
+    if isinstance(gcode, (GCode, str)):
+        gcode = [gcode]
+    for block in gcode:
+        text = block.commandstr if isinstance(block, GCode) else block
+        for line in text.split("\n"):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            yield line.replace(" ", "") if compact else line
+
+
+class GrblSender:
+    # fd:            Open file descriptor of the controller, e.g. from open_serial().
+    # rx_buffer_size: Bytes of GRBL's serial RX buffer.
+    # on_pause:      Called with the number of the finished page at every PEN["PAUSE"], after all motion is done,
+    #                e.g. to wait for new paper. Default: wait for Enter.
+    # forward_pause: Also send PEN["PAUSE"] to the controller, for firmware that does something with M7.
+    # stop_on_error: Raise a RuntimeError at the first "error:N". Otherwise errors are counted and streaming goes on.
+    # timeout:       Seconds to wait for a response, before raising TimeoutError.
+
+    def __init__(self, fd: int, rx_buffer_size: int = RX_BUFFER_SIZE, on_pause: Callable[[int], None] = None
+                 , forward_pause: bool = False, stop_on_error: bool = False, timeout: float = 30.):
+        self.fd = fd
+        self.rx_buffer_size = rx_buffer_size
+        self.on_pause = on_pause if on_pause is not None else (lambda page: input(f"Page {page} done. Press Enter to continue..."))
+        self.forward_pause = forward_pause
+        self.stop_on_error = stop_on_error
+        self.timeout = timeout
+        self._in_flight = deque()  # (line, bytes) of unacknowledged lines.
+        self._in_flight_bytes = 0
+        self._read_buffer = b""
+        self.reset_stats()
+
+    @classmethod
+    def open(cls, path: str, baudrate: int = 115200, **kwargs) -> "GrblSender":
+        return cls(open_serial(path, baudrate), **kwargs)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def reset_stats(self) -> None:
+        self.stats = {"lines": 0, "bytes": 0, "errors": [], "pages": 0, "stalls": 0, "stall_seconds": 0.
+                      , "seconds": 0., "lines_per_second": 0., "bytes_per_second": 0.}
+
+    def wait_for_startup(self, timeout: float = 2., settle: float = 0.2) -> str:
+        # Wakes the controller up, and returns its welcome message ("Grbl 1.1h ['$' for help]"), None if there is none.
+        # GRBL answers "ok" to each of the empty lines sent to wake it up. These and anything else that arrives
+        # until the line is quiet for settle seconds are discarded, so they are not taken for acknowledgements.
+        os.write(self.fd, b"\r\n\r\n")
+        deadline = time.monotonic() + timeout
+        welcome = None
+        while welcome is None:
+            line = self._readline(deadline - time.monotonic())
+            if line is None:
+                break
+            if line.startswith("Grbl"):
+                welcome = line
+        self.flush_input(settle)
+        return welcome
+
+    def flush_input(self, settle: float = 0.2) -> None:
+        # Discards all input, until nothing arrives for settle seconds.
+        self._read_buffer = b""
+        while select.select([self.fd], [], [], settle)[0]:
+            if not os.read(self.fd, 4096):
+                break
+
+    def send(self, gcode: "GCode|str|Iterable[GCode|str]", compact: bool = True) -> dict:
+        # Streams gcode (see gcode_lines()) and waits until the controller has finished every line. Returns self.stats.
+        start = time.perf_counter()
+        for line in gcode_lines(gcode, compact=compact):
+            if line == PEN["PAUSE"]:
+                if self.forward_pause:
+                    self._send_line(line)
+                self.wait_until_idle()
+                self.on_pause(self.stats["pages"])
+                self.stats["pages"] += 1
+                continue
+            self._send_line(line)
+        self.wait_until_idle()
+        self.stats["pages"] += 1
+        self.stats["seconds"] += time.perf_counter() - start
+        if self.stats["seconds"] > 0:
+            self.stats["lines_per_second"] = self.stats["lines"] / self.stats["seconds"]
+            self.stats["bytes_per_second"] = self.stats["bytes"] / self.stats["seconds"]
+        return self.stats
+
+    def wait_until_idle(self) -> None:
+        # G4 P0 is only acknowledged, when the planner is empty, i.e. all motion is done.
+        self._send_line("G4P0")
+        while self._in_flight:
+            self._handle_response()
+
+    def _send_line(self, line: str) -> None:
+        data = (line + "\n").encode("ascii")
+        if len(data) > self.rx_buffer_size:
+            raise ValueError(f"Line {line!r} does not fit into the RX buffer of {self.rx_buffer_size} bytes.")
+        if self._in_flight_bytes + len(data) > self.rx_buffer_size:
+            # Stall: wait for acknowledgements until the line fits.
+            stall_start = time.perf_counter()
+            self.stats["stalls"] += 1
+            while self._in_flight_bytes + len(data) > self.rx_buffer_size:
+                self._handle_response()
+            self.stats["stall_seconds"] += time.perf_counter() - stall_start
+        os.write(self.fd, data)
+        self._in_flight.append((line, len(data)))
+        self._in_flight_bytes += len(data)
+        self.stats["lines"] += 1
+        self.stats["bytes"] += len(data)
+
+    def _handle_response(self) -> None:
+        line = self._readline(self.timeout)
+        if line is None:
+            raise TimeoutError(f"No response from GRBL within {self.timeout} s. {len(self._in_flight)} lines unacknowledged.")
+        if line == "ok" or line.startswith("error:"):
+            if not self._in_flight:
+                return  # Not for a streamed line, e.g. a late answer to the wake-up in wait_for_startup().
+            sent, size = self._in_flight.popleft()
+            self._in_flight_bytes -= size
+            if line.startswith("error:"):
+                self.stats["errors"].append((sent, line))
+                if self.stop_on_error:
+                    raise RuntimeError(f"GRBL answered {line} to {sent!r}.")
+        elif line.startswith("ALARM:"):
+            raise RuntimeError(f"GRBL alarm {line}. Unlock it with $X after checking the machine.")
+        elif line.startswith("Grbl"):
+            raise RuntimeError(f"GRBL was reset while streaming. {len(self._in_flight)} lines were lost.")
+        # Everything else ("<...>" status reports, "[...]" messages) is not an acknowledgement.
+
+    def _readline(self, timeout: float) -> str:
+        deadline = time.monotonic() + max(timeout, 0)
+        while b"\n" not in self._read_buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.fd], [], [], remaining)[0]:
+                return None
+            self._read_buffer += os.read(self.fd, 4096)
+        line, self._read_buffer = self._read_buffer.split(b"\n", 1)
+        line = line.decode("ascii", errors="replace").strip()
+        return line if line else self._readline(deadline - time.monotonic())
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m sound2font.grblmodule"
+                                     , description="Stream a GCode file to a GRBL controller.")
+    parser.add_argument("port", help="Serial device, e.g. /dev/ttyUSB0.")
+    parser.add_argument("file", help="GCode file, e.g. from Text2Font.convert().save().")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first error:N instead of going on.")
+    args = parser.parse_args(argv)
+    with open(args.file, "r") as f:
+        text = f.read()
+    with GrblSender.open(args.port, args.baudrate, stop_on_error=args.stop_on_error) as sender:
+        sender.wait_for_startup()
+        stats = sender.send(text)
+    print(f"{stats['lines']} lines, {stats['bytes']} bytes in {stats['seconds']:.1f} s"
+          f" ({stats['lines_per_second']:.0f} lines/s), {stats['stalls']} stalls ({stats['stall_seconds']:.1f} s)"
+          f", {stats['pages']} pages.")
+    for line, error in stats["errors"]:
+        print(f"{error}: {line}")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import numpy as np
+
+from sound2font.textmodule import DISCONNECTED_CHARS, PUNCTS
+
+# Kinds of entries in TextLayout. Every entry is either a word or a paragraph event without characters.
+ITEMS = {"WORD": 0, "NEWLINE": 1, "BLANK": 2, "NEWPAGE": 3}
+# Line and page breaks in front of a word (TextLayout.breaks) or within a word (TextLayout.splits).
+BREAKS = {"NONE": 0, "LINE": 1, "PAGE": 2}
+# Spaces in front of a word (TextLayout.spaces).
+SPACES = {"NONE": 0, "BEFORE_WORD": 1, "EXPLICIT": 2}
+
+
+class GlyphTable:
+    # Glyph metrics of an Alphabet as arrays, indexed by glyph number. See Alphabet.glyph_table().
+    # Text is mapped to glyph numbers with a translation table indexed by code point.
+    # Characters that are not in the alphabet are replaced by the fallback character.
+
+    def __init__(self, symbols: dict, fallback: str = "?"):
+        self.chars = list(symbols)
+        if fallback not in symbols:
+            raise ValueError(f"Fallback character {fallback!r} is not in the alphabet.")
+        self.fallback = self.chars.index(fallback)
+        self.widths = np.array([symbols[char].width for char in self.chars], dtype=float)
+        self.is_punct = np.array([char in PUNCTS for char in self.chars], dtype=bool)
+        self.is_disconnected = np.array([char in DISCONNECTED_CHARS for char in self.chars], dtype=bool)
+        codes = [ord(char) for char in self.chars if len(char) == 1]
+        # The last entry catches every code point beyond the table.
+        self.table = np.full(max(codes, default=0) + 2, self.fallback, dtype=np.int32)
+        for i, char in enumerate(self.chars):
+            if len(char) == 1:
+                self.table[ord(char)] = i
+
+    def __len__(self):
+        return len(self.chars)
+
+    def indices(self, text: str) -> np.ndarray:
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        return self.table[np.minimum(codes, len(self.table) - 1)]
+
+
+class TextLayout:
+    # Result of Text2Font.layout(): where every word and character goes, before any GCode is generated.
+    # One entry per word or paragraph event (see ITEMS), in text order:
+    #   items, spaces (see SPACES), breaks (see BREAKS), space_x (cursor after the first half of the space),
+    #   x, y (cursor at the start of the word, after a break, or after a paragraph event),
+    #   start, stop (range of the word in the character arrays).
+    # initial: Cursor before the first entry.
+    # One entry per character:
+    #   glyphs (see GlyphTable), x, y (where the glyph is drawn), next_x (cursor after the character),
+    #   splits (see BREAKS, a hyphen is written in front of the break).
+
+    def __init__(self, text: str, glyph_table: GlyphTable, initial: tuple[float]
+                 , items: np.ndarray, spaces: np.ndarray, breaks: np.ndarray, space_x: np.ndarray
+                 , x: np.ndarray, y: np.ndarray, start: np.ndarray, stop: np.ndarray
+                 , glyphs: np.ndarray, char_x: np.ndarray, char_y: np.ndarray, next_x: np.ndarray, splits: np.ndarray):
+        self.text = text
+        self.glyph_table = glyph_table
+        self.initial = initial
+        self.items, self.spaces, self.breaks, self.space_x = items, spaces, breaks, space_x
+        self.x, self.y, self.start, self.stop = x, y, start, stop
+        self.glyphs, self.char_x, self.char_y, self.next_x, self.splits = glyphs, char_x, char_y, next_x, splits
+
+    def __len__(self):
+        return len(self.items)
+
+    def cursor(self, k: int) -> tuple[float]:
+        # Cursor before entry k, i.e. after entry k - 1. k may be len(self), the cursor after the last entry.
+        if k == 0:
+            return self.initial
+        k -= 1
+        if self.stop[k] > self.start[k]:
+            return (self.next_x[self.stop[k] - 1], self.char_y[self.stop[k] - 1])
+        return (self.x[k], self.y[k])
+
+    def page_breaks(self) -> np.ndarray:
+        # Number of new pages (PEN["PAUSE"]) in every entry.
+        split_pages = np.concatenate([[0], np.cumsum(self.splits == BREAKS["PAGE"])])
+        return ((self.items == ITEMS["NEWPAGE"]).astype(np.int64) + (self.breaks == BREAKS["PAGE"])
+                + split_pages[self.stop] - split_pages[self.start])
+
+    def chars(self) -> str:
+        # The laid out characters, with unknown characters replaced.
+        return "".join([self.glyph_table.chars[i] for i in self.glyphs.tolist()])
+
+
+def segment_sums(values: np.ndarray, start: np.ndarray, stop: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Sums of values[start:stop] for every segment, and the cumulative sum with a leading 0.
+    # Empty segments sum to 0.
+    cumulative = np.concatenate([[0.], np.cumsum(values)])
+    return cumulative[stop] - cumulative[start], cumulative
+
+
+def optimal_breaks(required: list[float], advances: list[float], gaps: list[float]
+                   , x0: float, width: float) -> list[bool]:
+    # Minimum raggedness line breaking (Knuth-Plass without stretchable spaces) of one paragraph.
+    # A line from word i to word j costs the squared space left at its end, the last line is free.
+    # required: Width of each word for the fit test. advances: Cursor movement over each word.
+    # gaps: Space in front of each word. It is written before a break, so a new line starts at 0.
+    # x0: Cursor at the start of the paragraph.
+    # Returns for every word, whether a new line starts in front of it.
+    n = len(required)
+    cost = [0.] + [float("inf")] * n
+    line_start = [0] * (n + 1)
+    for i in range(n):
+        if cost[i] == float("inf"):
+            continue
+        x = x0 if i == 0 else 0.
+        for j in range(i, n):
+            if j > i or i == 0:
+                x += gaps[j]
+            end = x + required[j]
+            if j > i and end > width:
+                break
+            # A word longer than the line gets a line of its own. It will be split with a hyphen.
+            c = cost[i] + (0. if j == n - 1 else max(width - end, 0.) ** 2)
+            if c < cost[j + 1]:
+                cost[j + 1] = c
+                line_start[j + 1] = i
+            x += advances[j]
+    breaks = [False] * n
+    j = n
+    while j > 0:
+        i = line_start[j]
+        if i > 0:
+            breaks[i] = True
+        j = i
+    return breaks
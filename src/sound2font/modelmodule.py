@@ -0,0 +1,170 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable
+
+# Models are shared between all instances and threads of a process through a ModelRegistry.
+# They are loaded on first use, and evicted when they have been idle for too long or when the memory budget is exceeded.
+# Keys are tuples like (backend, size or path, language, compute type), see Speech2Text_fw, Speech2Text_vosk and GrammarAdder.
+
+
+def _rss() -> int:
+    # Resident memory of this process in bytes. None where /proc is not available.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.size = 0  # Bytes, measured while loading or given by the caller.
+        self.users = 0  # Models in use are never evicted.
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()  # Held while loading.
+
+
+class ModelRegistry:
+    # memory_budget: Bytes all idle and used models may take together. None: no limit.
+    #                Least recently used idle models are evicted, until the loaded models fit.
+    #                Models in use are never evicted, so the budget can be exceeded while they are used.
+    # idle_timeout:  Seconds after which an unused model is evicted. None: never.
+    #                There is no timer by default: idle models are only evicted, when a model is requested,
+    #                in evict_idle(), or by the thread of start_sweeper().
+    # Models are only safe from eviction between acquire() and release(), e.g. within use().
+
+    def __init__(self, memory_budget: float = None, idle_timeout: float = None):
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self._entries = OrderedDict()  # Least recently used first.
+        self._lock = threading.RLock()
+
+    def acquire(self, key: tuple, loader: Callable[[], object], size: float = None) -> object:
+        # Returns the model for key, loading it with loader() if it is not loaded.
+        # If several threads request a model that is not loaded, it is loaded once and the others wait.
+        # size: Memory of the model in bytes. Default: the growth of the resident memory while loading.
+        # The model is in use until release(key).
+        with self._lock:
+            self.evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.users += 1
+            self._entries.move_to_end(key)
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    before = _rss()
+                    model = loader()
+                    after = _rss()
+                    if size is not None:
+                        entry.size = size
+                    elif before is not None and after is not None:
+                        entry.size = max(after - before, 0)
+                    entry.model = model
+        except BaseException:
+            self.release(key)
+            raise
+        self._enforce_budget()
+        return entry.model
+
+    def release(self, key: tuple) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+            if entry.model is None and entry.users == 0:
+                # Loading failed.
+                del self._entries[key]
+        self._enforce_budget()
+
+    @contextmanager
+    def use(self, key: tuple, loader: Callable[[], object], size: float = None):
+        # with registry.use(key, loader) as model: The model cannot be evicted within the block.
+        model = self.acquire(key, loader, size)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    def loaded(self) -> list[tuple]:
+        # Keys of the loaded models, least recently used first.
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.model is not None]
+
+    def memory_used(self) -> float:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values() if entry.model is not None)
+
+    def evict(self, key: tuple) -> bool:
+        # Drops the registry's reference to an idle model. Returns False, if it is in use or not loaded.
+        with self._lock:
+            if not self._drop(key):
+                return False
+        gc.collect()
+        return True
+
+    def evict_idle(self) -> list[tuple]:
+        # Evicts models that have not been used for idle_timeout seconds. Returns their keys.
+        if self.idle_timeout is None:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            evicted = [key for key, entry in list(self._entries.items())
+                       if now - entry.last_used > self.idle_timeout and self._drop(key)]
+        if evicted:
+            gc.collect()
+        return evicted
+
+    def start_sweeper(self, interval: float = None) -> threading.Event:
+        # Calls evict_idle() every interval seconds (default: idle_timeout) in a daemon thread, so idle models
+        # are freed even while no model is requested. Set the returned event to stop the thread.
+        interval = self.idle_timeout if interval is None else interval
+        if interval is None:
+            raise ValueError("start_sweeper needs an interval or an idle_timeout.")
+        stop = threading.Event()
+
+        def sweep():
+            while not stop.wait(interval):
+                self.evict_idle()
+
+        threading.Thread(target=sweep, name="ModelRegistry sweeper", daemon=True).start()
+        return stop
+
+    def clear(self) -> None:
+        # Evicts every model that is not in use.
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+        gc.collect()
+
+    def _drop(self, key: tuple) -> bool:
+        entry = self._entries[key]
+        if entry.users > 0 or entry.model is None:
+            return False
+        del self._entries[key]
+        return True
+
+    def _enforce_budget(self) -> None:
+        if self.memory_budget is None:
+            return
+        evicted = False
+        with self._lock:
+            for key in list(self._entries):
+                if self.memory_used() <= self.memory_budget:
+                    break
+                evicted = self._drop(key) or evicted
+        if evicted:
+            gc.collect()
+
+
+# The registry used by default. Configure it with e.g. REGISTRY.memory_budget = 1.5e9 and REGISTRY.idle_timeout = 600,
+# and call REGISTRY.start_sweeper() for eviction on a timer.
+REGISTRY = ModelRegistry()
@@ -0,0 +1,146 @@
+import asyncio
+import inspect
+from typing import Callable, Iterator
+
+import numpy as np
+
+from sound2font.writemodule import GCode, GCodeCleaner, OP
+
+# Asynchronous dictation: record -> transcribe -> (punctuate) -> convert -> sink, all stages at the same time.
+# The stages are asyncio tasks connected by bounded queues, so a slow stage holds back the ones before it
+# (backpressure) instead of piling up audio or text. Blocking work (recording, models, Text2Font) runs in threads.
+# The next utterance is recorded while the previous one is transcribed, every transcribed segment is laid out
+# as soon as it is decoded (continuing the text before it), and G-code is passed on page by page. The latency is about that of the slowest stage.
+# Usage:
+#   microphone = Microphone()
+#   pipeline = DictationPipeline(microphone.record, Speech2Text_fw(), text2font, sink=lambda number, page: ...)
+#   asyncio.run(pipeline.run())
+_END = object()
+
+
+async def _put_all(iterate: Callable[[], Iterator], queue: asyncio.Queue) -> int:
+    # Runs the blocking iterator in a thread. Every item is put into queue, waiting while it is full.
+    loop = asyncio.get_running_loop()
+
+    def run() -> int:
+        n = 0
+        for item in iterate():
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            n += 1
+        return n
+
+    return await asyncio.to_thread(run)
+
+
+class DictationPipeline:
+    # record:      Blocking callable, e.g. Microphone.record. Returns the next utterance (AudioBuffer or AudioData),
+    #              or None to end the dictation.
+    # transcriber: Speech2Text_fw or Speech2Text_vosk. Its transcribe_segments() yields text while decoding.
+    # text2font:   Converts the text. Its cursor carries over from segment to segment.
+    # sink:        Called with (page number, GCode) for every finished page, in order. May be a coroutine function.
+    #              A page ends at PEN["PAUSE"], which is not part of either page. The last page is passed at the end.
+    # punctuate:   Optional blocking callable str -> str, e.g. GrammarAdder.add_grammar_rcp for vosk.
+    # queue_size:  Capacity of each queue between two stages.
+
+    def __init__(self, record: Callable, transcriber, text2font, sink: Callable
+                 , punctuate: Callable[[str], str] = None, queue_size: int = 2
+                 , clean: bool = True, remove_cleaned: bool = False):
+        self.record = record
+        self.transcriber = transcriber
+        self.text2font = text2font
+        self.sink = sink
+        self.punctuate = punctuate
+        self.queue_size = queue_size
+        self.clean = clean
+        self.remove_cleaned = remove_cleaned
+        self.stats = {"utterances": 0, "segments": 0, "pages": 0}
+
+    async def run(self) -> dict:
+        # Runs until record() returns None and everything recorded is written. Returns counts of what was processed.
+        # If a stage fails, the others are cancelled and the error is raised. (Threads finish their current item.)
+        audio, texts, pages = (asyncio.Queue(self.queue_size) for _ in range(3))
+        tasks = [asyncio.ensure_future(stage) for stage in
+                 [self._capture(audio), self._transcribe(audio, texts), self._convert(texts, pages), self._write(pages)]]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return self.stats
+
+    async def _capture(self, audio: asyncio.Queue) -> None:
+        while True:
+            utterance = await asyncio.to_thread(self.record)
+            if utterance is None:
+                break
+            if len(utterance) == 0:
+                continue
+            self.stats["utterances"] += 1
+            await audio.put(utterance)
+        await audio.put(_END)
+
+    async def _transcribe(self, audio: asyncio.Queue, texts: asyncio.Queue) -> None:
+        while (utterance := await audio.get()) is not _END:
+            self.stats["segments"] += await _put_all(lambda: self._segments(utterance), texts)
+        await texts.put(_END)
+
+    def _segments(self, utterance) -> Iterator[str]:
+        for text in self.transcriber.transcribe_segments(utterance):
+            text = text.strip()
+            if self.punctuate is not None and text:
+                text = self.punctuate(text)
+            if text:
+                yield text
+
+    async def _convert(self, texts: asyncio.Queue, pages: asyncio.Queue) -> None:
+        # The segments are laid out as one text, joined by spaces (see Text2Font._blocks()), and cleaned by one
+        # GCodeCleaner. So the initial and the final GCode are written once, and the pages are the same as
+        # split_pages() of Text2Font.convert() of the joined text.
+        cleaner = GCodeCleaner(remove=self.remove_cleaned) if self.clean else None
+
+        def clean(blocks: Iterator[GCode], flush: bool = False) -> list[GCode]:
+            if cleaner is None:
+                return list(blocks)
+            blocks = [cleaner.feed(block) for block in blocks]
+            if flush:
+                blocks.append(cleaner.flush())
+            return blocks
+
+        page = []
+        first = True
+        while (text := await texts.get()) is not _END:
+            blocks = await asyncio.to_thread(clean, self.text2font._blocks(text, first=first, last=False))
+            first = False
+            page = await self._put_pages(blocks, page, pages)
+        if not first:
+            blocks = await asyncio.to_thread(clean, [self.text2font._final_gcode()], flush=True)
+            page = await self._put_pages(blocks, page, pages)
+            await pages.put(GCode.concatenate(page))
+        await pages.put(_END)
+
+    async def _put_pages(self, blocks: list[GCode], page: list[GCode], pages: asyncio.Queue) -> list[GCode]:
+        # Adds blocks to the blocks of the current page. Every page break finishes the current page.
+        # Returns the blocks of the page, that is not finished yet.
+        for gcode in blocks:
+            ops, _ = gcode._arrays()
+            bounds = [-1] + np.flatnonzero(ops == OP["PAUSE"]).tolist() + [len(gcode)]
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if start >= 0:
+                    await pages.put(GCode.concatenate(page))
+                    page = []
+                page.append(gcode._slice(start + 1, stop))
+        return page
+
+    async def _write(self, pages: asyncio.Queue) -> None:
+        while (page := await pages.get()) is not _END:
+            if inspect.iscoroutinefunction(self.sink):
+                await self.sink(self.stats["pages"], page)
+            else:
+                await asyncio.to_thread(self.sink, self.stats["pages"], page)
+            self.stats["pages"] += 1
+
+
+def run_dictation(record: Callable, transcriber, text2font, sink: Callable, **kwargs) -> dict:
+    # Blocking shortcut for DictationPipeline(...).run(). See DictationPipeline.
+    return asyncio.run(DictationPipeline(record, transcriber, text2font, sink, **kwargs).run())
@@ -0,0 +1,174 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# Previews of GCode pages. A page is drawn from GCode.segments(): pen-down segments, pen-up travel and dots.
+# Every style is drawn as one batch, with matplotlib (LineCollection) or with the pure NumPy rasterizer,
+# which does not import matplotlib at all.
+# Colors as in GCode.plot(): pen down blue, travel red (dashed in matplotlib).
+STYLES = {
+    "down": {"color": (0, 0, 255), "linestyle": "-"},
+    "travel": {"color": (255, 0, 0), "linestyle": "--"},
+    "dots": {"color": (0, 0, 255), "linestyle": ""},
+}
+BACKGROUND = (255, 255, 255)
+
+
+def segments_bounds(segments: dict[str, np.ndarray], show_moves: bool = True) -> tuple[float]:
+    # (x_min, y_min, x_max, y_max) of the segments. (0, 0, 1, 1) if there is nothing to draw.
+    points = [segments["down"].reshape(-1, 2), segments["dots"]]
+    if show_moves:
+        points.append(segments["travel"].reshape(-1, 2))
+    points = np.concatenate(points)
+    if len(points) == 0:
+        return (0., 0., 1., 1.)
+    return tuple(points.min(axis=0).tolist() + points.max(axis=0).tolist())
+
+
+def draw_segments(ax, segments: dict[str, np.ndarray], show_moves: bool = True, linewidth: float = 1.) -> None:
+    # Adds one collection per style to a matplotlib Axes.
+    from matplotlib.collections import LineCollection
+    colors = {key: tuple(c / 255 for c in style["color"]) for key, style in STYLES.items()}
+    if len(segments["down"]) > 0:
+        ax.add_collection(LineCollection(segments["down"], colors=[colors["down"]], linestyles=STYLES["down"]["linestyle"]
+                                         , linewidths=linewidth))
+    if show_moves and len(segments["travel"]) > 0:
+        ax.add_collection(LineCollection(segments["travel"], colors=[colors["travel"]], linestyles=STYLES["travel"]["linestyle"]
+                                         , linewidths=linewidth))
+    if len(segments["dots"]) > 0:
+        ax.scatter(segments["dots"][:, 0], segments["dots"][:, 1], color=colors["dots"], marker=".")
+    ax.autoscale_view()
+
+
+def render_matplotlib(segments: dict[str, np.ndarray], path: str
+                      , size: tuple[float] = (6, 6), dpi: int = 100
+                      , show_moves: bool = True, grid: bool = False, equal_aspect: bool = True
+                      , canvas_size: tuple[float] = None, title: str = None) -> None:
+    # Saves the segments of one page as image (format from the file extension), without pyplot.
+    # The figure is not registered anywhere, so it is freed as soon as the file is written.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    draw_segments(ax, segments, show_moves=show_moves)
+    if equal_aspect:
+        ax.set_aspect("equal")
+    if grid:
+        ax.grid()
+    if title is not None:
+        ax.set_title(title)
+    if canvas_size is not None:
+        ax.set_xlim(0, canvas_size[0])
+        ax.set_ylim(0, canvas_size[1])
+    figure.savefig(path)
+
+
+def rasterize(segments: dict[str, np.ndarray], pixels_per_mm: float = 4
+              , bounds: tuple[float] = None, margin: float = 2, show_moves: bool = True) -> np.ndarray:
+    # Draws the segments into an RGB image (height, width, 3), uint8. Pure NumPy.
+    # bounds: (x_min, y_min, x_max, y_max) in mm of the drawn area, e.g. (0, 0, *canvas_size).
+    #         Default: the bounding box of the segments. A margin (in mm) is added around it.
+    # Every segment is sampled at least once per pixel, all segments of a style at once.
+    if bounds is None:
+        bounds = segments_bounds(segments, show_moves)
+    x_min, y_min = bounds[0] - margin, bounds[1] - margin
+    width = max(int(np.ceil((bounds[2] - bounds[0] + 2 * margin) * pixels_per_mm)), 1)
+    height = max(int(np.ceil((bounds[3] - bounds[1] + 2 * margin) * pixels_per_mm)), 1)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+    layers = ["travel", "down"] if show_moves else ["down"]
+    for key in layers:
+        lines = (segments[key] - [x_min, y_min]) * pixels_per_mm
+        if len(lines) == 0:
+            continue
+        starts, steps = lines[:, 0], lines[:, 1] - lines[:, 0]
+        counts = np.ceil(np.abs(steps).max(axis=1)).astype(np.int64) + 1
+        owner = np.repeat(np.arange(len(lines)), counts)
+        t = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(np.maximum(counts - 1, 1), counts)
+        points = starts[owner] + t[:, None] * steps[owner]
+        if key == "travel":
+            # Dashed: Leave out every second run of 3 pixels.
+            points = points[(np.arange(len(points)) // 3) % 2 == 0]
+        _plot_points(image, points, STYLES[key]["color"])
+    dots = (segments["dots"] - [x_min, y_min]) * pixels_per_mm
+    if len(dots) > 0:
+        # 3x3 pixels per dot.
+        offsets = np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1]), axis=-1).reshape(-1, 2)
+        _plot_points(image, (dots[:, None] + offsets).reshape(-1, 2), STYLES["dots"]["color"])
+    return image
+
+
+def _plot_points(image: np.ndarray, points: np.ndarray, color: tuple[int]) -> None:
+    height, width = image.shape[:2]
+    columns = np.floor(points[:, 0]).astype(np.int64)
+    rows = height - 1 - np.floor(points[:, 1]).astype(np.int64) # y axis upwards.
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    image[rows[inside], columns[inside]] = color
+
+
+def write_png(path: str, image: np.ndarray) -> None:
+    # Writes an RGB image (height, width, 3), uint8, as PNG. Only needs the standard library.
+    height, width = image.shape[:2]
+    # Every scanline starts with filter type 0 (none).
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, 3 * width)], axis=1)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def render_page(page: "GCode", path: str, backend: str = "numpy", tolerance: float = 0.05
+                , initial: tuple[float] = (0, 0), **kwargs) -> str:
+    # Renders one page (GCode without PEN["PAUSE"]) to path. Returns path.
+    # backend "numpy": rasterize() and write_png(), kwargs go to rasterize().
+    # backend "matplotlib": render_matplotlib(), kwargs go to render_matplotlib().
+    segments = page.segments(tolerance=tolerance, initial=initial)
+    if backend == "numpy":
+        write_png(path, rasterize(segments, **kwargs))
+    elif backend == "matplotlib":
+        render_matplotlib(segments, path, **kwargs)
+    else:
+        raise ValueError(f"Unknown backend {backend}. Use 'numpy' or 'matplotlib'.")
+    return path
+
+
+def _render_job(job: tuple) -> str:
+    page, path, backend, tolerance, initial, kwargs = job
+    return render_page(page, path, backend=backend, tolerance=tolerance, initial=initial, **kwargs)
+
+
+def iter_previews(gcode: "GCode", directory: str, pattern: str = "page_{:03d}.png", backend: str = "numpy"
+                  , tolerance: float = 0.05, workers: int = 1, **kwargs):
+    # Renders every page of gcode (see GCode.split_pages()) to directory/pattern.format(page number),
+    # and yields the paths in page order. Pages are rendered one at a time, when the next path is requested.
+    # With workers > 1 (None: one per CPU), pages are rendered in parallel in a process pool, still yielded in page order.
+    os.makedirs(directory, exist_ok=True)
+    pages = gcode.split_pages()
+    # Every page starts, where the previous one ended.
+    initials = [(0, 0)]
+    for page in pages[:-1]:
+        initials.append(tuple(page._positions(initials[-1])[-1].tolist()) if len(page) > 0 else initials[-1])
+    jobs = [(page, os.path.join(directory, pattern.format(i)), backend, tolerance, initial, kwargs)
+            for i, (page, initial) in enumerate(zip(pages, initials))]
+    if workers is None or workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(_render_job, jobs)
+    else:
+        for job in jobs:
+            yield _render_job(job)
+
+
+def save_previews(gcode: "GCode", directory: str, pattern: str = "page_{:03d}.png", backend: str = "numpy"
+                  , tolerance: float = 0.05, workers: int = 1, **kwargs) -> list[str]:
+    # See iter_previews(). Returns the paths of all pages.
+    return list(iter_previews(gcode, directory, pattern=pattern, backend=backend, tolerance=tolerance
+                              , workers=workers, **kwargs))
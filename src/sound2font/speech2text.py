@@ -1,46 +1,143 @@
 import os
 import numpy as np
-import io
-import soundfile as sf
+from typing import Iterable, Iterator
 from sound2font.audiomodule import MIC_DEFAULTS
 
-from vosk import BatchModel, BatchRecognizer, Model, KaldiRecognizer
+# vosk and faster_whisper are only imported, when a model or recognizer is created. See tests/test_startup.py.
 # KaldiRecognizer does real-time transcription. Potentially faster, less accurate.
 
-from faster_whisper import WhisperModel
+# faster_whisper takes float32 samples at 16 kHz directly, without decoding or resampling them.
+WHISPER_RATE = 16000
 
 from sound2font.textmodule import TextData, TextData_fw
-from sound2font.audiomodule import AudioData
+from sound2font.audiomodule import AudioBuffer, AudioData
+from sound2font.modelmodule import REGISTRY, ModelRegistry
+from sound2font.tracemodule import span
 
 class Speech2Text_vosk:
     # Vosk needs the path to a model checkpoint, and different parameters than faster_whisper.
+    # The model is loaded on first use and shared through the registry (see modelmodule).
+    # Each instance has its own recognizer, which keeps the model in use from the first chunk until finish().
     def __init__(self, model_path: str, sample_rate: int
-                 , model_type: str = "kaldi"):
+                 , model_type: str = "kaldi", registry: ModelRegistry = None):
         self.model_path = model_path
         self.sample_rate = sample_rate
-        if model_type == "batch":
-            model = BatchModel(model_path)
-            self.recognizer = BatchRecognizer(model
-                                            , self.sample_rate
-                                            )
-        elif model_type == "kaldi":
-            model = Model(model_path)
-            self.recognizer = KaldiRecognizer(model
-                                            , self.sample_rate
-                                            )
-        else:
+        self.model_type = model_type
+        if model_type not in ["batch", "kaldi"]:
             raise ValueError(f"Model type {model_type} no recognised.\n" + \
                              "Available model types: 'batch', 'kaldi'")
-        self.recognizer.SetWords(True)
+        self.registry = REGISTRY if registry is None else registry
+        self.model_key = ("vosk", model_path, None, model_type)
+        self._recognizer = None
+
+    def _load_model(self):
+        from vosk import BatchModel, Model
+        if self.model_type == "batch":
+            return BatchModel(self.model_path)
+        return Model(self.model_path)
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            from vosk import BatchRecognizer, KaldiRecognizer
+            model = self.registry.acquire(self.model_key, self._load_model)
+            try:
+                if self.model_type == "batch":
+                    recognizer = BatchRecognizer(model
+                                                , self.sample_rate
+                                                )
+                else:
+                    recognizer = KaldiRecognizer(model
+                                                , self.sample_rate
+                                                )
+                recognizer.SetWords(True)
+            except BaseException:
+                self.registry.release(self.model_key)
+                raise
+            self._recognizer = recognizer
+        return self._recognizer
+
+    def accept(self, chunk: bytes) -> TextData:
+        # Feeds one chunk of audio, e.g. straight from Microphone.stream().
+        # Returns the final result, if vosk detected the end of an utterance, otherwise the partial result so far.
+        # vosk takes bytes only. Chunks from the microphone already are, slices of AudioData are copied.
+        if self.recognizer.AcceptWaveform(chunk if isinstance(chunk, bytes) else bytes(chunk)):
+            return TextData(self.recognizer.Result())
+        if self.model_type == "batch":
+            # BatchRecognizer has no partial results.
+            return TextData('{"partial": ""}')
+        return TextData(self.recognizer.PartialResult())
+
+    def finish(self) -> TextData:
+        # Final result of the audio fed since the last final result.
+        # The recognizer is dropped, so the model can be evicted until the next stream starts.
+        result = TextData(self.recognizer.FinalResult())
+        self._recognizer = None
+        self.registry.release(self.model_key)
+        return result
+
+    def stream(self, chunks: Iterable[bytes], partials: bool = True) -> Iterator[TextData]:
+        # Yields a TextData for every final result and, if partials, for every change of the partial result.
+        # The last result is the final result of the rest of the stream.
+        last_partial = ""
+        for chunk in chunks:
+            result = self.accept(chunk)
+            if result.is_final:
+                last_partial = ""
+                yield result
+            elif partials and result.text() != last_partial:
+                last_partial = result.text()
+                yield result
+        yield self.finish()
+
+    def __del__(self):
+        # A stream that was never finished still uses the model.
+        if getattr(self, "_recognizer", None) is not None:
+            self.registry.release(self.model_key)
 
-    def transcribe(self, audio_data: AudioData) -> TextData:
-        self.recognizer.AcceptWaveform(audio_data.as_bytes())
-        return TextData(self.recognizer.Result())
+    def _chunks(self, audio_data: "AudioBuffer|AudioData", chunk_size: int) -> tuple[Iterator[memoryview], float]:
+        # Chunks of chunk_size samples of a finished recording, and its length in seconds.
+        # The recognizer takes 16-bit mono samples at self.sample_rate. Those are chunked without copies.
+        # Audio loaded from a file (AudioBuffer.load()) may bring another rate, channels or sample width,
+        # and is converted once, like for faster_whisper.
+        rate = getattr(audio_data, "rate", self.sample_rate)
+        channels = getattr(audio_data, "channels", 1)
+        if rate == self.sample_rate and channels == 1 and audio_data.sample_width == 2:
+            view = audio_data.view()
+        else:
+            with span("resample"):
+                samples = audio_data.as_float32(rate=rate, target_rate=self.sample_rate, channels=channels)
+                samples = np.clip(samples * 32768, -32768, 32767).astype(np.int16)
+            view = memoryview(samples).cast("B")
+        step = chunk_size * 2
+        chunks = (view[i:i + step] for i in range(0, len(view), step))
+        return chunks, len(view) / (2 * self.sample_rate)
+
+    def transcribe(self, audio_data: "AudioBuffer|AudioData", chunk_size: int = 8000) -> TextData:
+        # Streams a finished recording in chunks of chunk_size samples and joins all utterances.
+        chunks, audio_seconds = self._chunks(audio_data, chunk_size)
+        with span("transcribe", backend="vosk", audio_seconds=audio_seconds):
+            return TextData.join(list(self.stream(chunks, partials=False)))
+
+    def transcribe_segments(self, audio_data: "AudioBuffer|AudioData", chunk_size: int = 8000) -> Iterator[str]:
+        # Like transcribe(), but yields the text of every utterance as soon as vosk finishes it.
+        chunks, audio_seconds = self._chunks(audio_data, chunk_size)
+        with span("transcribe", backend="vosk", audio_seconds=audio_seconds):
+            for result in self.stream(chunks, partials=False):
+                if result.text():
+                    yield result.text()
 
 class Speech2Text_fw:
     # faster_whisper stores its models automatically.
     # Works offline, once the model is downloaded once.
-    def __init__(self, model_size: str = "tiny", sample_rate: int = MIC_DEFAULTS["rate"], language: str = "en"):
+    # The model is loaded on first use and shared through the registry (see modelmodule).
+    # cpu_threads: Threads of the model. Default: all CPUs but one. Not part of the registry key:
+    #              instances in one process share the model loaded by the first of them.
+    # batch_size:  If given, segments of long recordings are decoded in batches of this size with
+    #              faster_whisper's BatchedInferencePipeline, where the installed version has it.
+    def __init__(self, model_size: str = "tiny", sample_rate: int = MIC_DEFAULTS["rate"], language: str = "en"
+                 , compute_type: str = "int8", registry: ModelRegistry = None
+                 , cpu_threads: int = None, batch_size: int = None):
         self.language = language
         if not self.language in ["en", "de"]:
             raise ValueError(f"Got language {self.language}.\n" + \
@@ -49,15 +146,47 @@ class Speech2Text_fw:
             # 'base' is a good compromise between speed and accuracy.
             # 'small' is impossible on my Raspberry Pi.
             raise ValueError(f"Model size {model_size} must be one of 'tiny' and 'base' and 'small'.")
-        self.model = WhisperModel(model_size, compute_type="int8", cpu_threads=os.cpu_count()-1)
+        self.model_size = model_size
+        self.compute_type = compute_type
         self.sample_rate = sample_rate
-    
-    def transcribe(self, audio_data: AudioData) -> TextData:
-        audio_np = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-        buffer = io.BytesIO()
-        sf.write(buffer, audio_np, samplerate=self.sample_rate, format="WAV")
-        buffer.seek(0)
-        segments, info = self.model.transcribe(buffer, language=self.language)
-        return TextData_fw("".join([segment.text for segment in segments]))
+        self.cpu_threads = os.cpu_count()-1 if cpu_threads is None else cpu_threads
+        self.batch_size = batch_size
+        self.registry = REGISTRY if registry is None else registry
+        # Whisper models are multilingual, so instances for different languages share the model.
+        self.model_key = ("faster_whisper", model_size, None, compute_type)
+
+    def _load_model(self):
+        from faster_whisper import WhisperModel
+        return WhisperModel(self.model_size, compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+
+    def use_model(self):
+        # with speech2text.use_model() as model: The shared model, which cannot be evicted within the block.
+        return self.registry.use(self.model_key, self._load_model)
+
+    def transcribe(self, audio_data: "AudioBuffer|AudioData") -> TextData:
+        # Samples are read straight from the AudioData buffer and resampled once to WHISPER_RATE. No WAV in between.
+        # Audio loaded from a file (AudioBuffer.load()) brings its own rate and channels.
+        return TextData_fw("".join(self.transcribe_segments(audio_data)))
+
+    def transcribe_segments(self, audio_data: "AudioBuffer|AudioData") -> Iterator[str]:
+        # Like transcribe(), but yields the text of every segment as soon as faster_whisper decodes it.
+        with span("resample"):
+            audio_np = audio_data.as_float32(rate=getattr(audio_data, "rate", self.sample_rate), target_rate=WHISPER_RATE
+                                             , channels=getattr(audio_data, "channels", 1))
+        with span("transcribe", backend="faster_whisper", audio_seconds=len(audio_np) / WHISPER_RATE), \
+                self.use_model() as model:
+            kwargs = {}
+            if self.batch_size is not None:
+                try:
+                    from faster_whisper import BatchedInferencePipeline
+                except ImportError:
+                    pass  # Older faster_whisper: decode sequentially.
+                else:
+                    model = BatchedInferencePipeline(model=model)
+                    kwargs["batch_size"] = self.batch_size
+            segments, info = model.transcribe(audio_np, language=self.language, **kwargs)
+            # segments is a generator. The model is only used while it is consumed.
+            for segment in segments:
+                yield segment.text
 
 Speech2Text = Speech2Text_vosk # I am using faster_whisper by default now, but I do not want to break the old commented out code.
@@ -1,12 +1,31 @@
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import TextIO
 from warnings import warn
 import json
 
+import numpy as np
+
+from sound2font.layoutmodule import BREAKS, ITEMS, SPACES, TextLayout, optimal_breaks, segment_sums
 from sound2font.textmodule import DISCONNECTED_CHARS, PUNCTS
-from sound2font.writemodule import Alphabet, GCode, PEN, cubicbezier2gcode
+from sound2font.tracemodule import count, span
+from sound2font.writemodule import Alphabet, GCode, GCodeCleaner, GCodeCompactor, OP, PEN, cubicbezier2gcode
 
 KEYWORDS = {'np': 'NEWPAGE'
             , 'nl': 'NEWLINE'}
 
+# State of a worker process of Text2Font.convert_parallel(): (Text2Font, TextLayout, options).
+_page_worker_state = None
+
+def _init_page_worker(text2font: "Text2Font", layout: "TextLayout", options: tuple) -> None:
+    global _page_worker_state
+    _page_worker_state = (text2font, layout, options)
+
+def _page_worker(pages: tuple[int, int]) -> tuple:
+    text2font, layout, options = _page_worker_state
+    gcode = text2font._convert_pages(layout, *pages, *options)
+    return (*gcode._arrays(), gcode._text)
+
 class Text2Font:
     # The coordinates refer to the writable area of one page, i.e. a Page object.
     # Origin at the bottom left.
@@ -17,6 +36,7 @@ class Text2Font:
     """
     self.current_position: "Cursor". Always the starting point (bottom left) of the next character.
     self.pen_down. Tracks the current z-position in the generated GCode.
+    self.travel_saved. Pen-up travel saved by the last Text2Font.convert(..., optimize_travel=True).
     """
     def __init__(self, width: float, height: float
                  , font_path: str, connected: bool
@@ -30,9 +50,12 @@ class Text2Font:
                                                                 # of the first character at this position.
                  , string_alphabet: bool = False # This is the standard way I am storing my alphabets.
                                                  # Controls, which method is used to load the alphabet.
+                                                 # If False, Alphabet.load() also opens compiled alphabets (Alphabet.compile()).
                  , punct_spacing: float = None # Distance in front of a punctuation sign.
                                                # If none, it will effectively be the same as char_spacing.
                                                # TODO If none, it will be 0.2*font_size.
+                 , optimal_fit: bool = False # If True, line breaks minimise the raggedness of each paragraph
+                                             # (see layoutmodule.optimal_breaks()). Otherwise, lines are filled greedily.
     ):
         self.width = width
         self.height = height
@@ -58,128 +81,371 @@ class Text2Font:
         else:
             self.alphabet = Alphabet.load(self.font_path)
         self.alphabet.resize(font_size)
+        self.optimal_fit = optimal_fit
         self.pen_down = False
+        self.travel_saved = 0.
 
-    def convert(self, text: str, clean: bool = True) -> GCode:
+    def convert(self, text: str, clean: bool = True, remove_cleaned: bool = False, optimize_travel: bool = False) -> GCode:
         """
         Do not pass strings like " ", "\n", "\n\n" to this method.
         Use Text2font.newline() instead.
         Do not add spaces manually.
+        remove_cleaned: If True, GCode.clean() drops redundant lines instead of commenting them out.
+        optimize_travel: If True, the strokes of each page are reordered to shorten the pen-up travel
+                         (see GCode.optimize_travel()). The saved travel is stored in self.travel_saved.
         """
-        # 1) Move pen to initial position. (This is already the cursor position.)
-        gcode = GCode(PEN["UP"]) # Make sure that the pen is up at the start.
+        with span("convert", chars=len(text)) as s:
+            gcode = GCode.concatenate(list(self._blocks(text)))
+            if clean and text != "":
+                gcode.clean(remove=remove_cleaned)
+            if optimize_travel:
+                gcode, self.travel_saved = gcode.optimize_travel()
+            s.set(lines=len(gcode))
+        return gcode
+
+    def convert_parallel(self, text: str, clean: bool = True, remove_cleaned: bool = False
+                         , flatten: bool = False, tolerance: float = 0.01
+                         , workers: int = None, pages_per_task: int = 1) -> GCode:
+        """
+        Same as Text2Font.convert(), but the pages are generated in parallel.
+        Text2Font.layout() finds the page breaks first. Then a process pool generates, cleans and
+        (if flatten, see GCode.curves2g1()) flattens the pages. Every worker gets a copy of this object
+        (with the loaded alphabet) once. The pages are joined with PEN["PAUSE"].
+        workers: Number of processes, None for one per CPU.
+        pages_per_task: Pages generated by a worker at once.
+        """
+        layout = self.layout(text)
+        n_pages = int(layout.page_breaks().sum()) + 1
+        if text == "" or n_pages == 1 or workers == 1:
+            gcode = self.convert(text, clean=clean, remove_cleaned=remove_cleaned)
+            return gcode.curves2g1(tolerance=tolerance) if flatten else gcode
+        tasks = [(first, min(first + pages_per_task, n_pages)) for first in range(0, n_pages, pages_per_task)]
+        options = (clean, remove_cleaned, flatten, tolerance)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(self, layout, options)) as executor:
+            parts = list(executor.map(_page_worker, tasks))
+        # The cursor ends up, where Text2Font.convert() leaves it.
+        self.current_position = layout.cursor(len(layout))
+        self.add_space()
         self.pen_down = False
-        gcode.add_command(f"G0 X{self.current_position[0]} Y{self.current_position[1]}", comment="Move to initial position")
+        pages = []
+        for part in parts:
+            if pages:
+                pages.append(PEN["PAUSE"])
+            pages.append(GCode.from_arrays(*part))
+        return GCode.concatenate(pages)
 
-        # 2a) If text is empty, we are done. Return the move to the initial position.
-        if text == "":
-            return gcode
-        # 2b) Split the input text at each '\n'. If no '\n' is in the text, this will just return the string.
-        #     If '\n occurs at the start (the end), there will be an empty string as the first (the last) element of the list.
-        #     There is no possibility for the string to start or end with '\n'.
-        for i, paragraph in enumerate(text.split("\n")):
-            # 3a) If the user input was 'np', the string will read "NEWPAGE".
+    def _convert_pages(self, layout: TextLayout, first: int, stop: int
+                       , clean: bool, remove_cleaned: bool, flatten: bool, tolerance: float) -> GCode:
+        # GCode of the pages first to stop (excluded) of the layout, without the PEN["PAUSE"] in front and after.
+        # Generates the entries from the one containing the page break in front of the first page,
+        # up to the one containing the page break after the last page. The rest is cut off.
+        new_pages = np.cumsum(layout.page_breaks()) # Page breaks up to and including each entry.
+        start_item = 0 if first == 0 else int(np.searchsorted(new_pages, first))
+        # The last page has no page break after it. (A text ending in a page break ends with an empty page.)
+        last = stop > new_pages[-1]
+        stop_item = len(layout) if last else int(np.searchsorted(new_pages, stop)) + 1
+        self.current_position = layout.cursor(start_item)
+        blocks = [self._initial_gcode()] if first == 0 else []
+        blocks += list(self._emit(layout, start_item, stop_item))
+        if last:
+            blocks.append(self._final_gcode())
+        gcode = GCode.concatenate(blocks)
+        # Page breaks in front of start_item are not part of gcode.
+        skipped = 0 if start_item == 0 else int(new_pages[start_item - 1])
+        pauses = np.flatnonzero(gcode._arrays()[0] == OP["PAUSE"])
+        begin = 0 if first == 0 else pauses[first - skipped - 1] + 1
+        end = len(gcode) if last else pauses[stop - skipped - 1]
+        gcode = gcode._slice(begin, end)
+        if clean:
+            # A page after PEN["PAUSE"] starts with the pen up, see Text2Font.new_page().
+            cleaner = GCodeCleaner(remove=remove_cleaned, pen_down=None if first == 0 else False)
+            gcode = GCode.concatenate([cleaner.feed(gcode), cleaner.flush()])
+        if flatten:
+            gcode.curves2g1(tolerance=tolerance, inplace=True)
+        return gcode
+
+    def convert_iter(self, text: str, clean: bool = True, remove_cleaned: bool = False
+                     , feed_rate: float = None) -> Iterator[GCode]:
+        """
+        Same as Text2Font.convert(), but yields the GCode in blocks while the text is laid out (roughly one block per word).
+        Cleaning (see GCodeCleaner) and the feed rate (see GCode.add_feed_rate()) are applied to each block on the fly.
+        Joining the blocks gives the same GCode as Text2Font.convert().
+        """
+        blocks = self._blocks(text)
+        if clean and text != "":
+            blocks = GCodeCleaner(remove=remove_cleaned).clean_iter(blocks)
+        for block in blocks:
+            if feed_rate is not None:
+                block.add_feed_rate(feed_rate, inplace=True)
+            yield block
+
+    def write(self, text: str, file: "str|TextIO", clean: bool = True, remove_cleaned: bool = False
+              , feed_rate: float = None, pure: bool = False, precision: int = None, tolerance: float = None) -> None:
+        """
+        Streams the GCode of Text2Font.convert_iter() to a path or to any object with a write() method,
+        e.g. an open file, sys.stdout or socket.makefile("w"). The whole GCode is never held in memory.
+        pure: If True, comments and empty lines are left out (see GCode.pure_code_str()).
+        precision: If given, the output is compacted (and pure), see GCodeCompactor.
+        """
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                return self.write(text, f, clean=clean, remove_cleaned=remove_cleaned, feed_rate=feed_rate, pure=pure
+                                  , precision=precision, tolerance=tolerance)
+        compactor = GCodeCompactor(precision, tolerance) if precision is not None else None
+        pure = pure or compactor is not None
+        first = True
+        for block in self.convert_iter(text, clean=clean, remove_cleaned=remove_cleaned, feed_rate=feed_rate):
+            if compactor is not None:
+                lines = "\n".join(compactor.feed(block))
+            else:
+                lines = block.pure_code_str() if pure else block.commandstr
+            if pure and lines == "":
+                continue
+            file.write(lines if first else "\n" + lines)
+            first = False
+
+    def layout(self, text: str, continued: bool = False) -> TextLayout:
+        """
+        Places every word and character of text (see Text2Font.convert()), starting at the cursor, and decides
+        where lines and pages break. Does not change the cursor and does not generate any GCode.
+        Characters that are not in the alphabet are replaced by "?".
+        continued: If True, text continues the paragraph of the text laid out before, as if both were joined by a space.
+                   The cursor must be at the end of the last word, i.e. no Text2Font._final_gcode() in between.
+                   With optimal_fit, the parts of a paragraph laid out separately are balanced separately.
+        """
+        glyph_table = self.alphabet.glyph_table()
+        # 1) Split the text into words and paragraph events: user input 'np' ("NEWPAGE"), empty paragraphs
+        #    (the text starts or ends with '\n', or contains '\n\n') and the start of any further paragraph.
+        words, items, spaces = [], [], []
+        for i, paragraph in enumerate(text.split("\n") if text != "" else []):
+            if i == 0 and continued:
+                # Every word of the continued paragraph follows a space, even an empty one.
+                for word in paragraph.split(" "):
+                    words.append(word)
+                    items.append(ITEMS["WORD"])
+                    spaces.append(SPACES["BEFORE_WORD"])
+                continue
             if paragraph == "NEWPAGE":
-                gcode.add_command(self.new_page().commandstr, comment="New page because of user input")
+                words.append("")
+                items.append(ITEMS["NEWPAGE"])
+                spaces.append(SPACES["NONE"])
                 continue
             if paragraph == "":
-                # Triggers, when paragraph starts or ends with '\n'.
-                gcode.add_command(self.new_line().commandstr, comment="New line because start of explicit newline character")
+                words.append("")
+                items.append(ITEMS["BLANK"])
+                spaces.append(SPACES["NONE"])
                 continue
             if i != 0:
-                gcode.add_command(self.new_line().commandstr, comment="New line because start of new paragraph") # Changes self.current_position and adds G0 move.
-            for j, word in enumerate(paragraph.split(" ")): # Punctuation signs are part of the preceding word, if there is no space before it.
-                # Add a space before every word.
-                # If the paragraph starts with a space, or ends with a space, this is caught by word == "".
-                # A space will be added accordingly.
-                # This does not check for necessary newlines or newpages. However, this will be caught
-                # at the next word. The G0 movement outside the page will finally be removed in GCode.clean().
-                if j != 0 or word == "":
-                    self.current_position = (self.current_position[0] + self.space_width,
-                                             self.current_position[1])
-                    gcode.add_command(self.add_space().commandstr, comment="Space before word" if j!=0 else "Space due to explicit space character")
-                # Appends GCode until the end of the last character. This may be different from self.current_position!
-                # Changes self.current_position to the beginning of the non-existing next character, i.e. the beginning of the "space" character.
-                gcode.append(self.add_word(word, first_word=(j==0)))
-        # Add a space at the end. I know no case, where this is not needed or irrelevant.
-        gcode.add_command(self.add_space().commandstr, comment="Space at the end of Text2Font.convert()")
-        if clean:
-            gcode.clean()
+                words.append("")
+                items.append(ITEMS["NEWLINE"])
+                spaces.append(SPACES["NONE"])
+            for j, word in enumerate(paragraph.split(" ")):
+                words.append(word)
+                items.append(ITEMS["WORD"])
+                spaces.append(SPACES["BEFORE_WORD"] if j != 0 else SPACES["EXPLICIT"] if word == "" else SPACES["NONE"])
+        # 2) All character metrics at once.
+        #    A punctuation sign moves the cursor by punct_spacing - char_spacing before it is drawn,
+        #    and by its width + punct_spacing after it.
+        glyphs = glyph_table.indices("".join(words))
+        counts = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+        stop = np.cumsum(counts)
+        start = stop - counts
+        widths = glyph_table.widths[glyphs]
+        is_punct = glyph_table.is_punct[glyphs]
+        punct_spaced = is_punct & (self.punct_spacing is not None)
+        punct_spacing = 0 if self.punct_spacing is None else self.punct_spacing
+        shifts = np.where(punct_spaced, punct_spacing - self.char_spacing, 0.)
+        advances = widths + np.where(punct_spaced, 2 * punct_spacing - self.char_spacing, self.char_spacing)
+        required, _ = segment_sums(widths + self.char_spacing, start, stop)
+        word_advances, cumulative = segment_sums(advances, start, stop)
+        # Cursor before each character, relative to the start of its word.
+        offsets = cumulative[:-1] - np.repeat(cumulative[start], counts)
+        # A word must be split, where the end of a character plus a hyphen exceeds the line. Not at punctuation signs.
+        reach = np.full(len(words), -np.inf)
+        filled = counts > 0
+        if filled.any():
+            reach[filled] = np.maximum.reduceat(np.where(is_punct, -np.inf, offsets + widths), start[filled])
+        hyphen_width = self.alphabet.symbols["-"].width
+        # 3) Line and page breaks, in one pass over the words. Only words that must be split are visited per character.
+        required, word_advances, reach = required.tolist(), word_advances.tolist(), reach.tolist()
+        # New lines and pages are computed exactly as in Text2Font.new_line() and Text2Font.new_page().
+        top = self.height - self.font_size
+        x, y = self.current_position
+        word_x, word_y, space_x = np.zeros(len(words)), np.zeros(len(words)), np.full(len(words), np.nan)
+        breaks = np.zeros(len(words), dtype=np.int8)
+        splits = np.zeros(len(glyphs), dtype=np.int8)
+        split_words = {}
+        fit = None
+        for k, item in enumerate(items):
+            if item == ITEMS["NEWPAGE"]:
+                x, y = 0, top
+                word_x[k], word_y[k] = x, y
+            elif item != ITEMS["WORD"]:
+                x, y = 0, y - self.line_spacing - self.font_size
+                word_x[k], word_y[k] = x, y
+            else:
+                first_word = spaces[k] != SPACES["BEFORE_WORD"]
+                if self.optimal_fit and (first_word or k == 0 and continued):
+                    end = k + 1
+                    while end < len(items) and items[end] == ITEMS["WORD"] and spaces[end] == SPACES["BEFORE_WORD"]:
+                        end += 1
+                    gaps = [2 * self.space_width if space != SPACES["NONE"] else 0. for space in spaces[k:end]]
+                    # A word must not need a hyphen either, otherwise it would be split.
+                    needed = [max(r, e + hyphen_width) for r, e in zip(required[k:end], reach[k:end])]
+                    x0 = x
+                    if not first_word and self.width - x - gaps[0] < required[k]:
+                        # The first word of a continued paragraph starts a new line, see below.
+                        x0, gaps[0] = 0., 0.
+                    fit = optimal_breaks(needed, word_advances[k:end], gaps, x0, self.width)
+                    fit_start = k
+                if spaces[k] != SPACES["NONE"]:
+                    # The cursor moves by the space width twice, before and in Text2Font.add_space().
+                    x = x + self.space_width
+                    space_x[k] = x
+                    x = x + self.space_width
+                # If the first word in the paragraph does not fit in the line,
+                # the word will be split up rather than a new line added.
+                if not first_word and (self.width - x < required[k] or self.optimal_fit and fit[k - fit_start]):
+                    x, y = 0, y - self.line_spacing - self.font_size
+                    breaks[k] = BREAKS["LINE"]
+                    if y < 0:
+                        y = top
+                        breaks[k] = BREAKS["PAGE"]
+                word_x[k], word_y[k] = x, y
+                if x + reach[k] + hyphen_width <= self.width:
+                    x = x + word_advances[k]
+                    continue
+                # Split up the word, where it is longer than the rest of the line.
+                positions = []
+                for c in range(start[k], stop[k]):
+                    if punct_spaced[c]:
+                        x = x - self.char_spacing + self.punct_spacing
+                        next_x = x + widths[c] + self.punct_spacing
+                    else:
+                        next_x = x + widths[c] + self.char_spacing
+                    if not is_punct[c] and next_x - self.char_spacing + hyphen_width > self.width:
+                        x, y = 0, y - self.line_spacing - self.font_size
+                        splits[c] = BREAKS["LINE"]
+                        if y < 0:
+                            y = top
+                            splits[c] = BREAKS["PAGE"]
+                        next_x = x + widths[c] + self.char_spacing
+                    positions.append((x, y, next_x))
+                    x = next_x
+                split_words[k] = positions
+        # 4) Character positions. Words without splits are placed as a whole.
+        char_x = np.repeat(word_x, counts) + offsets + shifts
+        char_y = np.repeat(word_y, counts)
+        next_x = np.repeat(word_x, counts) + cumulative[1:] - np.repeat(cumulative[start], counts)
+        for k, positions in split_words.items():
+            char_x[start[k]:stop[k]], char_y[start[k]:stop[k]], next_x[start[k]:stop[k]] = np.array(positions).T
+        return TextLayout(text, glyph_table, self.current_position, np.array(items, dtype=np.int8), np.array(spaces, dtype=np.int8), breaks
+                          , space_x, word_x, word_y, start, stop, glyphs, char_x, char_y, next_x, splits)
+
+    def _blocks(self, text: str, first: bool = True, last: bool = True) -> Iterator[GCode]:
+        # Yields the uncleaned GCode of Text2Font.convert() block by block, following Text2Font.layout().
+        # A text converted in parts: first=False continues the part before (see Text2Font.layout(continued=True))
+        # without the initial GCode, last=False leaves out the final GCode. Joined, the parts give the GCode of
+        # the parts joined by spaces.
+        with span("layout", chars=len(text)) as s:
+            layout = self.layout(text, continued=not first)
+            s.set(words=int((layout.items == ITEMS["WORD"]).sum()), glyphs=len(layout.glyphs))
+        count("text2font.glyphs", len(layout.glyphs))
+        if first:
+            yield self._initial_gcode()
+        # If text is empty, we are done. Return the move to the initial position.
+        if text == "":
+            return
+        yield from self._emit(layout, 0, len(layout))
+        if last:
+            yield self._final_gcode()
+
+    def _initial_gcode(self) -> GCode:
+        # Move pen to initial position. (This is already the cursor position.)
+        gcode = GCode(PEN["UP"]) # Make sure that the pen is up at the start.
+        self.pen_down = False
+        gcode.add_command(f"G0 X{self.current_position[0]} Y{self.current_position[1]}", comment="Move to initial position")
         return gcode
-    
+
+    def _final_gcode(self) -> GCode:
+        # Add a space at the end. I know no case, where this is not needed or irrelevant.
+        return GCode.concatenate(["# Space at the end of Text2Font.convert()", self.add_space()])
+
+    def _emit(self, layout: TextLayout, start: int, stop: int) -> Iterator[GCode]:
+        # Yields the GCode of the entries start to stop (excluded) of the layout. The cursor must be at layout.cursor(start).
+        chars = layout.chars()
+        for k in range(start, stop):
+            item = layout.items[k]
+            if item == ITEMS["NEWPAGE"]:
+                yield GCode.concatenate(["# New page because of user input", self.new_page()])
+            elif item == ITEMS["BLANK"]:
+                # Triggers, when the text starts or ends with '\n', or for '\n\n'.
+                yield GCode.concatenate(["# New line because start of explicit newline character", self.new_line()])
+            elif item == ITEMS["NEWLINE"]:
+                yield GCode.concatenate(["# New line because start of new paragraph", self.new_line()])
+            else:
+                if layout.spaces[k] != SPACES["NONE"]:
+                    comment = "Space before word" if layout.spaces[k] == SPACES["BEFORE_WORD"] else "Space due to explicit space character"
+                    self.current_position = (layout.space_x[k], self.current_position[1])
+                    yield GCode.concatenate(["# " + comment, self.add_space()])
+                # Yields GCode until the end of the last character. This may be different from self.current_position!
+                # Changes self.current_position to the beginning of the non-existing next character, i.e. the beginning of the "space" character.
+                yield self._word_gcode(layout, k, chars)
+
     def add_space(self, comment: str = None):
         self.current_position = (self.current_position[0] + self.space_width, self.current_position[1])
         return GCode(f"G0 X{self.current_position[0]} Y{self.current_position[1]}")
 
-    def add_word(self, word: str, first_word: bool = False) -> GCode:
-        # 1) Check whether to start a new line.
-        # 2) Check whether to start a new page.
-        # 3) Add gcode accordingly.
+    def _word_gcode(self, layout: TextLayout, k: int, chars: str) -> GCode:
+        # GCode of word k of the layout, including the line or page break in front of it.
         # This does not add spaces. These are treated as characters.
-        for i, char in enumerate(word):
-            if char not in self.alphabet.symbols:
-                word.replace(char, "?")
         gcode = GCode("")
-        required_space = sum([self.alphabet.symbols[char].width + self.char_spacing for char in word])
-        available_space = self.width - self.current_position[0]
-        # If the first word in the paragraph (line?) does not fit in the line,
-        # the word will be split up rather than a new line added.
-        if available_space >= required_space or first_word:
-            pass
-        else:
-            gcode.add_command(self.new_line().commandstr, comment="New line because line has not enough space left for next word")
-            if self.current_position[1] < 0:
+        if layout.breaks[k] != BREAKS["NONE"]:
+            gcode.add_command(self.new_line(), comment="New line because line has not enough space left for next word")
+            if layout.breaks[k] == BREAKS["PAGE"]:
                 # Adds gcode (pause) and G0 move, and sets self.current_position to 0,self.font_size
-                gcode.add_command(self.new_page().commandstr, comment="New page because next line would exceed y-limit")
+                gcode.add_command(self.new_page(), comment="New page because next line would exceed y-limit")
+        self.current_position = (layout.x[k], layout.y[k])
         last_char = None
-        for char in word:
+        for c in range(layout.start[k], layout.stop[k]):
             # Adds GCode and changes current position both until beginning of new char.
             # In the case of connected fonts, this is the end of the current char.
-            gcode.add_command(self.gcode_and_move_cursor(char, last_char=last_char), comment=f"Char {char}")
+            char = chars[c]
+            gcode.add_command(self._char_gcode(char, last_char, (layout.char_x[c], layout.char_y[c])
+                                               , (layout.next_x[c], layout.char_y[c]), layout.splits[c]), comment=f"Char {char}")
             last_char = char
-        if self.connected: # Otherwise, PENUP is already added in self.gcode_and_move_cursor().
+        if self.connected: # Otherwise, PENUP is already added in self._char_gcode().
             gcode.add_command(PEN["UP"])
         return gcode
-    
-    def gcode_and_move_cursor(self, char: str, last_char: str = None) -> str:
-        # 1) Calculate the next character's starting position
-        if char in PUNCTS and self.punct_spacing is not None:
-            self.current_position = (self.current_position[0] - self.char_spacing + self.punct_spacing, self.current_position[1])
-            next_char_pos = (self.current_position[0] + self.alphabet.symbols[char].width + self.punct_spacing, self.current_position[1])
-        else:
-            next_char_pos = (self.current_position[0] + self.alphabet.symbols[char].width + self.char_spacing, self.current_position[1])
-        
-        # Split up the word if it is longer than a whole line.
-        new = False
-        if not char in PUNCTS and next_char_pos[0] - self.char_spacing + self.alphabet.symbols["-"].width > self.width:
-            new = True
-            commandstr = self._add_hyphen().commandstr
-            commandstr += "\n# New line within word because the character does not have enough space left\n" + self.new_line().commandstr + "\n"
-            if self.current_position[1] < 0:
-                commandstr += "# New page within word because the character does not have enough space left\n" + self.new_page().commandstr + "\n"
-            next_char_pos = (self.current_position[0] + self.alphabet.symbols[char].width + self.char_spacing, self.current_position[1])
+
+    def _char_gcode(self, char: str, last_char: str, position: tuple[float, float]
+                    , next_char_pos: tuple[float, float], split: int = BREAKS["NONE"]) -> GCode:
+        # GCode of char at position, as placed by Text2Font.layout(). Moves the cursor to next_char_pos.
+        # 1) Split up the word, if the layout says so.
+        parts = []
+        if split != BREAKS["NONE"]:
+            parts.append(self._add_hyphen())
+            parts += ["# New line within word because the character does not have enough space left", self.new_line()]
+            if split == BREAKS["PAGE"]:
+                parts += ["# New page within word because the character does not have enough space left", self.new_page()]
         elif char in PUNCTS:
-            commandstr = f"G0 X{self.current_position[0]} Y{self.current_position[1]}"
-        else:
-            commandstr = ""
+            parts.append(f"G0 X{position[0]} Y{position[1]}")
         # If self.connected, next_char_pos == char.final_position.
         # If this is not the case, the code will work, but the first line of the next char will be wrong.
         # This is probably okay for cursive font. Characters can have slightly different starting positions.
-        # 2) Add the gcode command string
-        if self.connected and last_char is not None and not last_char in DISCONNECTED_CHARS and not char in DISCONNECTED_CHARS and not new:
-            commandstr += self.alphabet.symbols[char].connect([0, self.alphabet.symbols[last_char].final_position[1]]
-                                                              , self.alphabet.symbols[last_char].final_angle).translate(self.current_position).commandstr
+        # 2) Add the gcode
+        if self.connected and last_char is not None and not last_char in DISCONNECTED_CHARS and not char in DISCONNECTED_CHARS and split == BREAKS["NONE"]:
+            parts.append(self.alphabet.connect(last_char, char).translate(position))
         else:
-            commandstr += self.alphabet.symbols[char].gcode.translate(self.current_position).commandstr
+            parts.append(self.alphabet.symbols[char].gcode.translate(position))
         if not self.connected or char in DISCONNECTED_CHARS:
             # 3) Add G0 movement to the next character's starting position. Only if disconnected.
-            commandstr = PEN['UP'] + "\n" + commandstr
-            commandstr += "\n" + (PEN["UP"])
+            parts = [PEN['UP']] + parts + [PEN["UP"]]
             self.pen_down = False
-            commandstr += "\n" + (f"G0 X{next_char_pos[0]} Y{next_char_pos[1]}")
-        # 4) Set current position to the previously calculated next character's starting position (bottom).
+            parts.append(f"G0 X{next_char_pos[0]} Y{next_char_pos[1]}")
+        # 4) Set current position to the next character's starting position (bottom).
         self.current_position = next_char_pos
-        return commandstr
+        return GCode.concatenate(parts)
     
     def _add_hyphen(self):
         # Only use before newline() or newpage(). Otherwise, use "-" in your input text.
@@ -192,12 +458,9 @@ class Text2Font:
             gcode = self.alphabet.symbols["-"].gcode
         else:
             gcode = GCode(f"G0 X0 Y0.5\n{PEN['DOWN']}\nG1 X{distance_to_edge} Y0.5\n{PEN['UP']}")
-        commandstr = gcode.translate(self.current_position).commandstr
         # Wait at the end of the hyphen in PENUP position. Next will be a newline() or newpage()
-        commandstr = PEN['UP'] + "\n" + commandstr
-        commandstr += "\n" + (PEN["UP"])
         self.pen_down = False
-        return GCode(commandstr)
+        return GCode.concatenate([PEN['UP'], gcode.translate(self.current_position), PEN["UP"]])
 
     def new_line(self):
         self.current_position = (0, self.current_position[1] - self.line_spacing - self.font_size)
@@ -1,4 +1,11 @@
-from recasepunc.recasepunc import CasePuncPredictor, punctuation, punctuation_syms
+from concurrent.futures import ThreadPoolExecutor
+import json
+import unicodedata
+
+# recasepunc (and with it torch) is only imported, when a GrammarAdder is used. See tests/test_startup.py.
+
+from sound2font.modelmodule import REGISTRY, ModelRegistry
+from sound2font.tracemodule import span
 
 # PUNCTS are punctuation characters. They need special treatment.
 PUNCTS = ['.', '!', ',', '?', ":", ";"]
@@ -10,41 +17,128 @@ class GrammarAdder:
     Adds punctuation to an uncapitalised and unpunctuated text.
     faster_whisper already does this, so it is only needed for vosk.
     recasepunc is not very accurate, and has a model >1GB for each language.
+    The model is loaded on first use and shared through the registry (see modelmodule).
     """
 
-    def __init__(self, model_path: str, language: str):
-        self.punctuator = CasePuncPredictor(model_path, lang=language)
-
-    def add_grammar_rcp(self, input: str) -> str:
-        output = ""
-        for token_with_meta in self.punctuator.predict(input):
-            if not token_with_meta[0].startswith("##"):
-                output += " "
-            if token_with_meta[1] == 'CAPITALIZE':
-                output += token_with_meta[0].capitalize()
-            elif token_with_meta[1] == 'UPPER':
-                output += token_with_meta[0].upper()
-            elif token_with_meta[1] == 'LOWER':
-                output += token_with_meta[0].lower()
-            elif token_with_meta[1] == 'OTHER':
-                output += token_with_meta[0]
+    def __init__(self, model_path: str, language: str, registry: ModelRegistry = None):
+        self.model_path = model_path
+        self.language = language
+        self.registry = REGISTRY if registry is None else registry
+        self.model_key = ("recasepunc", model_path, language, None)
+
+    def _load_model(self):
+        from recasepunc.recasepunc import CasePuncPredictor
+        return CasePuncPredictor(self.model_path, lang=self.language)
+
+    def use_punctuator(self):
+        # with grammar_adder.use_punctuator() as punctuator: The shared model, which cannot be evicted within the block.
+        return self.registry.use(self.model_key, self._load_model)
+
+    def add_grammar_rcp(self, input: str, window: int = 200, overlap: int = 20, workers: int = 1) -> str:
+        # Long texts are punctuated in windows of window words, overlapping by overlap words.
+        # Each word is taken from the window, in which it has more context, i.e. the overlap is split in half.
+        # workers > 1 predicts windows in parallel threads (torch releases the GIL during inference).
+        from recasepunc.recasepunc import punctuation, punctuation_syms
+        words = input.split()
+        if not words:
+            return ""
+        overlap = min(max(overlap, 0), window - 1)
+        step = window - overlap
+        starts = list(range(0, max(len(words) - overlap, 1), step))
+        texts = [" ".join(words[start:start + window]) for start in starts]
+        with span("punctuate", words=len(words), windows=len(texts)), \
+                self.use_punctuator() as punctuator:
+            if workers > 1 and len(texts) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    predictions = list(executor.map(lambda text: list(punctuator.predict(text)), texts))
             else:
-                raise ValueError(f"Unknown case type {token_with_meta[1]}")
-            output += punctuation_syms[punctuation[token_with_meta[2]]]
-            output = output.strip()
-        return output.replace("##", "")
+                predictions = [list(punctuator.predict(text)) for text in texts]
+        tokens = []
+        for i, (start, window_tokens) in enumerate(zip(starts, predictions)):
+            window_words = words[start:start + window]
+            keep_from = overlap // 2 if i > 0 else 0
+            keep_to = len(window_words) - (overlap - overlap // 2) if i < len(starts) - 1 else len(window_words)
+            # The tokenizer splits words differently than str.split(), e.g. at punctuation, hyphens and digits.
+            for token, word in zip(window_tokens, _token_words(window_tokens, window_words)):
+                if keep_from <= word < keep_to:
+                    tokens.append(token)
+        return _assemble(tokens, punctuation, punctuation_syms)
+
+def _normalize(text: str) -> str:
+    # Case and accents do not matter when matching tokens to words. (Uncased tokenizers drop both.)
+    return "".join(char for char in unicodedata.normalize("NFD", text.casefold()) if not unicodedata.combining(char))
+
+def _token_words(tokens: list[tuple], words: list[str]) -> list[int]:
+    # Index of the word in words, that each recasepunc token (token, case, punctuation) belongs to.
+    # The characters of the tokens ("##" continues a word) are matched against the characters of the words.
+    # A token that does not match, e.g. "[UNK]", takes the rest of its word.
+    words = [_normalize(word) for word in words]
+    indices = []
+    word, offset = 0, 0
+    for token in tokens:
+        piece = token[0][2:] if token[0].startswith("##") else token[0]
+        if offset >= len(words[word]) and word + 1 < len(words) and not token[0].startswith("##"):
+            word, offset = word + 1, 0
+        indices.append(word)
+        piece = _normalize(piece)
+        if piece and words[word].startswith(piece, offset):
+            offset += len(piece)
+        else:
+            offset = len(words[word])
+    return indices
+
+def _assemble(tokens: list[tuple], punctuation: dict, punctuation_syms: list) -> str:
+    # Applies case and punctuation of every (token, case, punctuation) tuple. Linear in the length of the text.
+    parts = []
+    for token, case, punct in tokens:
+        if not token.startswith("##"):
+            parts.append(" ")
+        if case == 'CAPITALIZE':
+            parts.append(token.capitalize())
+        elif case == 'UPPER':
+            parts.append(token.upper())
+        elif case == 'LOWER':
+            parts.append(token.lower())
+        elif case == 'OTHER':
+            parts.append(token)
+        else:
+            raise ValueError(f"Unknown case type {case}")
+        parts.append(punctuation_syms[punctuation[punct]])
+    return "".join(parts).strip().replace("##", "")
 
 class TextData:
+    # Result of vosk as JSON string, parsed when it is first needed.
+    # Final results have "text" and, with SetWords(True), "result": one dict per word with
+    # "word", "start", "end" (seconds from the start of the stream) and "conf".
+    # Partial results only have "partial".
 
     def __init__(self, vosk_result: str):
         super().__init__()
         self.vosk_result = vosk_result
-    
+        self._parsed = None
+
+    @property
+    def parsed(self) -> dict:
+        if self._parsed is None:
+            self._parsed = json.loads(self.vosk_result) if self.vosk_result.strip() else {}
+        return self._parsed
+
+    @property
+    def is_final(self) -> bool:
+        return "partial" not in self.parsed
+
     def text(self):
-        if len(self.vosk_result) > 12:
-            return self.vosk_result.split('text" : "')[1][:-3]
-        else:
-            return ""
+        return self.parsed.get("text", self.parsed.get("partial", ""))
+
+    def words(self) -> list[dict]:
+        return self.parsed.get("result", [])
+
+    @classmethod
+    def join(cls, results: list["TextData"]) -> "TextData":
+        # Combines final results of consecutive utterances into one. Empty utterances are left out.
+        texts = [result.text() for result in results if result.text()]
+        words = [word for result in results for word in result.words()]
+        return cls(json.dumps({"result": words, "text": " ".join(texts)}))
 
 class TextData_fw:
     # This literally only contains the text as a string, but I want backwards compatibility with vosk
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Opt-in instrumentation. The pipeline reports spans (timed stages) and counters, e.g. glyphs emitted,
+# lines parsed or seconds of audio, to every registered sink. A sink is any callable taking one event dict:
+#   {"type": "span", "name", "start" (perf_counter seconds), "duration" (seconds), "pid", "tid", "attributes"}
+#   {"type": "counter", "name", "time", "value", "pid", "tid", "attributes"}
+# Spans with an "audio_seconds" attribute also get "real_time_factor" = duration / audio_seconds.
+# Without sinks, span() returns a shared no-op object and count() returns right away,
+# so instrumented code costs one attribute lookup and a function call per stage.
+# Usage:
+#   with instrument(JSONLinesExporter("trace.jsonl"), ChromeTraceExporter("trace.json")):
+#       text2font.convert(text)
+_sinks = []
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def add_sink(sink: Callable[[dict], None]) -> None:
+    with _lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: Callable[[dict], None]) -> None:
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+@contextmanager
+def instrument(*sinks: Callable[[dict], None]):
+    # Adds the sinks for the duration of the block, and closes them (if they have close()) at its end.
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+            if hasattr(sink, "close"):
+                sink.close()
+
+
+def _emit(event: dict) -> None:
+    for sink in list(_sinks):
+        sink(event)
+
+
+class _NullSpan:
+    # Returned by span() while instrumentation is disabled.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.start
+        attributes = self.attributes
+        if exc_type is not None:
+            attributes["error"] = exc_type.__name__
+        if attributes.get("audio_seconds"):
+            attributes["real_time_factor"] = duration / attributes["audio_seconds"]
+        _emit({"type": "span", "name": self.name, "start": self.start, "duration": duration
+               , "pid": os.getpid(), "tid": threading.get_ident(), "attributes": attributes})
+        return False
+
+    def set(self, **attributes) -> None:
+        # Adds attributes, e.g. results that are only known at the end of the span.
+        self.attributes.update(attributes)
+
+
+def span(name: str, **attributes) -> "Span|_NullSpan":
+    # with span("convert", chars=len(text)) as s: ... s.set(glyphs=n)
+    if not _sinks:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def count(name: str, value: float = 1, **attributes) -> None:
+    if not _sinks:
+        return
+    _emit({"type": "counter", "name": name, "time": time.perf_counter(), "value": value
+           , "pid": os.getpid(), "tid": threading.get_ident(), "attributes": attributes})
+
+
+class JSONLinesExporter:
+    # Writes every event as one line of JSON, as soon as it happens. file: Path or open text file.
+
+    def __init__(self, file):
+        self._own = isinstance(file, str)
+        self.file = open(file, "a") if self._own else file
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict) -> None:
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self) -> None:
+        if self._own and not self.file.closed:
+            self.file.close()
+
+
+class ChromeTraceExporter:
+    # Collects events, and writes them in the Chrome trace event format on close(),
+    # for chrome://tracing or https://ui.perfetto.dev. Spans become complete events ("X"), counters "C" events.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict) -> None:
+        if event["type"] == "span":
+            trace_event = {"name": event["name"], "ph": "X", "ts": event["start"] * 1e6, "dur": event["duration"] * 1e6
+                           , "pid": event["pid"], "tid": event["tid"], "args": event["attributes"]}
+        else:
+            trace_event = {"name": event["name"], "ph": "C", "ts": event["time"] * 1e6
+                           , "pid": event["pid"], "tid": event["tid"], "args": {event["name"]: event["value"]}}
+        with self._lock:
+            self.events.append(trace_event)
+
+    def close(self) -> None:
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, default=str)
@@ -0,0 +1,145 @@
+import numpy as np
+
+# Ordering of pen-down strokes to minimise the pen-up travel between them. See GCode.optimize_travel().
+# A stroke is given by its start and end point. Reversible strokes may be drawn from the end to the start.
+
+
+class GridIndex:
+    # Uniform grid over a set of points for nearest neighbour queries. Points can be removed.
+    # The cell size is chosen, such that there is about one point per cell.
+
+    def __init__(self, points: np.ndarray):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.points = points
+        self.alive = np.ones(len(points), dtype=bool)
+        self.n_alive = len(points)
+        if len(points) == 0:
+            self.origin, self.cell, self.shape = np.zeros(2), 1., (1, 1)
+            self.cells = {}
+            return
+        self.origin = points.min(axis=0)
+        extent = np.maximum(points.max(axis=0) - self.origin, 1e-9)
+        self.cell = max(float(np.sqrt(extent[0] * extent[1] / len(points))), float(extent.max()) / len(points), 1e-9)
+        keys = np.floor((points - self.origin) / self.cell).astype(np.int64)
+        self.shape = tuple((keys.max(axis=0) + 1).tolist())
+        self.cells = {}
+        for i, key in enumerate(map(tuple, keys.tolist())):
+            self.cells.setdefault(key, []).append(i)
+
+    def __len__(self):
+        return self.n_alive
+
+    def remove(self, i: int) -> None:
+        if self.alive[i]:
+            self.alive[i] = False
+            self.n_alive -= 1
+
+    def nearest(self, point: tuple[float]) -> int:
+        # Index of the nearest point that has not been removed, -1 if there is none.
+        # Searches rings of cells around the point, until no closer point can be found.
+        if self.n_alive == 0:
+            return -1
+        px, py = point
+        cx = int(np.floor((px - self.origin[0]) / self.cell))
+        cy = int(np.floor((py - self.origin[1]) / self.cell))
+        # Points outside the grid start the search at the closest cell.
+        cx = min(max(cx, 0), self.shape[0] - 1)
+        cy = min(max(cy, 0), self.shape[1] - 1)
+        outside = max(abs(px - self.origin[0] - (cx + 0.5) * self.cell), abs(py - self.origin[1] - (cy + 0.5) * self.cell)) - 0.5 * self.cell
+        best, best_distance = -1, float("inf")
+        max_ring = max(self.shape)
+        for ring in range(max_ring + 1):
+            # Every point in this ring or beyond is at least this far away.
+            bound = max((ring - 1) * self.cell - max(outside, 0.), 0.)
+            if best >= 0 and best_distance <= bound * bound:
+                break
+            for key in self._ring(cx, cy, ring):
+                members = self.cells.get(key)
+                if not members:
+                    continue
+                members[:] = [i for i in members if self.alive[i]]
+                for i in members:
+                    dx, dy = self.points[i, 0] - px, self.points[i, 1] - py
+                    distance = dx * dx + dy * dy
+                    if distance < best_distance:
+                        best, best_distance = i, distance
+        return best
+
+    def _ring(self, cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for x in range(cx - ring, cx + ring + 1):
+            yield (x, cy - ring)
+            yield (x, cy + ring)
+        for y in range(cy - ring + 1, cy + ring):
+            yield (cx - ring, y)
+            yield (cx + ring, y)
+
+
+def path_length(starts: np.ndarray, ends: np.ndarray, origin: tuple[float]) -> float:
+    # Travel from origin to the first start, and from every end to the next start.
+    previous = np.vstack([np.asarray(origin, dtype=float).reshape(1, 2), ends[:-1]])
+    return float(np.hypot(*(starts - previous).T).sum())
+
+
+def nearest_neighbour_order(starts: np.ndarray, ends: np.ndarray, reversible: np.ndarray
+                            , origin: tuple[float]) -> tuple[np.ndarray, np.ndarray]:
+    # Greedy tour: always continue with the stroke, whose start (or end, if reversible) is closest.
+    # Returns the order of the strokes and whether each of them (in the new order) is reversed.
+    n = len(starts)
+    points = np.concatenate([starts, ends[reversible]])
+    owners = np.concatenate([np.arange(n), np.flatnonzero(reversible)])
+    index = GridIndex(points)
+    # Position of the other end point of each stroke in points, -1 if not reversible.
+    partner = np.full(n, -1)
+    partner[owners[n:]] = np.arange(n, len(points))
+    order = np.zeros(n, dtype=np.int64)
+    flipped = np.zeros(n, dtype=bool)
+    position = origin
+    for k in range(n):
+        i = index.nearest(position)
+        stroke = owners[i]
+        order[k] = stroke
+        flipped[k] = i >= n
+        index.remove(stroke)
+        if partner[stroke] >= 0:
+            index.remove(partner[stroke])
+        position = starts[stroke] if flipped[k] else ends[stroke]
+    return order, flipped
+
+
+def two_opt(starts: np.ndarray, ends: np.ndarray, reversible: np.ndarray, order: np.ndarray, flipped: np.ndarray
+            , origin: tuple[float], max_passes: int = 10) -> tuple[np.ndarray, np.ndarray]:
+    # Improves an open tour from origin by reversing sections of it. A reversed section is drawn backwards,
+    # so it may only contain reversible strokes. Reversing a single stroke changes its direction only.
+    # Every pass tries each section start once against all section ends at once.
+    order, flipped = order.copy(), flipped.copy()
+    n = len(order)
+    s = np.where(flipped[:, None], ends[order], starts[order])
+    e = np.where(flipped[:, None], starts[order], ends[order])
+    # Reversible sections have no irreversible stroke between both ends.
+    blocked = np.concatenate([[0], np.cumsum(~reversible[order])])
+    origin = np.asarray(origin, dtype=float)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n):
+            previous = origin if i == 0 else e[i - 1]
+            j = np.arange(i, n)
+            allowed = blocked[j + 1] == blocked[i]
+            if not allowed[0]:
+                continue
+            following = np.vstack([s[i + 1:], np.full((1, 2), np.nan)])
+            old = np.hypot(*(s[i] - previous)) + np.nan_to_num(np.hypot(*(following - e[i:]).T))
+            new = np.hypot(*(e[i:] - previous).T) + np.nan_to_num(np.hypot(*(following - s[i]).T))
+            delta = np.where(allowed, new - old, np.inf)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                k = i + best + 1
+                order[i:k] = order[i:k][::-1]
+                flipped[i:k] = ~flipped[i:k][::-1]
+                s[i:k], e[i:k] = e[i:k][::-1].copy(), s[i:k][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order, flipped
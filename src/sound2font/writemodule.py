@@ -1,10 +1,15 @@
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+import mmap
 from warnings import warn
 import json
-from matplotlib.patches import Arc, PathPatch
-from matplotlib.path import Path
-from matplotlib import pyplot as plt
 import numpy as np
 
+from sound2font.geometrymodule import arc_bounds, bezier_bounds, expand_ranges, flatten_arcs, flatten_beziers
+from sound2font.layoutmodule import GlyphTable
+from sound2font.previewmodule import draw_segments
+from sound2font.tracemodule import count, span
+from sound2font.travelmodule import nearest_neighbour_order, path_length, two_opt
 from sound2font.textmodule import DISCONNECTED_CHARS, PUNCTS
 
 PEN = {
@@ -14,6 +19,152 @@ PEN = {
 }
 
 COORDS = ["X", "Y", "I", "J", "P", "Q"]
+# Words stored in the coordinate matrix of GCode. The feed rate is no coordinate, but it is stored alongside.
+WORDS = COORDS + ["F"]
+WORD_IDX = {word: i for i, word in enumerate(WORDS)}
+
+# Opcodes of the array representation of GCode.
+OP = {
+    "COMMENT": 0, # Comments and empty lines. Their text is kept in a side table.
+    "OTHER": 1, # Lines that cannot be represented by opcode and coordinates, e.g. "G0 Z7". Also kept as text.
+    "G0": 2,
+    "G1": 3,
+    "G2": 4,
+    "G3": 5,
+    "G5": 6,
+    "UP": 7,
+    "DOWN": 8,
+    "PAUSE": 9
+}
+MOVE_OPS = [OP["G0"], OP["G1"], OP["G2"], OP["G3"], OP["G5"]]
+CURVE_OPS = [OP["G2"], OP["G3"], OP["G5"]]
+# Lookup tables {opcode: bool}, used as IS_MOVE[ops]. Faster than np.isin() for the many short GCodes of glyphs.
+IS_MOVE = np.isin(np.arange(len(OP)), MOVE_OPS)
+IS_CURVE = np.isin(np.arange(len(OP)), CURVE_OPS)
+_MOVE_NAMES = {"G0": OP["G0"], "G1": OP["G1"], "G2": OP["G2"], "G3": OP["G3"], "G5": OP["G5"]}
+_PEN_OPS = {PEN["UP"]: OP["UP"], PEN["DOWN"]: OP["DOWN"], PEN["PAUSE"]: OP["PAUSE"]}
+_OP_STR = {OP["G0"]: "G0", OP["G1"]: "G1", OP["G2"]: "G2", OP["G3"]: "G3", OP["G5"]: "G5"
+           , OP["UP"]: PEN["UP"], OP["DOWN"]: PEN["DOWN"], OP["PAUSE"]: PEN["PAUSE"]}
+
+# First bytes of a compiled alphabet file, see Alphabet.compile().
+ALPHABET_MAGIC = b"S2FALPHA"
+
+def parse_gcode(commandstr: str) -> tuple[np.ndarray, np.ndarray, dict[int, str]]:
+    # Parse G-code text into an opcode array, a coordinate matrix (one column per entry in WORDS,
+    # nan if the word is absent in the line) and a side table {line index: text} for comments and other lines.
+    lines = commandstr.split("\n")
+    ops = []
+    rows = []
+    text = {}
+    empty = [np.nan] * len(WORDS)
+    for i, line in enumerate(lines):
+        op = _PEN_OPS.get(line)
+        if op is not None:
+            ops.append(op)
+            rows.append(empty)
+            continue
+        if line == "" or line.startswith("#"):
+            ops.append(OP["COMMENT"])
+            rows.append(empty)
+            text[i] = line
+            continue
+        tokens = line.split()
+        op = _MOVE_NAMES.get(tokens[0]) if tokens else None
+        row = list(empty)
+        if op is not None:
+            for token in tokens[1:]:
+                idx = WORD_IDX.get(token[0])
+                if idx is None or row[idx] == row[idx]: # Unknown word or word given twice.
+                    op = None
+                    break
+                try:
+                    row[idx] = float(token[1:])
+                except ValueError:
+                    op = None
+                    break
+        if op is None:
+            if tokens and tokens[0] in _MOVE_NAMES and any(token[:1] in COORDS for token in tokens[1:]):
+                # E.g. "G1 X1 Y1 Z3". Only lines with opcode and coordinates are transformed.
+                warn(f"parse_gcode: \"{line}\" has a word that is not in {WORDS}. It is kept as text, "
+                     "and translate(), rotate() etc. leave its coordinates unchanged.")
+            ops.append(OP["OTHER"])
+            rows.append(empty)
+            text[i] = line
+        else:
+            ops.append(op)
+            rows.append(row)
+    return np.array(ops, dtype=np.int8), np.array(rows, dtype=float).reshape(len(lines), len(WORDS)), text
+
+def format_gcode(ops: np.ndarray, coords: np.ndarray, text: dict[int, str]) -> list[str]:
+    # Inverse of parse_gcode. Returns the list of lines.
+    # Rows are formatted in groups with the same opcode and the same given words, which share one template.
+    lines = np.empty(len(ops), dtype=object)
+    for i, line in text.items():
+        lines[i] = line
+    given = ~np.isnan(coords)
+    keys = (ops.astype(np.int64) << len(WORDS)) | (given @ (1 << np.arange(len(WORDS))))
+    for key in np.unique(keys).tolist():
+        op = key >> len(WORDS)
+        if op <= OP["OTHER"]:
+            continue
+        rows = np.flatnonzero(keys == key)
+        if not IS_MOVE[op]:
+            lines[rows] = _OP_STR[op]
+            continue
+        columns = [i for i in range(len(WORDS)) if key >> i & 1]
+        template = _OP_STR[op] + "".join(f" {WORDS[i]}{{}}" for i in columns)
+        lines[rows] = [template.format(*row) for row in coords[np.ix_(rows, columns)].tolist()]
+    return lines.tolist()
+
+def carry_positions(coords: np.ndarray, initial: tuple[float] = (0, 0)) -> np.ndarray:
+    # Absolute X and Y after each row. Coordinates that are not given carry over from previous rows.
+    xy = coords[:, :2]
+    positions = np.empty_like(xy)
+    rows = np.arange(len(xy))
+    for k in range(2):
+        last_given = np.where(np.isnan(xy[:, k]), -1, rows)
+        np.maximum.accumulate(last_given, out=last_given)
+        positions[:, k] = np.where(last_given >= 0, xy[last_given, k], initial[k])
+    return positions
+
+def pen_states(ops: np.ndarray, text: dict[int, str], initial: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    # Whether the pen is down after each row, and the pen command of each row (1 down, 0 up, -1 none).
+    # Besides PEN["UP"] and PEN["DOWN"], any other line that only moves Z counts, e.g. "G0 Z7" is down and "G0 Z0" is up.
+    commands = np.full(len(ops), -1, dtype=np.int8)
+    commands[ops == OP["DOWN"]] = 1
+    commands[ops == OP["UP"]] = 0
+    for i in np.flatnonzero(ops == OP["OTHER"]).tolist():
+        tokens = text[i].split()
+        if len(tokens) == 2 and tokens[0] in ["G0", "G1"] and tokens[1][:1] == "Z":
+            try:
+                commands[i] = float(tokens[1][1:]) != 0
+            except ValueError:
+                pass
+    rows = np.arange(len(ops))
+    last_command = np.where(commands >= 0, rows, -1)
+    np.maximum.accumulate(last_command, out=last_command)
+    down = np.where(last_command >= 0, commands[last_command] == 1, initial)
+    return down, commands
+
+def apply_affine(ops: np.ndarray, coords: np.ndarray, affine: np.ndarray) -> np.ndarray:
+    # Returns a transformed copy of coords. affine is a 3x3 matrix in homogeneous coordinates.
+    # X and Y of moves get the full transform. The relative vectors (I, J) and (P, Q) only get the linear part.
+    linear, offset = affine[:2, :2], affine[:2, 2]
+    moves = IS_MOVE[ops]
+    new = coords.copy()
+    if linear[0, 1] == 0 and linear[1, 0] == 0:
+        # No mixing of X and Y, so coordinates that are not given can stay so.
+        new[moves, 0:6:2] *= linear[0, 0]
+        new[moves, 1:6:2] *= linear[1, 1]
+        new[moves, :2] += offset
+        return new
+    # Otherwise, every move needs both X and Y. Missing ones carry over from previous moves.
+    new[moves, :2] = carry_positions(coords)[moves] @ linear.T + offset
+    for k in [2, 4]:
+        pair = coords[:, k:k+2]
+        given = moves & ~np.all(np.isnan(pair), axis=1)
+        new[given, k:k+2] = np.nan_to_num(pair[given]) @ linear.T
+    return new
 
 def get_coordinate(line: str, coord: str, return_str: bool = False):
     if not coord in COORDS:
@@ -47,48 +198,26 @@ def add_coordinate(line: str, coord: str, value: float) -> str:
     else:
         raise ValueError(f"add_coordinate: coord must be \"X\" or \"Y\". Received {coord}.")
     
-def bezier_max(line: str, coord: str, start: tuple[float], steps: int = 1000, return_min: bool = False) -> float:
+def bezier_max(line: str, coord: str, start: tuple[float], steps: int = None, return_min: bool = False) -> float:
+    # Exact, see sound2font.geometrymodule.bezier_bounds(). steps is not used anymore.
     if coord not in ["X", "Y"]:
         raise NotImplementedError
-    idx = {"X": 0, "Y": 1}
     p12 = np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
     p43 = np.array([get_coordinate(line, "P"), get_coordinate(line, "Q")])
-    start = np.array([start[0], start[1]])
     end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-    P = [start, start + p12, end + p43, end]
-    if not return_min:
-        max_coord = 0
-    else:
-        min_coord = 100
-    for t in np.linspace(0, 1, steps):
-        new_coord = (1 - t)**3 * P[0] + 3 * (1 - t)**2 * t * P[1] + 3 * (1 - t) * t**2 * P[2] + t**3 * P[3]
-        if not return_min and new_coord[idx[coord]] > max_coord:
-            max_coord = new_coord[idx[coord]]
-        elif return_min and new_coord[idx[coord]] < min_coord:
-            min_coord = new_coord[idx[coord]]
-    return max_coord if not return_min else min_coord
-
-def circle_max(line: str, coord: str, start: tuple[float]) -> float:
-    if coord != "X":
+    mins, maxs = bezier_bounds(np.array([start], dtype=float), p12[None], p43[None], end[None])
+    return (mins if return_min else maxs)[0, ["X", "Y"].index(coord)]
+
+def circle_max(line: str, coord: str, start: tuple[float], return_min: bool = False) -> float:
+    if coord not in ["X", "Y"]:
         raise NotImplementedError
     if not line.startswith('G2') and not line.startswith('G3'):
         raise ValueError(f"circle_max: Expecting line that starts with 'G2' or 'G3'. Got {line}")
-    start = np.array(start)
+    start = np.array([start], dtype=float)
     center = start + np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
-    end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-    radius = np.linalg.norm(start - center)
-    thetas = [np.atan2(*np.flip(start-center)), np.atan2(*np.flip(end-center))]
-    thetas = [(x * 180 / np.pi) for x in thetas] # Angles in the interval [-180, 180)
-    if line.startswith('G2'): # If clockwise, make it counterclockwise.
-        thetas = [x for x in reversed(thetas)]
-    # If angle 0 is in the range, this is the maximum.
-    if thetas[0] < 0 and thetas[1] > 0 or \
-        all(np.sign(thetas) == 1) and thetas[0] > thetas[1] or \
-        all(np.sign(thetas) == -1) and thetas[0] > thetas[1]:
-        return center[0] + radius
-    # If not, the maximum is at one of the arc's ends.
-    else:
-        return center[0] + radius * np.cos(np.min(np.abs(thetas)) * np.pi / 180)
+    end = np.array([[get_coordinate(line, "X"), get_coordinate(line, "Y")]])
+    mins, maxs = arc_bounds(start, center, end, np.array([line.startswith('G2')]))
+    return (mins if return_min else maxs)[0, ["X", "Y"].index(coord)]
 
 def cubicbezier2gcode(start: 'np.array|list', end: 'np.array|list', start_angle: float, end_angle: float, curvature: tuple[float]) -> 'GCode':
     # Unit vectors
@@ -105,60 +234,117 @@ def cubicbezier2gcode(start: 'np.array|list', end: 'np.array|list', start_angle:
 def arc2g1(start: tuple[float], line: str, interval: float = 0.1) -> str:
     if not line.startswith('G2') and not line.startswith('G3'):
         raise ValueError(f"circle_max: Expecting line that starts with 'G2' or 'G3'. Got {line}")
-    start = np.array(start)
-    center = start + np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
+    center = np.array(start) + np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
     end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-    radius = np.linalg.norm(start - center)
-    thetas = [np.atan2(*np.flip(start-center)), np.atan2(*np.flip(end-center))] # Angles in the interval [-pi, pi)
-    if line.startswith('G2') and thetas[0] < thetas[1]:
-        thetas[0] += 2 * np.pi
-    elif line.startswith('G3') and thetas[0] > thetas[1]:
-        thetas[1] += 2 * np.pi
-    arc_length = radius * np.abs(thetas[1] - thetas[0])
-    num_steps = int(arc_length / interval)
-    out_str = ""
-    for i in range(num_steps):
-        t = i / num_steps
-        theta = thetas[0] + t * (thetas[1] - thetas[0])
-        x = center[0] + radius * np.cos(theta)
-        y = center[1] + radius * np.sin(theta)
-        out_str += f"G1 X{x} Y{y}\n"
-    out_str += f"G1 X{end[0]} Y{end[1]}"
-    return out_str
+    points, _ = flatten_arcs(np.array([start]), center[None], end[None], np.array([line.startswith('G2')]), interval=interval)
+    return "\n".join(f"G1 X{x} Y{y}" for x, y in points.tolist())
 
 def bezier2g1(start: tuple[float], line: str, interval: float = 0.1) -> str:
     p12 = np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
     p43 = np.array([get_coordinate(line, "P"), get_coordinate(line, "Q")])
-    start = np.array([start[0], start[1]])
     end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-    p23 = end + p43 - start - p12
-    P = [start, start + p12, end + p43, end]
-    max_steps = int((np.linalg.norm(p12) + np.linalg.norm(p43) + np.linalg.norm(p23)) / interval) + 1 # This should always be longer than the curve.
-    out_str = ""
-    t = 0
-    for i in range(max_steps):
-        if i == max_steps - 1:
-            warn(f"bezier2g1: Reached maximum number of steps ({max_steps}).")
-        dx_dt = np.linalg.norm(3 * ((1 - t)**2 * (P[1] - P[0]) + 2 * t * (1 - t) * (P[2] - P[1]) + t**2 * (P[3] - P[2])))
-        t += interval / dx_dt
-        if t > 1:
-            break
-        vector = (1 - t)**3 * P[0] + 3 * (1 - t)**2 * t * P[1] + 3 * (1 - t) * t**2 * P[2] + t**3 * P[3]
-        x = vector[0]
-        y = vector[1]
-        out_str += f"G1 X{x} Y{y}\n"
-    out_str += f"G1 X{end[0]} Y{end[1]}"
-    return out_str
+    points, _ = flatten_beziers(np.array([start]), p12[None], p43[None], end[None], interval=interval)
+    return "\n".join(f"G1 X{x} Y{y}" for x, y in points.tolist())
 
 class GCode:
     # This class stores Gcode commands.
     # I want the string to start with the command to go to the starting position.
     # Then pen down (or pen up, for that matter).
     # Every z movement and every x-y movement should be a separate line.
-    
+    # Internally, every line is a row: an opcode in self._ops (see OP) and the coordinates in self._coords
+    # (one column per entry in WORDS, nan if absent). Comments, empty lines and unrecognised lines are kept
+    # in the side table self._text. The arrays have spare capacity beyond self._n for cheap appending.
+    # Rows below self._n are never modified in place, so the arrays can be shared between GCode objects.
+    # The text is only generated when self.commandstr is accessed, and cached until the next change.
+    # translate, rotate, invert_coordinate and scale only compose a pending affine transform (self._affine).
+    # It is applied in one vectorized pass, when the coordinates are needed.
+
     def __init__(self, commandstr: str):
         self.commandstr = commandstr
 
+    @property
+    def commandstr(self) -> str:
+        if self._str is None:
+            self._str = "\n".join(format_gcode(*self._arrays(), self._text))
+        return self._str
+
+    @commandstr.setter
+    def commandstr(self, commandstr: str):
+        self._ops, self._coords, self._text = parse_gcode(commandstr)
+        self._n = len(self._ops)
+        self._str = commandstr
+        self._affine = None
+
+    @classmethod
+    def from_arrays(cls, ops: np.ndarray, coords: np.ndarray, text: dict[int, str] = None) -> "GCode":
+        gcode = cls.__new__(cls)
+        gcode._ops = np.asarray(ops, dtype=np.int8)
+        gcode._coords = np.asarray(coords, dtype=float)
+        gcode._text = {} if text is None else text
+        gcode._n = len(gcode._ops)
+        gcode._str = None
+        gcode._affine = None
+        return gcode
+
+    @classmethod
+    def concatenate(cls, parts: list["GCode|str"]) -> "GCode":
+        # Equivalent to GCode("\n".join(parts)), but without formatting and parsing the GCode parts.
+        if len(parts) == 0:
+            return cls("")
+        ops = []
+        coords = []
+        text = {}
+        n = 0
+        for part in parts:
+            if isinstance(part, str):
+                part = GCode(part)
+            part_ops, part_coords = part._arrays()
+            ops.append(part_ops)
+            coords.append(part_coords)
+            text.update({n + i: line for i, line in part._text.items()})
+            n += len(part_ops)
+        return cls.from_arrays(np.concatenate(ops), np.concatenate(coords), text)
+
+    def _arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._affine is not None:
+            self._coords = apply_affine(self._ops[:self._n], self._coords[:self._n], self._affine)
+            self._affine = None
+        return self._ops[:self._n], self._coords[:self._n]
+
+    def _extend(self, ops: np.ndarray, coords: np.ndarray, text: dict[int, str]) -> None:
+        # Append rows in place. Grows the capacity geometrically, so that repeated appending is linear.
+        self._arrays()
+        n_new = self._n + len(ops)
+        if n_new > len(self._ops):
+            capacity = max(n_new, 2 * len(self._ops))
+            new_ops = np.zeros(capacity, dtype=np.int8)
+            new_coords = np.full((capacity, len(WORDS)), np.nan)
+            new_ops[:self._n], new_coords[:self._n] = self._arrays()
+            self._ops, self._coords = new_ops, new_coords
+        self._ops[self._n:n_new] = ops
+        self._coords[self._n:n_new] = coords
+        self._text.update({self._n + i: line for i, line in text.items()})
+        self._n = n_new
+        self._str = None
+
+    def _replace(self, ops: np.ndarray, coords: np.ndarray, text: dict[int, str], inplace: bool) -> "GCode":
+        if inplace:
+            self._ops, self._coords, self._text = ops, coords, text
+            self._n = len(ops)
+            self._str = None
+            self._affine = None
+        else:
+            return self.__class__.from_arrays(ops, coords, text)
+
+    def _slice(self, start: int, stop: int) -> "GCode":
+        ops, coords = self._arrays()
+        text = {idx - start: line for idx, line in self._text.items() if start <= idx < stop}
+        return self.__class__.from_arrays(ops[start:stop], coords[start:stop], text)
+
+    def _positions(self, initial: tuple[float] = (0, 0)) -> np.ndarray:
+        # Absolute X and Y after each row. Coordinates that are not given carry over from previous rows.
+        return carry_positions(self._arrays()[1], initial)
+
     def plot(self, subplot_size: tuple[float] = (6,6)
              , return_axes: bool = False
              , show: bool = True
@@ -168,102 +354,40 @@ class GCode:
              , equal_aspect: bool = True
              , canvas_size: tuple[float] = None
              , title: str = None):
-        # This method plots the Gcode to a matplotlib plot.
-        # TODO Arcs and curves
-        pen_down = False
-        # Calculate the number of pages needed.
-        no_pages = 1
-        for line in self.get_lines():
-            if line == PEN["PAUSE"]:
-                no_pages += 1
+        # This method plots the Gcode to a matplotlib plot. One subplot per page.
+        # Every page is flattened to line segments, which are drawn in one collection per style (see previewmodule).
+        # For previews of many pages, use previewmodule.save_previews() instead. It does not keep all pages in one figure.
+        # matplotlib is only imported here, so that GCode and the NumPy previews work without it.
+        from matplotlib import pyplot as plt
+        pages = self.split_pages()
+        no_pages = len(pages)
         no_rows = (no_pages + 1) // 2
         _, axes = plt.subplots(no_rows, 1 if no_pages == 1 else 2, figsize=(no_pages*subplot_size[0], no_rows*subplot_size[1]))
-        last_x, last_y = 0, 0
-        if no_pages == 1:
-            ax = axes
-        elif no_pages <= 2:
-            ax = axes[0]
-        else:
-            ax = axes[0][0]
-        page = 1
-        last_line = None
-        for idx, line in enumerate(self.get_lines()):
-            if line.startswith("#") or line == "":
-                continue # Ignore comments.
-            elif line == PEN["UP"]:
-                if idx != 0:
-                    if last_line == PEN["DOWN"]:
-                        ax.scatter([last_x], [last_y], c='b', marker='.')
-                pen_down = False
-            elif line == PEN["DOWN"]:
-                pen_down = True
-            elif line.startswith("G1") or line.startswith("G0"):
-                style = "--" if line.startswith("G0") else "-"
-                col = "b" if pen_down else "r"
-                x = get_coordinate(line, "X")
-                if x is None:
-                    x = last_x
-                y = get_coordinate(line, "Y")
-                if y is None:
-                    y = last_y
-                if line.startswith('G1') or line.startswith('G0') and show_moves:
-                    ax.plot([last_x, x], [last_y, y], f"{col}{style}")
-                last_x, last_y = x, y
-            elif line.startswith("G2") or line.startswith("G3"):
-                style =  "-"
-                col = "b" if pen_down else "r"
-                start = np.array([last_x, last_y])
-                center = start + np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
-                end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-                radius = np.linalg.norm(start - center)
-                thetas = [np.atan2(*np.flip(start-center)), np.atan2(*np.flip(end-center))]
-                thetas = [x * 180 / np.pi for x in thetas]
-                if line.startswith("G2"): # clockwise
-                    thetas = [x for x in reversed(thetas)]
-                # Arc draws counterclockwise starting at (1,0)
-                arc = Arc((center[0], center[1]), 2*radius, 2*radius
-                          , theta1=thetas[0], theta2=thetas[1]
-                          , edgecolor=col, linestyle=style, fill=False)
-                ax.add_patch(arc)
-                last_x, last_y = end[0], end[1]
-            elif line.startswith('G5'):
-                # Cubic Bezier curve
-                style =  "-"
-                col = "b" if pen_down else "r"
-                p12 = np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
-                p43 = np.array([get_coordinate(line, "P"), get_coordinate(line, "Q")])
-                start = np.array([last_x, last_y])
-                end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-                verts = [start, start + p12, end + p43, end]
-                codes = [Path.MOVETO, Path.CURVE4, Path.CURVE4, Path.CURVE4]
-                path = Path(verts, codes)
-                patch = PathPatch(path, facecolor='none', edgecolor=col)
-                ax.add_patch(patch)
-                ctrl_style = 'x--' if show_control_points else '-'
-                lw = 2 if show_control_points else 0
-                xs, ys = zip(*verts)
-                ax.plot(xs, ys, ctrl_style, lw=lw, color='black', ms=10)
-                last_x, last_y = end[0], end[1]
-            elif line != PEN["PAUSE"]:
-                print(f"Warning: Unknown Gcode command {line}")
-            if line == PEN['PAUSE'] or idx == self.__len__() - 1:
-                if equal_aspect:
-                    ax.set_aspect('equal')
-                if grid:
-                    ax.grid()
-                if title is not None:
-                    ax.set_title(title)
-                if canvas_size is not None:
-                    ax.set_xlim(0, canvas_size[0])
-                    ax.set_ylim(0, canvas_size[1])
-                if no_pages <= 2 and line == PEN["PAUSE"]:
-                    ax = axes[1]
-                elif line == PEN["PAUSE"]:
-                    ax = axes[page//2][page % 2]
-                else:
-                    pass
-                page += 1
-            last_line = line
+        flat_axes = np.atleast_1d(axes).flatten()
+        position = (0, 0)
+        for page, ax in zip(pages, flat_axes):
+            draw_segments(ax, page.segments(initial=position), show_moves=show_moves)
+            if show_control_points:
+                # Control polygons of the Bezier curves, separated by nan.
+                ops, coords = page._arrays()
+                positions = page._positions(position)
+                starts = np.vstack([np.reshape(position, (1, 2)), positions[:-1]])
+                rows = ops == OP["G5"]
+                polygons = np.stack([starts[rows], starts[rows] + np.nan_to_num(coords[rows, 2:4])
+                                     , positions[rows] + np.nan_to_num(coords[rows, 4:6]), positions[rows]
+                                     , np.full((rows.sum(), 2), np.nan)], axis=1).reshape(-1, 2)
+                ax.plot(polygons[:, 0], polygons[:, 1], 'x--', lw=2, color='black', ms=10)
+            if len(page) > 0:
+                position = tuple(page._positions(position)[-1].tolist())
+            if equal_aspect:
+                ax.set_aspect('equal')
+            if grid:
+                ax.grid()
+            if title is not None:
+                ax.set_title(title)
+            if canvas_size is not None:
+                ax.set_xlim(0, canvas_size[0])
+                ax.set_ylim(0, canvas_size[1])
         if show:
             plt.show()
         if return_axes:
@@ -271,296 +395,585 @@ class GCode:
     
     def add_feed_rate(self, feed_rate: float, inplace: bool = False, overwrite: bool = False) -> None:
         # Add feed rate to every G1 command to avoid grbl error 22.
-        new_commandstr = ""
-        for line in self.commandstr.split("\n"):
-            if line.startswith("G1"):
-                new_line = line
-                if "F" not in line:
-                    new_line += f" F{feed_rate}"
-                elif overwrite:
-                    raise NotImplementedError("Overwriting previously defined feed rate not implemented.")
-                    #new_line = replace_coordinate(new_line, "F", feed_rate)
-                else:
-                    pass
-                new_commandstr += new_line + "\n"
-            else:
-                new_commandstr += line + "\n"
+        ops, coords = self._arrays()
+        coords = coords.copy()
+        feed = coords[:, WORD_IDX["F"]]
+        rows = ops == OP["G1"]
+        if not overwrite:
+            rows &= np.isnan(feed)
+        feed[rows] = feed_rate
+        return self._replace(ops, coords, dict(self._text), inplace)
+
+    def transform(self, matrix: np.ndarray, inplace: bool = False) -> "GCode":
+        # Apply the 2D affine transform matrix (3x3, homogeneous coordinates) after any pending transform.
+        # This only composes the matrices. The arrays are shared with self, if not inplace.
+        matrix = np.asarray(matrix, dtype=float)
+        affine = matrix if self._affine is None else matrix @ self._affine
         if inplace:
-            self.commandstr = new_commandstr
+            self._affine = affine
+            self._str = None
         else:
-            return self.__class__(new_commandstr)
+            gcode = self.__class__.from_arrays(self._ops[:self._n], self._coords[:self._n], dict(self._text))
+            gcode._affine = affine
+            return gcode
 
     def translate(self, vector: tuple[float], inplace: bool = False) -> None:
-        new_commandstr = ""
-        for line in self.commandstr.split("\n"):
-            if line[0:2] in ["G0", "G1", "G2", "G3", "G5"]:
-                new_line = line
-                for coord in COORDS:
-                    if line[0:2] in ["G2", "G3", "G5"] and coord not in ["X", "Y"]:
-                        # In arcs and Bezier curves, I, J, P, Q are relative vectors, hence shall not be translated.
-                        continue
-                    old = get_coordinate(line, coord)
-                    i = 0 if coord == "X" else 1
-                    new_line = replace_coordinate(new_line, coord, old + vector[i] if old is not None else "dummy")
-                new_commandstr += new_line + "\n"
-            else:
-                new_commandstr += line + "\n"
-        if inplace:
-            self.commandstr = new_commandstr
-        else:
-            return self.__class__(new_commandstr)
-    
-    def pure_code_str(self):
+        # In arcs and Bezier curves, I, J, P, Q are relative vectors, hence shall not be translated.
+        return self.transform([[1, 0, vector[0]], [0, 1, vector[1]], [0, 0, 1]], inplace)
+
+    def scale(self, factor: float, inplace: bool = False) -> "GCode":
+        # Scale all coordinates (absolute and relative) by factor. The center is (0,0).
+        return self.transform([[factor, 0, 0], [0, factor, 0], [0, 0, 1]], inplace)
+
+    def pure_code_str(self, precision: int = None, tolerance: float = None, modal: bool = True):
         # Remove empty lines and comments.
-        rm_ids = []
-        unclean = self.get_lines()
-        for i, line in enumerate(unclean):
-            if line.startswith("#") or line == "":
-                rm_ids.append(i)
-        clean = [x for i, x in enumerate(unclean) if not i in rm_ids]
-        return "\n".join(clean)
-    
+        # precision: If given, the output is compacted, see GCodeCompactor.
+        if precision is not None:
+            return "\n".join(GCodeCompactor(precision, tolerance, modal).feed(self))
+        ops, coords = self._arrays()
+        code = ops != OP["COMMENT"]
+        text = {i: self._text[idx] for i, idx in enumerate(np.flatnonzero(code).tolist()) if idx in self._text}
+        return "\n".join(format_gcode(ops[code], coords[code], text))
+
     def check_limits(self, x_limits: tuple[float], y_limits: tuple[float]):
-        for line in self.get_lines():
-            if line.startswith("#") or line == "":
-                continue
-            x = get_coordinate(line, "X")
-            y = get_coordinate(line, "Y")
-            if x is not None and (x < x_limits[0] or x > x_limits[1]):
-                raise ValueError(f"X coordinate {x} out of limits {x_limits}.")
-            if y is not None and (y < y_limits[0] or y > y_limits[1]):
-                raise ValueError(f"Y coordinate {y} out of limits {y_limits}.")
-    
+        # Checks the whole path, including the inner points of curves.
+        mins, maxs = self.segment_bounds()
+        with np.errstate(invalid="ignore"):
+            bad_x = (mins[:, 0] < x_limits[0]) | (maxs[:, 0] > x_limits[1])
+            bad_y = (mins[:, 1] < y_limits[0]) | (maxs[:, 1] > y_limits[1])
+        bad = np.flatnonzero(bad_x | bad_y)
+        if len(bad) == 0:
+            return
+        i = bad[0]
+        if bad_x[i]:
+            x = mins[i, 0] if mins[i, 0] < x_limits[0] else maxs[i, 0]
+            raise ValueError(f"X coordinate {x} out of limits {x_limits}.")
+        y = mins[i, 1] if mins[i, 1] < y_limits[0] else maxs[i, 1]
+        raise ValueError(f"Y coordinate {y} out of limits {y_limits}.")
+
+    def segment_bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        # Exact bounding box of the path of every row, as (n, 2) arrays of minima and maxima. nan for rows that are no moves.
+        ops, coords = self._arrays()
+        positions = self._positions()
+        starts = np.vstack([np.zeros((1, 2)), positions[:-1]]) # Position before each row.
+        mins = np.full((self._n, 2), np.nan)
+        # Straight moves: The end point. The start is covered by the previous move.
+        moves = IS_MOVE[ops]
+        mins[moves] = positions[moves]
+        maxs = mins.copy()
+        beziers = np.flatnonzero(ops == OP["G5"])
+        arcs = np.flatnonzero((ops == OP["G2"]) | (ops == OP["G3"]))
+        mins[beziers], maxs[beziers] = bezier_bounds(starts[beziers], coords[beziers, 2:4], coords[beziers, 4:6], positions[beziers])
+        mins[arcs], maxs[arcs] = arc_bounds(starts[arcs], starts[arcs] + coords[arcs, 2:4], positions[arcs], ops[arcs] == OP["G2"])
+        return mins, maxs
+
+    def bounding_box(self) -> tuple[float]:
+        # (x_min, y_min, x_max, y_max) of all moves. None if there are no moves.
+        mins, maxs = self.segment_bounds()
+        if np.all(np.isnan(mins)):
+            return None
+        return tuple(np.nanmin(mins, axis=0).tolist() + np.nanmax(maxs, axis=0).tolist())
+
+    def page_bounding_boxes(self) -> list[tuple[float]]:
+        # Bounding box (x_min, y_min, x_max, y_max) of every page, see GCode.split_pages(). None for pages without moves.
+        ops, _ = self._arrays()
+        mins, maxs = self.segment_bounds()
+        pages = np.cumsum(ops == OP["PAUSE"])
+        page_mins = np.full((pages[-1] + 1 if self._n > 0 else 1, 2), np.inf)
+        page_maxs = np.full_like(page_mins, -np.inf)
+        moves = IS_MOVE[ops]
+        np.minimum.at(page_mins, pages[moves], mins[moves])
+        np.maximum.at(page_maxs, pages[moves], maxs[moves])
+        return [tuple(page_min.tolist() + page_max.tolist()) if np.all(np.isfinite(page_min)) else None
+                for page_min, page_max in zip(page_mins, page_maxs)]
+
     def split_pages(self):
         # Split the Gcode into pages. A page is defined by a PEN["PAUSE"] command.
         # Returns a list of GCode objects.
-        commandstr_list = self.commandstr.split(PEN["PAUSE"])
-        gcode_list = [GCode(x) for x in commandstr_list]
+        ops, _ = self._arrays()
+        bounds = [-1] + np.flatnonzero(ops == OP["PAUSE"]).tolist() + [self._n]
+        gcode_list = [self._slice(start+1, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
         return gcode_list
 
-    def clean(self):
-        # Comment instead of remove.
+    def travel_length(self, initial: tuple[float] = (0, 0)) -> float:
+        # Length of all XY moves with the pen up. Curves count with their chord.
+        ops, _ = self._arrays()
+        positions = self._positions(initial)
+        down, _ = pen_states(ops, self._text)
+        steps = np.diff(positions, axis=0, prepend=np.reshape(initial, (1, 2)))
+        return float(np.hypot(*steps[IS_MOVE[ops] & ~down].T).sum())
+
+    def optimize_travel(self, reverse: bool = True, improve: bool = True) -> tuple["GCode", float]:
+        # Reorders the pen-down strokes of every page, to shorten the pen-up travel between them.
+        # A stroke runs from a pen-down to a pen-up command. It is reached by a single G0 move.
+        # Other pen-up moves are dropped, except at the end of a page. Comments before a stroke move with it.
+        # reverse: Strokes may be drawn backwards. Not possible for strokes with other commands than moves,
+        #          or with G5 commands, which lack one of I, J, P, Q.
+        # improve: After the nearest neighbour tour, improve the order by 2-opt.
+        # Returns the new GCode and the saved pen-up travel (see GCode.travel_length()).
+        parts = []
+        position = (0, 0)
+        pen_down = False
+        for n, page in enumerate(self.split_pages()):
+            if n > 0:
+                parts.append(PEN["PAUSE"])
+            page, position, pen_down = page._optimize_page_travel(position, pen_down, reverse, improve)
+            parts.append(page)
+        gcode = GCode.concatenate(parts)
+        return gcode, self.travel_length() - gcode.travel_length()
+
+    def _optimize_page_travel(self, initial: tuple[float], pen_down: bool, reverse: bool, improve: bool) -> tuple["GCode", tuple[float], bool]:
+        # See GCode.optimize_travel(). One page without PEN["PAUSE"].
+        # Returns the new GCode, the final position and whether the pen is down in the end.
+        ops, coords = self._arrays()
+        positions = self._positions(initial)
+        down, commands = pen_states(ops, self._text, pen_down)
+        end_position = tuple(positions[-1].tolist()) if len(ops) > 0 else tuple(initial)
+        end_down = bool(down[-1]) if len(ops) > 0 else pen_down
+        # Strokes, as row ranges from the pen-down to the pen-up command (both included).
+        was_down = np.concatenate([[pen_down], down[:-1]])
+        firsts = np.flatnonzero((commands == 1) & ~was_down)
+        lasts = np.flatnonzero((commands == 0) & was_down)
+        # If the page starts with the pen down, the rows up to the first pen-up stay in front.
+        head = int(lasts[0]) + 1 if pen_down and len(lasts) > 0 else 0
+        lasts = lasts[lasts >= head]
+        firsts = firsts[firsts >= head][:len(lasts)]
+        if len(lasts) < 2:
+            return self._slice(0, self._n), end_position, end_down
+        # Absolute coordinates, because the rows are moved.
+        filled = coords.copy()
+        moves = IS_MOVE[ops]
+        filled[moves, :2] = positions[moves]
+        origin = positions[head - 1] if head > 0 else np.asarray(initial, dtype=float)
+        starts = np.vstack([positions[first - 1] if first > 0 else origin for first in firsts.tolist()])
+        ends = positions[lasts]
+        reversible = np.zeros(len(firsts), dtype=bool)
+        if reverse:
+            for k, (first, last) in enumerate(zip(firsts.tolist(), lasts.tolist())):
+                inner = slice(first + 1, last)
+                g5 = ops[inner] == OP["G5"]
+                reversible[k] = (np.all(moves[inner] | (ops[inner] == OP["COMMENT"]) | (commands[inner] == 1))
+                                 and not np.isnan(coords[inner][g5, 2:6]).any())
+        order, flipped = nearest_neighbour_order(starts, ends, reversible, origin)
+        if improve:
+            order, flipped = two_opt(starts, ends, reversible, order, flipped, origin)
+        before = path_length(starts, ends, origin)
+        after = path_length(np.where(flipped[:, None], ends[order], starts[order])
+                            , np.where(flipped[:, None], starts[order], ends[order]), origin)
+        if after >= before:
+            return self._slice(0, self._n), end_position, end_down
+        # Rows between strokes, which are not moves, stay in front of the following stroke.
+        travel_starts = np.concatenate([[head], lasts[:-1] + 1])
+        parts = [self._rows(np.arange(head), filled)
+                 , self._rows(np.arange(head, firsts[0])[~moves[head:firsts[0]]], filled)]
+        for k, flip in zip(order.tolist(), flipped.tolist()):
+            if k > 0:
+                travel = np.arange(travel_starts[k], firsts[k])
+                parts.append(self._rows(travel[~moves[travel]], filled))
+            start = ends[k] if flip else starts[k]
+            parts.append(GCode.from_arrays([OP["G0"]], np.concatenate([start, np.full(len(WORDS) - 2, np.nan)])[None]))
+            if flip:
+                parts.append(self._reversed_rows(firsts[k], lasts[k], filled, positions))
+            else:
+                parts.append(self._rows(np.arange(firsts[k], lasts[k] + 1), filled))
+        parts.append(self._rows(np.arange(lasts[-1] + 1, len(ops)), filled))
+        return GCode.concatenate(parts), end_position, end_down
+
+    def _rows(self, rows: np.ndarray, coords: np.ndarray) -> "GCode":
+        # GCode of the given rows, with coords instead of the own coordinates.
+        ops, _ = self._arrays()
+        rows = np.asarray(rows, dtype=np.int64)
+        text = {i: self._text[row] for i, row in enumerate(rows.tolist()) if row in self._text}
+        return GCode.from_arrays(ops[rows], coords[rows], text)
+
+    def _reversed_rows(self, first: int, last: int, coords: np.ndarray, positions: np.ndarray) -> "GCode":
+        # The stroke from row first (pen down) to row last (pen up), drawn backwards. Coordinates must be absolute.
+        ops, _ = self._arrays()
+        inner = np.arange(last - 1, first, -1)
+        new_ops = ops[inner].copy()
+        new_coords = coords[inner].copy()
+        moves = IS_MOVE[new_ops]
+        # Every move now ends, where it started.
+        new_coords[moves, :2] = positions[inner[moves] - 1]
+        arcs = (new_ops == OP["G2"]) | (new_ops == OP["G3"])
+        centers = positions[inner[arcs] - 1] + np.nan_to_num(coords[inner[arcs], 2:4])
+        new_coords[arcs, 2:4] = centers - positions[inner[arcs]]
+        clockwise = new_ops == OP["G2"]
+        new_ops[arcs] = OP["G2"]
+        new_ops[arcs & clockwise] = OP["G3"]
+        bezier = new_ops == OP["G5"]
+        new_coords[bezier, 2:6] = coords[inner[bezier]][:, [4, 5, 2, 3]]
+        text = {i: self._text[row] for i, row in enumerate(inner.tolist()) if row in self._text}
+        stroke = GCode.from_arrays(new_ops, new_coords, text)
+        return GCode.concatenate([self._rows([first], coords), stroke, self._rows([last], coords)])
+
+    def clean(self, remove: bool = False):
+        # Comment instead of remove, unless remove is True.
         # 1) Remove PENUP if already up and PENDOWN if already down.
         # 2) Remove successive G0 commands. Ignore comments and empty lines.
         #    Carry coordinates, if not explicitly specified in the new line.
-        unclean = self.get_lines()
-        rm_ids = []
-        pen_down = None
-        for i, line in enumerate(unclean):
-            if line in [PEN["DOWN"], PEN["UP"]]:
-                if pen_down is not None:
-                    if pen_down and line == PEN["DOWN"] or not pen_down and line == PEN["UP"]:
-                        rm_ids.append(i)
-                pen_down = True if line == PEN["DOWN"] else False
-        semiclean = [x if not i in rm_ids else "# " + x + " CLEANED" for i, x in enumerate(unclean)]
-        # Before collapsing the G0 commands, replace PENUP and PENDOWN commands because they also start with G0.
-        semiclean = ['PENDOWN' if line == PEN["DOWN"] else 'PENUP' if line == PEN["UP"] else line for line in semiclean]
-        rm_ids = []
-        add_coords = []
-        carry_x = None
-        carry_y = None
-        started = False
-        for i, line in enumerate(semiclean):
-            if line.startswith("#") or line == "":
-                continue
-            elif not started:
-                started = True
-            elif line.startswith('G0') and last_line.startswith('G0'):
-                last_x, last_y = get_coordinate(last_line, "X"), get_coordinate(last_line, "Y")
-                new_x, new_y = get_coordinate(line, "X"), get_coordinate(line, "Y")
-                if new_x is None:
-                    if last_x is not None:
-                        carry_x = last_x
-                        add_coords.append((i, "X", last_x))
-                    elif carry_x is not None:
-                        add_coords.append((i, "X", carry_x))
-                if new_y is None:
-                    if last_y is not None:
-                        carry_y = last_y
-                        add_coords.append((i, "Y", last_y))
-                    elif carry_y is not None:
-                        add_coords.append((i, "Y", carry_y))
-                rm_ids.append(last_idx)
-            elif not line.startswith('G0'):
-                carry_x = None
-                carry_y = None
-            elif line.startswith('G0'):
-                pass
-            else:
-                warn(f"GCode.clean(): Line {line} not expected.")
-            last_line = line
-            last_idx = i
-        commented = [x if not i in rm_ids else "# " + x + " CLEANED" for i, x in enumerate(semiclean)]
-        for tup in add_coords:
-            idx, coord, value = tup
-            if not commented[idx].startswith("#"):
-                commented[idx] = add_coordinate(commented[idx], coord, value)
-        commented = [PEN["DOWN"] if line == 'PENDOWN' else PEN['UP'] if line == 'PENUP' else line for line in commented]
-        self.commandstr = "\n".join(x for x in commented)
+        # See GCodeCleaner, which does this in a single pass.
+        with span("clean", lines=self._n):
+            cleaner = GCodeCleaner(remove=remove)
+            cleaned = GCode.concatenate([cleaner.feed(self), cleaner.flush()])
+            self._replace(*cleaned._arrays(), cleaned._text, inplace=True)
 
     def invert_coordinate(self, direction: int, inplace: bool = False) -> "GCode":
         # One variable is mirrored along the other axis.
-        new_commandstr = ""
-        for line in self.commandstr.split("\n"):
-            if line[0:2] in ["G0", "G1", "G2", "G3", "G5"] and not line in [PEN["UP"], PEN["DOWN"]]:
-                new_line = line
-                old_coords = {}
-                for coord in COORDS:
-                    old = get_coordinate(line, coord)
-                    if old is not None:
-                        old_coords[coord] = old
-                for coord in old_coords.keys():
-                    new_coord = old_coords[coord]
-                    if direction == 0 and coord in ["X", "I", "P"]:
-                        new_coord = (-1) * old_coords[coord]
-                    elif direction == 1 and coord in ["Y", "J", "Q"]:
-                        new_coord = old_coords[correspondent] * np.sin(angle) + old_coords[coord] * np.cos(angle)
-                    new_line = replace_coordinate(new_line, coord, new_coord)
-                new_commandstr += new_line + "\n"
-            else:
-                new_commandstr += line + "\n"
-        if inplace:
-            self.commandstr = new_commandstr
-        else:
-            return self.__class__(new_commandstr)
+        # direction 0 mirrors X, direction 1 mirrors Y.
+        mirror = np.identity(3)
+        mirror[direction, direction] = -1
+        return self.transform(mirror, inplace)
 
     def rotate(self, angle: float, inplace: bool = False) -> "GCode":
         # Rotate the Gcode around the center point by angle degrees. Counterclockwise.
         # The center point is (0,0)
         angle = angle * np.pi / 180
-        new_commandstr = ""
-        for line in self.commandstr.split("\n"):
-            if line[0:2] in ["G0", "G1", "G2", "G3", "G5"] and not line in [PEN["UP"], PEN["DOWN"]]:
-                new_line = line
-                old_coords = {}
-                for coord in COORDS:
-                    old = get_coordinate(line, coord)
-                    if old is not None:
-                        old_coords[coord] = old
-                for coord in old_coords.keys():
-                    if coord in ["X", "I", "P"]:
-                        correspondent = "Y" if coord == "X" else "J" if coord == "I" else "Q"
-                        old_correspondent = old_coords[correspondent] if correspondent in old_coords else carry[correspondent]
-                        new_coord = old_coords[coord] * np.cos(angle) - old_correspondent * np.sin(angle)
-                        if not correspondent in old_coords:
-                            new_correspondent = old_coords[coord] * np.sin(angle) - carry[correspondent] * np.cos(angle)
-                            new_line = add_coordinate(new_line, correspondent, new_correspondent)
-                    elif coord in ["Y", "J", "Q"]:
-                        correspondent = "X" if coord == "Y" else "I" if coord == "J" else "P"
-                        old_correspondent = old_coords[correspondent] if correspondent in old_coords else carry[correspondent]
-                        new_coord = old_correspondent * np.sin(angle) + old_coords[coord] * np.cos(angle)
-                        if not correspondent in old_coords:
-                            new_correspondent = carry[correspondent] * np.cos(angle) - old_coords[coord] * np.sin(angle)
-                            new_line = add_coordinate(new_line, correspondent, new_correspondent)
-                    new_line = replace_coordinate(new_line, coord, new_coord)
-                new_commandstr += new_line + "\n"
-                carry = {co: old_coords[co] if co in old_coords else carry[co] for co in ["X", "Y"]}
-            else:
-                new_commandstr += line + "\n"
-        if inplace:
-            self.commandstr = new_commandstr
-        else:
-            return self.__class__(new_commandstr)
-    
-    def curves2g1(self, interval: float = 0.1, inplace: bool = False) -> None:
-        # Replaces G2 and G3 commands with G1 commands.
-        first = True
-        new_commandstr = ""
-        for line in self.commandstr.split("\n"):
-            if line[0:2] in ["G0", "G1", "G2", "G3", "G5"] and not line in [PEN["UP"], PEN["DOWN"]]:
-                if first:
-                    # First line must be G0 or G1.
-                    if line[0:2] not in ["G0", "G1"]:
-                        raise ValueError("The first Gcode command must be G0 or G1.")
-                    start = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-                    if start[0] is None or start[1] is None:
-                        raise ValueError("The first G0 or G1 command must have X and Y coordinates.")
-                    first = False
-                if line[0:2] in ["G2", "G3"]:
-                    new_commandstr += arc2g1(start, line, interval) + "\n"
-                elif line[0:2] == "G5":
-                    new_commandstr += bezier2g1(start, line, interval) + "\n"
-                else:
-                    new_commandstr += line + "\n"
-                new_x = get_coordinate(line, "X")
-                new_y = get_coordinate(line, "Y")
-                start = np.array([new_x if new_x is not None else start[0], new_y if new_y is not None else start[1]])
-            else:
-                new_commandstr += line + "\n"
-        if inplace:
-            self.commandstr = new_commandstr
-        else:
-            return self.__class__(new_commandstr)
-    
+        return self.transform([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]], inplace)
+
+    def curves2g1(self, interval: float = None, inplace: bool = False, tolerance: float = 0.01) -> None:
+        # Replaces G2, G3 and G5 commands with G1 commands.
+        # All curves are flattened in one batch. By default, the number of segments keeps the chordal error
+        # below tolerance (in mm). If interval is given, the segments have about this length instead.
+        ops, coords = self._arrays()
+        moves = np.flatnonzero(IS_MOVE[ops])
+        if len(moves) > 0:
+            # First line must be G0 or G1.
+            if ops[moves[0]] not in [OP["G0"], OP["G1"]]:
+                raise ValueError("The first Gcode command must be G0 or G1.")
+            if np.any(np.isnan(coords[moves[0], :2])):
+                raise ValueError("The first G0 or G1 command must have X and Y coordinates.")
+        with span("curves2g1", lines=self._n) as s:
+            flattened = self._flattened(interval, tolerance)
+            s.set(lines_out=len(flattened[0]))
+        return self._replace(*flattened, inplace)
+
+    def _flattened(self, interval: float = None, tolerance: float = 0.01
+                   , initial: tuple[float] = (0, 0)) -> tuple[np.ndarray, np.ndarray, dict[int, str]]:
+        # Arrays of GCode.curves2g1(), without its checks.
+        ops, coords = self._arrays()
+        positions = self._positions(initial)
+        starts = np.vstack([np.reshape(initial, (1, 2)), positions[:-1]]) # Position before each row.
+        counts = np.ones(self._n, dtype=np.int64)
+        beziers = np.flatnonzero(ops == OP["G5"])
+        arcs = np.flatnonzero((ops == OP["G2"]) | (ops == OP["G3"]))
+        bezier_points, counts[beziers] = flatten_beziers(starts[beziers], coords[beziers, 2:4], coords[beziers, 4:6]
+                                                         , positions[beziers], tolerance=tolerance, interval=interval)
+        arc_points, counts[arcs] = flatten_arcs(starts[arcs], starts[arcs] + coords[arcs, 2:4], positions[arcs]
+                                                , ops[arcs] == OP["G2"], tolerance=tolerance, interval=interval)
+        # Every row is repeated count times. The repeated curve rows become the G1 segments (with the curve's feed rate).
+        new_starts = np.cumsum(counts) - counts
+        new_ops = np.repeat(ops, counts)
+        new_coords = np.repeat(coords, counts, axis=0)
+        new_coords[IS_CURVE[new_ops], 2:6] = np.nan
+        new_ops[IS_CURVE[new_ops]] = OP["G1"]
+        new_coords[expand_ranges(new_starts[beziers], counts[beziers]), :2] = bezier_points
+        new_coords[expand_ranges(new_starts[arcs], counts[arcs]), :2] = arc_points
+        new_starts = new_starts.tolist()
+        text = {new_starts[i]: line for i, line in self._text.items()}
+        return new_ops, new_coords, text
+
+    def segments(self, tolerance: float = 0.05, initial: tuple[float] = (0, 0)) -> dict[str, np.ndarray]:
+        # The drawing as straight line segments, for previews. Curves are flattened (see GCode.curves2g1()).
+        # "down": (n, 2, 2) array of pen-down segments [[x0, y0], [x1, y1]], "travel": the same for pen-up moves,
+        # "dots": (n, 2) array of positions, where the pen goes down and up without moving.
+        ops, coords, text = self._flattened(tolerance=tolerance, initial=initial)
+        positions = carry_positions(coords, initial)
+        starts = np.vstack([np.reshape(initial, (1, 2)), positions[:-1]])
+        down, commands = pen_states(ops, text)
+        moves = IS_MOVE[ops]
+        lines = np.stack([starts, positions], axis=1)
+        was_down = np.concatenate([[False], down[:-1]])
+        firsts = np.flatnonzero((commands == 1) & ~was_down)
+        lasts = np.flatnonzero((commands == 0) & was_down)
+        firsts = firsts[:len(lasts)]
+        moves_before = np.concatenate([[0], np.cumsum(moves)])
+        dots = firsts[moves_before[lasts] == moves_before[firsts]]
+        return {"down": lines[moves & down], "travel": lines[moves & ~down], "dots": positions[dots]}
+
     def last_position(self):
-        x = None
-        y = None
-        for line in self.get_lines():
-            if line[0:2] in ["G0", "G1", "G2", "G3", "G5"] and not line in [PEN["UP"], PEN["DOWN"]]:
-                x = get_coordinate(line, "X")
-                y = get_coordinate(line, "Y")
-        return (x, y)
+        ops, coords = self._arrays()
+        moves = np.flatnonzero(IS_MOVE[ops])
+        if len(moves) == 0:
+            return (None, None)
+        x, y = coords[moves[-1], :2].tolist()
+        return (x if x == x else None, y if y == y else None)
 
 
-    def append(self, other: "GCode", inplace: bool = True):
+    def append(self, other: "GCode|str", inplace: bool = True):
+        if isinstance(other, str):
+            other = GCode(other)
         if inplace:
-            self.commandstr += "\n" + other.commandstr
+            self._extend(*other._arrays(), other._text)
         else:
-            return self.__class__(self.commandstr + "\n" + other.commandstr)
+            return self.__class__.concatenate([self, other])
 
     def get_lines(self, skip_comments: bool = False):
         if not skip_comments:
             return self.commandstr.split("\n")
         else:
             return [x for x in self.commandstr.split("\n") if not x.startswith("#")]
-    
-    def add_command(self, command: str, comment: str = None):
+
+    def add_command(self, command: "str|GCode", comment: str = None):
         if comment is not None:
-            if command in [PEN["DOWN"], PEN["UP"]]:
+            if isinstance(command, str) and command in [PEN["DOWN"], PEN["UP"]]:
                 warn(f"Did not add comment because command is {command}. This comment could interfere in GCode.clean().")
             else:
-                self.commandstr += "\n# " + comment
-        self.commandstr += "\n" + command
+                self._extend([OP["COMMENT"]], np.full((1, len(WORDS)), np.nan), {0: "# " + comment})
+        self.append(command)
 
     def __len__(self):
         # Returns number of lines
-        return self.commandstr.count("\n") + 1
-    
+        return self._n
+
     def __eq__(self, other):
-        # Comments are on extra lines.
+        # Comments are ignored.
         # This equality operator only works on two cleaned GCode objects. It expects standard format.
-        result = True # until proven otherwise.
-        if self.commandstr == other.commandstr:
-            return result
-        sugo = [x for x in self.get_lines() if not x.startswith("#") and not x == ""]
-        other_sugo = [x for x in other.get_lines() if not x.startswith("#") and not x == ""]
-        for line, otherline in zip(sugo, other_sugo):
-            if line == otherline:
-                continue
-            else:
-                for coord in COORDS:
-                    if coord in line and coord in otherline:
-                        thisx = get_coordinate(line, coord)
-                        otherx = get_coordinate(otherline, coord)
-                        if not np.isclose(thisx, otherx):
-                            result = False
-                    elif coord not in line and coord not in otherline:
-                        continue
-                    else:
-                        result = False
-        return result
-
-    def save(self, path: str, pure: bool = False):
+        if self._str is not None and self._str == other._str:
+            return True
+        ops, coords = self._arrays()
+        other_ops, other_coords = other._arrays()
+        code = ops != OP["COMMENT"]
+        other_code = other_ops != OP["COMMENT"]
+        if code.sum() != other_code.sum() or np.any(ops[code] != other_ops[other_code]):
+            return False
+        texts = [self._text[i] for i in np.flatnonzero(ops == OP["OTHER"]).tolist()]
+        other_texts = [other._text[i] for i in np.flatnonzero(other_ops == OP["OTHER"]).tolist()]
+        return texts == other_texts and np.allclose(coords[code], other_coords[other_code], equal_nan=True)
+
+    def save(self, path: str, pure: bool = False, precision: int = None, tolerance: float = None, modal: bool = True):
+        # precision: If given, the output is compacted (and pure), see GCodeCompactor.
         with open(path, "w") as f:
-            if pure:
-                f.write(self.pure_code_str())
+            if pure or precision is not None:
+                f.write(self.pure_code_str(precision, tolerance, modal))
             else:
                 f.write(self.commandstr)
-    
+
     @classmethod
     def load(cls, path: str):
         with open(path, "r") as f:
-            return cls(f.read())
+            gcode = cls(f.read())
+        count("gcode.lines_parsed", len(gcode))
+        return gcode
+
+class GCodeCleaner:
+    # Streaming version of GCode.clean(). Feed the GCode in consecutive blocks, and get the cleaned blocks back.
+    # Single pass over the opcodes. Removed rows are marked in a boolean mask.
+    # If a block ends with a G0 command (followed by comments or removed rows at most), this tail is held back,
+    # because the next block may make it redundant. GCodeCleaner.flush() returns it at the end.
+
+    def __init__(self, remove: bool = False, pen_down: bool = None):
+        # pen_down: Pen state before the first block, None if unknown.
+        #           E.g. False for a block, which starts right after a PEN["PAUSE"] of a cleaned GCode.
+        self.remove = remove
+        self.pen_down = pen_down
+        self.last_op = None
+        self.carry_x = None
+        self.carry_y = None
+        self._tail = None # (ops, coords, new_coords, text, removed) of the held back rows. Starts with the G0.
+
+    def feed(self, gcode: GCode) -> GCode:
+        ops, coords = gcode._arrays()
+        new_coords = coords.copy()
+        removed = np.zeros(len(ops), dtype=bool)
+        text = gcode._text
+        offset = 0
+        last_idx = None
+        if self._tail is not None:
+            tail_ops, tail_coords, tail_new_coords, tail_text, tail_removed = self._tail
+            offset = len(tail_ops)
+            ops = np.concatenate([tail_ops, ops])
+            coords = np.concatenate([tail_coords, coords])
+            new_coords = np.concatenate([tail_new_coords, new_coords])
+            removed = np.concatenate([tail_removed, removed])
+            text = {**tail_text, **{offset + i: line for i, line in text.items()}}
+            last_idx = 0
+        xs, ys = coords[:, 0].tolist(), coords[:, 1].tolist()
+        # Pen commands also include other Z moves, like "G0 Z7". See pen_states().
+        commands = pen_states(ops, text)[1].tolist()
+        pen_down, last_op, carry_x, carry_y = self.pen_down, self.last_op, self.carry_x, self.carry_y
+        for i, op in enumerate(ops[offset:].tolist(), start=offset):
+            if op == OP["COMMENT"]:
+                continue
+            if commands[i] >= 0:
+                if pen_down is not None and pen_down == (commands[i] == 1):
+                    removed[i] = True
+                    continue
+                pen_down = commands[i] == 1
+            if op == OP["G0"] and last_op == OP["G0"]:
+                last_x, last_y = xs[last_idx], ys[last_idx]
+                if xs[i] != xs[i]: # nan, i.e. X not given.
+                    if last_x == last_x:
+                        carry_x = last_x
+                        new_coords[i, 0] = last_x
+                    elif carry_x is not None:
+                        new_coords[i, 0] = carry_x
+                if ys[i] != ys[i]:
+                    if last_y == last_y:
+                        carry_y = last_y
+                        new_coords[i, 1] = last_y
+                    elif carry_y is not None:
+                        new_coords[i, 1] = carry_y
+                removed[last_idx] = True
+            elif op != OP["G0"]:
+                carry_x = None
+                carry_y = None
+            last_op = op
+            last_idx = i
+        self.pen_down, self.last_op, self.carry_x, self.carry_y = pen_down, last_op, carry_x, carry_y
+        cut = last_idx if last_op == OP["G0"] else len(ops)
+        self._tail = None
+        if cut < len(ops):
+            tail_text = {i - cut: line for i, line in text.items() if i >= cut}
+            self._tail = (ops[cut:], coords[cut:], new_coords[cut:], tail_text, removed[cut:])
+        text = {i: line for i, line in text.items() if i < cut}
+        return self._build(ops[:cut], coords[:cut], new_coords[:cut], text, removed[:cut])
+
+    def flush(self) -> GCode:
+        # Returns the held back rows. Call at the end of the stream.
+        if self._tail is None:
+            return GCode.from_arrays(np.zeros(0, dtype=np.int8), np.zeros((0, len(WORDS))))
+        gcode = self._build(*self._tail)
+        self._tail = None
+        return gcode
+
+    def clean_iter(self, blocks: Iterable[GCode]) -> Iterator[GCode]:
+        # Cleans a stream of GCode blocks. Empty blocks are skipped.
+        for block in blocks:
+            cleaned = self.feed(block)
+            if len(cleaned) > 0:
+                yield cleaned
+        cleaned = self.flush()
+        if len(cleaned) > 0:
+            yield cleaned
+
+    def _build(self, ops, coords, new_coords, text, removed) -> GCode:
+        if self.remove:
+            keep = ~removed
+            new_index = (np.cumsum(keep) - 1).tolist()
+            text = {new_index[i]: line for i, line in text.items() if keep[i]}
+            return GCode.from_arrays(ops[keep], new_coords[keep], text)
+        text = dict(text)
+        rm_ids = np.flatnonzero(removed)
+        rm_text = {k: text[i] for k, i in enumerate(rm_ids.tolist()) if i in text}
+        for i, line in zip(rm_ids.tolist(), format_gcode(ops[rm_ids], coords[rm_ids], rm_text)):
+            text[i] = "# " + line + " CLEANED"
+        ops = ops.copy()
+        ops[rm_ids] = OP["COMMENT"]
+        new_coords = new_coords.copy()
+        new_coords[rm_ids] = np.nan
+        return GCode.from_arrays(ops, new_coords, text)
+
+class GCodeCompactor:
+    # Compact G-code text for the controller. Feed the GCode in consecutive blocks, and get the lines back.
+    # Comments are left out. Numbers are written with at most precision decimals, without trailing zeros.
+    # The feed rate is only written when it changes, and only for feed moves (G1, G2, G3, G5).
+    # Consecutive G1 moves are merged, as long as the points in between stay within tolerance of the merged line
+    # (default: half the last decimal, i.e. the rounding error) and are passed in order.
+    # modal: Also leave out the opcode of moves, when it is the same as before, and X or Y, when they do not change.
+    #        G0 and G1 moves that go nowhere are left out. Without modal, GCode() parses the lines back into moves.
+    # The state (position, motion mode, feed rate) carries over from block to block. Segments are not merged across blocks.
+
+    def __init__(self, precision: int = 3, tolerance: float = None, modal: bool = True):
+        self.precision = precision
+        self.tolerance = 0.5 * 10.**-precision if tolerance is None else tolerance
+        self.modal = modal
+        self.position = (0., 0.) # Position after the last block, see carry_positions().
+        self.feed_rate = np.nan # Feed rate after the last block.
+        self._mode = None # Last written motion mode (opcode), None if unknown.
+        self._xy = [None, None] # Last written X and Y.
+        self._feed_rate = None # Last written F.
+
+    def format_number(self, value: float) -> str:
+        string = f"{value:.{self.precision}f}"
+        if "." in string:
+            string = string.rstrip("0").rstrip(".")
+        return "0" if string == "-0" else string
+
+    def feed(self, gcode: GCode) -> list[str]:
+        ops, coords = gcode._arrays()
+        code = np.flatnonzero(ops != OP["COMMENT"])
+        text = {k: gcode._text[i] for k, i in enumerate(code.tolist()) if i in gcode._text}
+        ops, coords = ops[code], coords[code]
+        positions = carry_positions(coords, self.position)
+        # The feed rate carries over like a coordinate. carry_positions() takes any two columns.
+        feed_rates = carry_positions(coords[:, [WORD_IDX["F"]] * 2], (self.feed_rate,) * 2)[:, 0]
+        keep = self._merge(ops, positions, feed_rates)
+        commands = pen_states(ops, text)[1].tolist()
+        fmt = self.format_number
+        lines = []
+        for i in np.flatnonzero(keep).tolist():
+            op = int(ops[i])
+            if op == OP["OTHER"]:
+                lines.append(text[i])
+                if commands[i] >= 0:
+                    # Z-only line, e.g. "G0 Z7". It sets the motion mode, and nothing else.
+                    self._mode = _MOVE_NAMES[text[i].split()[0]]
+                else:
+                    self._mode, self._xy, self._feed_rate = None, [None, None], None
+                continue
+            if not IS_MOVE[op]:
+                lines.append(_OP_STR[op])
+                if op != OP["PAUSE"]:
+                    self._mode = OP["G0"] # PEN["UP"] and PEN["DOWN"] are G0 moves.
+                continue
+            xy = [fmt(value) for value in positions[i].tolist()]
+            changed = [xy[k] != self._xy[k] for k in range(2)]
+            if self.modal and op in (OP["G0"], OP["G1"]) and not any(changed):
+                continue
+            words = [_OP_STR[op]] if not self.modal or op != self._mode else []
+            for k in range(2):
+                # Arcs and splines always get both, GRBL rejects arcs without axis words.
+                if changed[k] or not self.modal or IS_CURVE[op]:
+                    words.append(WORDS[k] + xy[k])
+            for k in range(2, 6):
+                if coords[i, k] == coords[i, k]:
+                    words.append(WORDS[k] + fmt(coords[i, k]))
+            if op != OP["G0"] and feed_rates[i] == feed_rates[i]:
+                feed_rate = fmt(feed_rates[i])
+                if feed_rate != self._feed_rate:
+                    words.append("F" + feed_rate)
+                    self._feed_rate = feed_rate
+            lines.append(" ".join(words))
+            self._mode, self._xy = op, xy
+        if len(ops) > 0:
+            self.position = tuple(positions[-1].tolist())
+            self.feed_rate = float(feed_rates[-1])
+        return lines
+
+    def _merge(self, ops: np.ndarray, positions: np.ndarray, feed_rates: np.ndarray) -> np.ndarray:
+        # Rows to keep. Within each run of G1 rows, a row is dropped when the line from the last kept position
+        # to the following row passes it within tolerance. Greedy, so every kept segment is as long as possible.
+        keep = np.ones(len(ops), dtype=bool)
+        g1 = np.append(ops == OP["G1"], False)
+        starts = np.flatnonzero(g1[1:] & ~g1[:-1]) + 1
+        if g1[0]:
+            starts = np.insert(starts, 0, 0)
+        stops = np.flatnonzero(g1[:-1] & ~g1[1:]) + 1
+        # Feed rate of each row, with -1 for none (nan), so rows without a feed rate compare equal.
+        feed_rates = np.where(np.isnan(feed_rates), -1., feed_rates)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            anchor = positions[start - 1] if start > 0 else np.array(self.position)
+            i = start
+            while i < stop:
+                j = i
+                while j + 1 < stop and feed_rates[j + 1] == feed_rates[i] and self._passes(anchor, positions[i:j + 1], positions[j + 1]):
+                    j += 1
+                keep[i:j] = False
+                anchor = positions[j]
+                i = j + 1
+        return keep
+
+    def _passes(self, start: np.ndarray, points: np.ndarray, end: np.ndarray) -> bool:
+        # Whether the line from start to end passes all points in order, within tolerance.
+        direction = end - start
+        length2 = direction @ direction
+        offsets = points - start
+        if length2 == 0:
+            return bool(np.all(np.hypot(offsets[:, 0], offsets[:, 1]) <= self.tolerance))
+        t = offsets @ direction / length2
+        distances = np.abs(offsets[:, 0] * direction[1] - offsets[:, 1] * direction[0]) / np.sqrt(length2)
+        return bool(np.all(distances <= self.tolerance) and np.all(t >= 0) and np.all(t <= 1) and np.all(np.diff(t) >= 0))
 
 class Character:
     # Origin at bottom left
@@ -577,124 +990,194 @@ class Character:
         self.final_position = self.find_final_position()
         self.final_angle = self.find_final_angle() # None for many characters.
 
+    @classmethod
+    def from_metrics(cls, gcode: GCode, width: float, final_position: tuple[float], final_angle: float) -> "Character":
+        # Without analysing the GCode, e.g. for compiled alphabets.
+        character = cls.__new__(cls)
+        character.gcode = gcode
+        character.width = width
+        character.final_position = final_position
+        character.final_angle = final_angle
+        return character
+
     def connect(self, initial_position: tuple[float], initial_angle: float) -> GCode:
         # This method returns a modified GCode to suit the desired boundary conditions
         # set by the preceding character in a connected font.
         # I am setting up the characters such that the first segment can be replaced.
         # 1) Find the final position and angle of the first segment.
-        line = None
-        for i, l in enumerate(self.gcode.get_lines()):
-            if l.startswith('G5'):
-                line = l
-                first_line = i
-                break
-        if line is None:
+        ops, coords = self.gcode._arrays()
+        curves = np.flatnonzero(ops == OP["G5"])
+        if len(curves) == 0:
             raise NotImplementedError(f"sound2font.writemodule.Character.connect() is only implemented for connected characters starting with 'G5'.")
-        p34 = (-1) * np.array([get_coordinate(line, "P"), get_coordinate(line, "Q")])
+        first_line = curves[0]
+        p34 = (-1) * coords[first_line, 4:6]
         final_angle = np.atan2(*np.flip(p34))
-        final_position = [get_coordinate(line, "X"), get_coordinate(line, "Y")]
-        new_line = cubicbezier2gcode(initial_position, final_position, initial_angle, final_angle, (0.3, 0.3)).commandstr
-        return GCode("\n".join([new_line] + self.gcode.get_lines()[first_line+1:]))
+        final_position = coords[first_line, :2]
+        new_line = cubicbezier2gcode(initial_position, final_position, initial_angle, final_angle, (0.3, 0.3))
+        return GCode.concatenate([new_line, self.gcode._slice(first_line+1, len(self.gcode))])
 
     def find_final_position(self):
-        x = None
-        y = None
-        for line in reversed(self.gcode.get_lines()):
-            if x is None:
-                x = get_coordinate(line, "X")
-            if y is None:
-                y = get_coordinate(line, "Y")
-        if x is None:
-            x = 0
-        if y is None:
-            y = 0
+        _, coords = self.gcode._arrays()
+        x, y = 0, 0
+        given_x = np.flatnonzero(~np.isnan(coords[:, 0]))
+        given_y = np.flatnonzero(~np.isnan(coords[:, 1]))
+        if len(given_x) > 0:
+            x = coords[given_x[-1], 0]
+        if len(given_y) > 0:
+            y = coords[given_y[-1], 1]
         return (x, y)
-    
+
     def find_final_angle(self):
-        for line in reversed(self.gcode.get_lines()):
-            if line.startswith("#") or line in ["", PEN["DOWN"], PEN["UP"]]:
-                continue
-            if line.startswith('G2') or line.startswith('G3'):
-                center = np.array([get_coordinate(line, "I"), get_coordinate(line, "J")])
-                end = np.array([get_coordinate(line, "X"), get_coordinate(line, "Y")])
-                theta = np.atan2(*np.flip(end-center))
-                if line.startswith('G2'): # clockwise
-                    return theta - np.pi / 2
-                else: # anti-clockwise
-                    return theta + np.pi / 2
-            if line.startswith('G5'):
-                p34 = (-1) * np.array([get_coordinate(line, "P"), get_coordinate(line, "Q")])
-                return np.atan2(*np.flip(p34))
-        return None
+        ops, coords = self.gcode._arrays()
+        curves = np.flatnonzero(IS_CURVE[ops])
+        if len(curves) == 0:
+            return None
+        line = curves[-1]
+        if ops[line] in [OP["G2"], OP["G3"]]:
+            center = coords[line, 2:4]
+            end = coords[line, :2]
+            theta = np.atan2(*np.flip(end-center))
+            if ops[line] == OP["G2"]: # clockwise
+                return theta - np.pi / 2
+            else: # anti-clockwise
+                return theta + np.pi / 2
+        p34 = (-1) * coords[line, 4:6]
+        return np.atan2(*np.flip(p34))
 
     def calculate_width(self):
-        # This is technically the maximum x.
+        # This is technically the maximum x, including the inner points of curves.
         # But letters all start at x=0.
         # If they reach x<0 in the middle, the maximum x is still the relevant quantity.
-        # I will ignore inner points of Bezier curves because this will entail a large effort with no tangible benefit.
-        # In any case, for connected fonts, we really care about the endpoint.
-        old_x = 0
-        cursor = (0,0)
-        for line in self.gcode.get_lines():
-            x = None
-            if line.startswith('G0'):
-                x = get_coordinate(line, "X")
-                cur_y = get_coordinate(line, "Y")
-                cursor = (x if x is not None else cursor[0], cur_y if cur_y is not None else cursor[1])
-            elif line.startswith('G1'):
-                x = get_coordinate(line, "X")
-                cur_y = get_coordinate(line, "Y")
-                cursor = (x if x is not None else cursor[0], cur_y if cur_y is not None else cursor[1])
-            elif line.startswith('G2') or line.startswith('G3'):
-                x = circle_max(line, "X", start=cursor)
-                cursor = (get_coordinate(line, "X"), get_coordinate(line, "Y"))
-            elif line.startswith('G5'):
-                # From Bezier curce, just analyse the endpoints. The endpoint of the letter should be the max x point anyway.
-                x = get_coordinate(line, "X")
-                cur_y = get_coordinate(line, "Y")
-                cursor = (x if x is not None else cursor[0], cur_y if cur_y is not None else cursor[1])
-            if x is not None and x > old_x:
-                old_x = x
-        return old_x
-    
+        box = self.bounding_box()
+        return max(0, box[2]) if box is not None else 0
+
+    def bounding_box(self) -> tuple[float]:
+        # (x_min, y_min, x_max, y_max), see GCode.bounding_box().
+        return self.gcode.bounding_box()
+
     def resize(self, factor):
-        new_gcode = GCode("")
-        for line in self.gcode.get_lines():
-            new_line = line
-            for coord in COORDS:
-                old = get_coordinate(line, coord)
-                new_line = replace_coordinate(new_line, coord, old*factor if old is not None else "dummy")
-            new_gcode.add_command(new_line)
-        self.gcode = new_gcode
+        # Lazy. The scaling is composed with later transforms of the glyph, e.g. the translation in Text2Font.
+        self.gcode = self.gcode.scale(factor)
         self.width *= factor
-        self.final_position = self.find_final_position()
+        self.final_position = (self.final_position[0] * factor, self.final_position[1] * factor)
 
 class Alphabet:
     
-    def __init__(self, symbols: dict[Character]):
+    def __init__(self, symbols: dict[Character], max_pairs: int = 8192):
         # self.symbols = {'a': Character, 'b': Character ... '.': Character .... 'Z': Character}
         self.symbols = symbols
+        # LRU cache {(last_char, char): GCode} for connected fonts. See Alphabet.connect().
+        self.max_pairs = max_pairs
+        self._pairs = OrderedDict()
+        self._glyph_table = None
     
     def resize(self, factor: float):
         for key in self.symbols:
             self.symbols[key].resize(factor)
+        self._pairs.clear()
+        self._glyph_table = None
+
+    def glyph_table(self) -> GlyphTable:
+        # Widths and classes of all symbols as arrays, for Text2Font.layout(). Cached until the next resize.
+        if self._glyph_table is None:
+            self._glyph_table = GlyphTable(self.symbols)
+        return self._glyph_table
+
+    def connect(self, last_char: str, char: str) -> GCode:
+        # GCode of char, connected to the end of last_char. See Character.connect().
+        # The result only depends on the pair, so it is cached. Do not modify the returned GCode in place.
+        key = (last_char, char)
+        gcode = self._pairs.get(key)
+        if gcode is not None:
+            self._pairs.move_to_end(key)
+            return gcode
+        gcode = self.symbols[char].connect([0, self.symbols[last_char].final_position[1]]
+                                           , self.symbols[last_char].final_angle)
+        self._pairs[key] = gcode
+        if len(self._pairs) > self.max_pairs:
+            self._pairs.popitem(last=False)
+        return gcode
 
     def save(self, path: str):
-        with open(path, "w") as f:
-            json.dump(self.symbols, f)
+        # Same as Alphabet.compile(). Use Alphabet.save_strings() for the human readable format.
+        self.compile(path)
     
     def save_strings(self, path: str):
         with open(path, "w") as f:
             str_dict = {key: self.symbols[key].gcode.commandstr for key in self.symbols}
             json.dump(str_dict, f)
-    
+
+    def compile(self, path: str):
+        # Binary format, which Alphabet.open() memory-maps:
+        # ALPHABET_MAGIC, header length (uint64), JSON header with the glyph metrics and text lines,
+        # then the opcodes (int8) and coordinates (float64, one column per entry in WORDS) of all glyphs.
+        # Every part starts at a multiple of 8 bytes.
+        symbols = {}
+        ops = []
+        coords = []
+        start = 0
+        for key, character in self.symbols.items():
+            char_ops, char_coords = character.gcode._arrays()
+            symbols[key] = {"start": start, "rows": len(char_ops), "width": float(character.width)
+                            , "final_position": [float(x) for x in character.final_position]
+                            , "final_angle": None if character.final_angle is None else float(character.final_angle)
+                            , "text": character.gcode._text}
+            ops.append(char_ops)
+            coords.append(char_coords)
+            start += len(char_ops)
+        header = json.dumps({"version": 1, "words": WORDS, "rows": start, "symbols": symbols}).encode()
+        header += b" " * (-len(header) % 8)
+        ops = np.concatenate(ops).astype(np.int8) if ops else np.zeros(0, dtype=np.int8)
+        coords = np.concatenate(coords).astype("<f8") if coords else np.zeros((0, len(WORDS)), dtype="<f8")
+        with open(path, "wb") as f:
+            f.write(ALPHABET_MAGIC)
+            f.write(np.uint64(len(header)).astype("<u8").tobytes())
+            f.write(header)
+            f.write(ops.tobytes())
+            f.write(b"\0" * (-len(ops) % 8))
+            f.write(coords.tobytes())
+
+    @classmethod
+    def open(cls, path: str):
+        # Opens an alphabet written by Alphabet.compile(). The glyphs are read-only views of the memory-mapped file,
+        # so nothing is parsed or computed until a glyph is used.
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(ALPHABET_MAGIC)] != ALPHABET_MAGIC:
+            raise ValueError(f"{path} is not a compiled alphabet. See Alphabet.compile().")
+        offset = len(ALPHABET_MAGIC)
+        header_length = int(np.frombuffer(buffer, dtype="<u8", count=1, offset=offset)[0])
+        offset += 8
+        header = json.loads(bytes(buffer[offset:offset + header_length]))
+        offset += header_length
+        if header["version"] != 1 or header["words"] != WORDS:
+            raise ValueError(f"Compiled alphabet {path} has an incompatible format. Compile it again.")
+        rows = header["rows"]
+        ops = np.frombuffer(buffer, dtype=np.int8, count=rows, offset=offset)
+        offset += rows + (-rows % 8)
+        coords = np.frombuffer(buffer, dtype="<f8", count=rows * len(WORDS), offset=offset).reshape(rows, len(WORDS))
+        symbols = {}
+        for key, meta in header["symbols"].items():
+            start, stop = meta["start"], meta["start"] + meta["rows"]
+            text = {int(i): line for i, line in meta["text"].items()}
+            gcode = GCode.from_arrays(ops[start:stop], coords[start:stop], text)
+            symbols[key] = Character.from_metrics(gcode, meta["width"], tuple(meta["final_position"]), meta["final_angle"])
+        return cls(symbols)
+
     @classmethod
     def load(cls, path: str):
-        with open(path, "r") as f:
-            return cls(json.load(f))
+        # Compiled alphabets (see Alphabet.compile()) and JSON files {character: G-code string}.
+        with open(path, "rb") as f:
+            compiled = f.read(len(ALPHABET_MAGIC)) == ALPHABET_MAGIC
+        if compiled:
+            return cls.open(path)
+        return cls.load_from_string_dict(path)
     
     @classmethod
     def load_from_string_dict(cls, path: str):
         with open(path, "r") as f:
             str_dict = json.load(f)
-        return cls({key: Character(GCode(string)) for key, string in str_dict.items()})
+        with span("alphabet_load", glyphs=len(str_dict)):
+            alphabet = cls({key: Character(GCode(string)) for key, string in str_dict.items()})
+        count("gcode.lines_parsed", sum(len(character.gcode) for character in alphabet.symbols.values()))
+        return alphabet
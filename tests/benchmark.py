@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+
+from sound2font.audiomodule import AudioBuffer, AudioData
+from sound2font.text2font import Text2Font
+from sound2font.writemodule import Alphabet, GCode
+from synthetic import CHARS, synthetic_alphabet, synthetic_text, synthetic_wav
+
+# Offline benchmark suite. Everything is generated (see synthetic.py): alphabets for connected and disconnected fonts,
+# text corpora of increasing size and WAV files of increasing length.
+# Every stage is timed (best and median of repeat runs) and run once more under tracemalloc for its peak memory.
+# Results go to JSON, and can be compared against a stored baseline with thresholds.
+# The outputs of the faster paths are checked in test_benchmark.py, which also runs this suite as a manual test.
+# Run as: python tests/benchmark.py --output results.json [--baseline baseline.json] [--quick]
+TEXT_SIZES = [200, 2000, 20000]  # Words.
+AUDIO_SECONDS = [10, 60, 600]
+QUICK_TEXT_SIZES = [100, 1000]
+QUICK_AUDIO_SECONDS = [5, 30]
+
+
+def measure(function: Callable, setup: Callable = None, repeat: int = 3) -> dict:
+    # Times function(*setup()) repeat times, then runs it once more under tracemalloc.
+    # setup() is not timed, e.g. to give each run a fresh copy of its input.
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    args = setup() if setup is not None else ()
+    tracemalloc.start()
+    try:
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": statistics.median(times), "peak_bytes": peak}
+
+
+def run_benchmarks(text_sizes: list[int] = None, audio_seconds: list[float] = None, repeat: int = 3
+                   , log: Callable[[str], None] = None) -> dict:
+    # Returns {"meta": {...}, "results": {"stage/size": measure() result}}.
+    text_sizes = TEXT_SIZES if text_sizes is None else text_sizes
+    audio_seconds = AUDIO_SECONDS if audio_seconds is None else audio_seconds
+    results = {}
+
+    def record(name: str, result: dict) -> None:
+        results[name] = result
+        if log is not None:
+            log(f"{name}: {result['seconds']:.4f} s, peak {result['peak_bytes'] / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        fonts = {}
+        for name, connected in [("connected", True), ("disconnected", False)]:
+            fonts[name] = synthetic_alphabet(os.path.join(directory, f"{name}.json"), connected)
+            record(f"alphabet_load_{name}/{len(CHARS)}", measure(lambda path=fonts[name]: Alphabet.load_from_string_dict(path)
+                                                                  , repeat=repeat))
+        for size in text_sizes:
+            text = synthetic_text(size)
+            converted = {}
+            for name, connected in [("connected", True), ("disconnected", False)]:
+                text2font = Text2Font(210, 297, fonts[name], connected, 8, 3, string_alphabet=True, char_spacing=0.5)
+                record(f"convert_{name}/{size}", measure(lambda: text2font.convert(text, clean=False), repeat=repeat))
+                converted[name] = text2font.convert(text, clean=False)
+            gcode = converted["connected"]
+
+            def copy() -> tuple:
+                return (GCode.from_arrays(*gcode._arrays(), dict(gcode._text)),)
+
+            record(f"clean/{size}", measure(lambda g: g.clean(), setup=copy, repeat=repeat))
+            # translate() only composes the transform. Accessing the arrays applies it.
+            record(f"translate/{size}", measure(lambda: gcode.translate((10, 20))._arrays(), repeat=repeat))
+            record(f"curves2g1/{size}", measure(lambda: gcode.curves2g1(), repeat=repeat))
+        for seconds in audio_seconds:
+            path = synthetic_wav(os.path.join(directory, f"{seconds}.wav"), seconds)
+            record(f"audio_load/{seconds}", measure(lambda: AudioData.load(path), repeat=repeat))
+            record(f"audio_map/{seconds}", measure(lambda: AudioBuffer.load(path).as_array().sum(), repeat=repeat))
+            record(f"audio_resample/{seconds}", measure(lambda: AudioBuffer.load(path).as_float32(44100, 16000)
+                                                        , repeat=repeat))
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform()
+            , "cpus": os.cpu_count(), "repeat": repeat, "text_sizes": text_sizes, "audio_seconds": audio_seconds}
+    return {"meta": meta, "results": results}
+
+
+def compare(results: dict, baseline: dict, time_threshold: float = 1.25, memory_threshold: float = 1.25
+            , min_seconds: float = 1e-3) -> list[str]:
+    # One message per stage that is slower than time_threshold times the baseline, or needs more than
+    # memory_threshold times its peak memory. Times below min_seconds in both runs are too noisy and not compared.
+    # Stages missing in either run are not compared.
+    regressions = []
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        if max(result["seconds"], reference["seconds"]) >= min_seconds \
+                and result["seconds"] > time_threshold * reference["seconds"]:
+            regressions.append(f"{name}: {result['seconds']:.4f} s, baseline {reference['seconds']:.4f} s "
+                               f"({result['seconds'] / reference['seconds']:.2f}x)")
+        if result["peak_bytes"] > memory_threshold * max(reference["peak_bytes"], 1):
+            regressions.append(f"{name}: peak {result['peak_bytes'] / 1e6:.1f} MB, "
+                               f"baseline {reference['peak_bytes'] / 1e6:.1f} MB")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python tests/benchmark.py"
+                                     , description="Benchmark Text2Font, GCode, Alphabet and AudioData offline.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results.")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed slowdown factor.")
+    parser.add_argument("--memory-threshold", type=float, default=1.25, help="Allowed peak memory factor.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="Small sizes only.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Text sizes in words.")
+    parser.add_argument("--audio-seconds", type=float, nargs="+", default=None)
+    args = parser.parse_args(argv)
+    text_sizes = args.sizes or (QUICK_TEXT_SIZES if args.quick else TEXT_SIZES)
+    audio_seconds = args.audio_seconds or (QUICK_AUDIO_SECONDS if args.quick else AUDIO_SECONDS)
+    results = run_benchmarks(text_sizes, audio_seconds, repeat=args.repeat, log=print)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, time_threshold=args.threshold, memory_threshold=args.memory_threshold)
+    for regression in regressions:
+        print("Regression:", regression)
+    if not regressions:
+        print(f"No regressions against {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
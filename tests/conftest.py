@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+ALPHABETS = os.path.join(os.path.dirname(__file__), os.pardir, "data", "alphabets")
+# Only characters, which both alphabets have.
+SAMPLE_TEXT = ("The quick brown fox jumps over the lazy dog, again and again.\n"
+               "Pack my box with five dozen liquor jugs! Is it extraordinarily heavy?\n\n"
+               "Sphinx of black quartz, judge my vow. Waltz, bad nymph, for quick jigs vex.")
+
+
+@pytest.fixture
+def sample_text() -> str:
+    return SAMPLE_TEXT
+
+
+@pytest.fixture(params=[True, False], ids=["connected", "disconnected"])
+def connected(request) -> bool:
+    return request.param
+
+
+@pytest.fixture
+def make_text2font(connected):
+    # Text2Font(**kwargs) on an A4 page with the font of the connected fixture.
+    from sound2font.text2font import Text2Font
+
+    def make(**kwargs) -> Text2Font:
+        options = dict(width=210, height=297, font_size=8, line_spacing=3, string_alphabet=True
+                       , font_path=os.path.join(ALPHABETS, "connected.json" if connected else "disconnected.json")
+                       , connected=connected)
+        options.update(kwargs)
+        return Text2Font(**options)
+
+    return make
@@ -0,0 +1,96 @@
+import os
+import re
+import select
+import threading
+import time
+from collections import deque
+
+from sound2font.grblmodule import RX_BUFFER_SIZE
+
+# A GRBL controller for the tests of grblmodule, which need no plotter. GRBL 1.1 plans up to 15 motion blocks.
+PLANNER_BLOCKS = 15
+_WORD = re.compile(r"([A-Z])(-?[0-9.]+)")
+
+
+class FakeGrbl:
+    # A GRBL 1.1 stand-in on a pseudo terminal. Connect a GrblSender to self.path.
+    # Lines are taken from a RX buffer of rx_buffer_size bytes into a planner of PLANNER_BLOCKS blocks, and acknowledged then.
+    # Each motion block takes line_time seconds. G4 is acknowledged, when all motion is done.
+    # Unsupported commands (e.g. G5, which GRBL does not have) are answered with "error:20", empty lines with "ok".
+    # self.overflows counts bytes that arrived while the RX buffer was full: a sender that got flow control wrong.
+    # self.received holds every line that was executed.
+    SUPPORTED = {"G0", "G1", "G2", "G3", "G4", "G17", "G20", "G21", "G90", "G91", "G92", "G94"
+                 , "M0", "M2", "M3", "M4", "M5", "M7", "M8", "M9", "M30"}
+
+    def __init__(self, line_time: float = 0., rx_buffer_size: int = RX_BUFFER_SIZE, planner_blocks: int = PLANNER_BLOCKS):
+        import tty
+        self.line_time = line_time
+        self.rx_buffer_size = rx_buffer_size
+        self.planner_blocks = planner_blocks
+        self.master, self.slave = os.openpty()
+        # Without raw mode, the terminal would echo and translate line endings.
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.received = []
+        self.overflows = 0
+        self.max_rx_bytes = 0
+        self._rx = b""
+        self._planner = deque()  # End times of the queued motion blocks.
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._running = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _respond(self, text: str) -> None:
+        os.write(self.master, (text + "\n").encode("ascii"))
+
+    def _run(self) -> None:
+        self._respond("Grbl 1.1h ['$' for help]")
+        while self._running:
+            if select.select([self.master], [], [], 0.001)[0]:
+                # Like GRBL, "\r" ends a line as well.
+                data = os.read(self.master, 4096).replace(b"\r", b"\n")
+                space = self.rx_buffer_size - len(self._rx)
+                self.overflows += max(len(data) - space, 0)
+                self._rx += data[:max(space, 0)]
+                self.max_rx_bytes = max(self.max_rx_bytes, len(self._rx))
+            now = time.monotonic()
+            while self._planner and self._planner[0] <= now:
+                self._planner.popleft()
+            while b"\n" in self._rx and len(self._planner) < self.planner_blocks:
+                raw, self._rx = self._rx.split(b"\n", 1)
+                line = raw.decode("ascii", errors="replace").strip().upper()
+                if not line or line.startswith("$") or line == "?":
+                    # GRBL acknowledges empty lines too, e.g. the "\r\n\r\n" that wakes it up.
+                    self._respond("ok")
+                    continue
+                words = _WORD.findall(line.replace(" ", ""))
+                commands = [f"{letter}{int(float(value))}" for letter, value in words if letter in "GM"]
+                if not words or any(command not in self.SUPPORTED for command in commands):
+                    self._respond("error:20")
+                    continue
+                if "G4" in commands:
+                    # Dwell: wait for all motion to finish.
+                    while self._planner:
+                        time.sleep(max(self._planner.pop() - time.monotonic(), 0))
+                    dwell = dict(words).get("P")
+                    time.sleep(float(dwell) if dwell else 0.)
+                elif any(command in ("G0", "G1", "G2", "G3") for command in commands) or \
+                        (not commands and any(letter in "XYZ" for letter, _ in words)):
+                    start = self._planner[-1] if self._planner else now
+                    self._planner.append(max(start, now) + self.line_time)
+                self.received.append(line)
+                self._respond("ok")
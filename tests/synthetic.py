@@ -0,0 +1,94 @@
+import json
+import wave
+
+import numpy as np
+
+from sound2font.textmodule import DISCONNECTED_CHARS, PUNCTS
+
+# Generated test data for the benchmarks (see benchmark.py) and for tests, which need more than data/alphabets:
+# alphabets with G0/G1/G2/G5 glyphs for connected and disconnected fonts, text corpora of any size and WAV files.
+CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789" + "".join(PUNCTS) + "-'?üäößÄÖÜ"
+
+
+def _f(x: float) -> str:
+    return f"{x:.3f}"
+
+
+def synthetic_glyph(char: str, connected: bool, rng: np.random.Generator) -> str:
+    # G-code string of one glyph, in the format of data/alphabets/*.json. Height about 1.
+    if char in PUNCTS:
+        return f"G0 X{_f(rng.uniform(0, 0.1))} Y0\nPENDOWN\nG1 Y{_f(rng.uniform(0, 0.2))}\nPENUP"
+    width = rng.uniform(0.3, 0.7)
+    joined = connected and char not in DISCONNECTED_CHARS
+    lines = []
+    if joined:
+        # Character.connect() replaces the first segment, which must be a G5.
+        x, y = rng.uniform(0.05, 0.15), rng.uniform(0.3, 0.6)
+        lines += [f"G0 Y{_f(rng.uniform(0.3, 0.6))}", "PENDOWN"
+                  , f"G5 X{_f(x)} Y{_f(y)} I0.03 J0.02 P-0.03 Q-0.02"]
+    else:
+        x, y = rng.uniform(0, width), rng.uniform(0, 1)
+        lines += [f"G0 X{_f(x)} Y{_f(y)}", "PENDOWN"]
+    for _ in range(int(rng.integers(3, 7))):
+        kind = rng.choice(["G1", "G2", "G5", "MOVE"] if not joined else ["G1", "G2", "G5"])
+        tx, ty = rng.uniform(0, width), rng.uniform(0, 1)
+        if kind == "G1":
+            lines.append(f"G1 X{_f(tx)} Y{_f(ty)}")
+        elif kind == "G2":
+            # The center is on the perpendicular bisector of the chord, so start and end are on the circle.
+            t = rng.uniform(-0.5, 0.5)
+            cx, cy = (x + tx) / 2 - t * (ty - y), (y + ty) / 2 + t * (tx - x)
+            lines.append(f"G2 X{_f(tx)} Y{_f(ty)} I{_f(cx - x)} J{_f(cy - y)}")
+        elif kind == "G5":
+            i, j, p, q = rng.uniform(-0.2, 0.2, 4)
+            lines.append(f"G5 X{_f(tx)} Y{_f(ty)} I{_f(i)} J{_f(j)} P{_f(p)} Q{_f(q)}")
+        else:
+            lines += ["PENUP", f"G0 X{_f(tx)} Y{_f(ty)}", "PENDOWN"]
+        x, y = float(_f(tx)), float(_f(ty))
+    if joined:
+        # End at the baseline on the right with a curve, so the next character can connect.
+        lines.append(f"G5 X{_f(width)} Y0.02 I0.05 J-0.1 P-0.05 Q-0.05")
+    else:
+        lines.append("PENUP")
+    return "\n".join(lines)
+
+
+def synthetic_alphabet(path: str, connected: bool, seed: int = 0) -> str:
+    # Writes {character: G-code string} to path, as read by Alphabet.load_from_string_dict(). Returns path.
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        json.dump({char: synthetic_glyph(char, connected, rng) for char in CHARS}, f)
+    return path
+
+
+def synthetic_text(words: int, seed: int = 0) -> str:
+    # Random words with capitals, punctuation, paragraphs and an occasional NEWPAGE paragraph.
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyzäöüß"))
+    lengths = rng.integers(1, 13, words)
+    pieces = []
+    for k, length in enumerate(lengths.tolist()):
+        word = "".join(rng.choice(letters, length).tolist())
+        if rng.random() < 0.1:
+            word = word.capitalize()
+        if rng.random() < 0.1:
+            word += str(rng.choice(PUNCTS))
+        pieces.append(word)
+        if k % 60 == 59:
+            pieces.append("\n\nNEWPAGE\n" if rng.random() < 0.1 else "\n")
+        else:
+            pieces.append(" ")
+    return "".join(pieces).strip()
+
+
+def synthetic_wav(path: str, seconds: float, rate: int = 44100, seed: int = 0) -> str:
+    # Noise with a few tones, 16 bit mono. Returns path.
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    signal = 0.1 * rng.standard_normal(len(t)) + 0.3 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 3000 * t)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes((np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes())
+    return path
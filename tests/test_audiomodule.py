@@ -0,0 +1,202 @@
+import struct
+from types import SimpleNamespace
+import wave
+
+import numpy as np
+import pytest
+
+
+from sound2font.audiomodule import (AudioBuffer, AudioData, Microphone, _reverse, _rotate_left, iter_wav_chunks
+                                    , read_wav_header, resample)
+
+
+def _audio_data(samples: np.ndarray) -> AudioData:
+    audio_data = AudioData(sample_width=samples.dtype.itemsize)
+    audio_data.extend(samples.tobytes())
+    return audio_data
+
+
+@pytest.mark.parametrize("rate, target_rate", [(44100, 16000), (8000, 16000), (48000, 16000), (22050, 16000)])
+def test_resample_length_and_dc_gain(rate, target_rate):
+    samples = np.ones(rate // 2, dtype=np.float32)
+    out = resample(samples, rate, target_rate)
+    assert out.dtype == np.float32
+    assert len(out) == round(len(samples) * target_rate / rate)
+    # Away from the ends, where the signal drops to zero.
+    assert np.allclose(out[200:-200], 1, atol=1e-3)
+
+
+def test_resample_keeps_a_sine():
+    rate, target_rate, frequency = 44100, 16000, 440.
+    samples = np.sin(2 * np.pi * frequency * np.arange(rate) / rate)
+    out = resample(samples, rate, target_rate)
+    assert out.dtype == np.float64
+    expected = np.sin(2 * np.pi * frequency * np.arange(len(out)) / target_rate)
+    assert np.abs(out - expected)[200:-200].max() < 1e-3
+
+
+def test_resample_removes_frequencies_above_nyquist():
+    rate, target_rate = 48000, 16000
+    samples = np.sin(2 * np.pi * 12000. * np.arange(rate) / rate)
+    assert np.abs(resample(samples, rate, target_rate))[200:-200].max() < 1e-2
+
+
+def test_resample_does_not_wrap_around():
+    samples = np.zeros(44100)
+    samples[-1] = 1.
+    out = resample(samples, 44100, 16000)
+    assert np.abs(out[:len(out) // 2]).max() == 0
+
+
+def test_resample_blocks():
+    samples = np.random.default_rng(0).standard_normal(30000)
+    assert np.allclose(resample(samples, 44100, 16000, block_size=1000), resample(samples, 44100, 16000))
+    assert resample(samples, 16000, 16000) is samples
+
+
+def test_as_array_is_a_view():
+    audio_data = _audio_data(np.array([1, -2, 3], dtype=np.int16))
+    array = audio_data.as_array()
+    assert array.tolist() == [1, -2, 3]
+    assert np.shares_memory(array, np.frombuffer(audio_data, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        AudioData(sample_width=3).as_array()
+
+
+def test_as_float32():
+    audio_data = _audio_data(np.array([-32768, 0, 16384, 32767], dtype=np.int16))
+    samples = audio_data.as_float32()
+    assert samples.dtype == np.float32
+    assert samples.tolist() == [-1, 0, 0.5, 32767 / 32768]
+    stereo = _audio_data(np.array([-32768, 0, 16384, 16384], dtype=np.int16))
+    assert stereo.as_float32(channels=2).tolist() == [-0.5, 0.5]
+
+
+def test_as_float32_uint8():
+    # 8-bit samples are unsigned, silence is 128.
+    assert _audio_data(np.array([0, 128, 192], dtype=np.uint8)).as_float32().tolist() == [-1, 0, 0.5]
+
+
+def test_as_float32_resamples():
+    audio_data = _audio_data(np.full(44100, 16384, dtype=np.int16))
+    samples = audio_data.as_float32(rate=44100, target_rate=16000)
+    assert samples.dtype == np.float32
+    assert len(samples) == 16000
+    assert np.allclose(samples[200:-200], 0.5, atol=1e-3)
+    with pytest.raises(ValueError):
+        audio_data.as_float32(target_rate=16000)
+
+
+@pytest.mark.parametrize("n, shift", [(10, 3), (11, 0), (11, 10), (1000, 333), (1001, 500)])
+def test_rotate_left(n, shift):
+    data = np.arange(n, dtype=np.int64)
+    _rotate_left(data, shift)
+    assert (data == np.roll(np.arange(n), -shift)).all()
+    data = np.arange(n, dtype=np.int64)
+    _reverse(data, block=7)
+    assert (data == np.arange(n)[::-1]).all()
+
+
+def test_audio_buffer_stops_at_capacity():
+    buffer = AudioBuffer(sample_width=2, capacity=9)
+    assert buffer.capacity == 8
+    assert buffer.write(np.array([1, 2, 3], dtype=np.int16).tobytes()) == 6
+    assert not buffer.overflowed
+    assert buffer.write(np.array([4, 5], dtype=np.int16).tobytes()) == 2
+    assert buffer.overflowed and buffer.full
+    assert buffer.as_array().tolist() == [1, 2, 3, 4]
+    assert np.shares_memory(buffer.as_array(), buffer._data)
+    buffer.clear()
+    assert len(buffer) == 0 and not buffer.overflowed
+
+
+def test_audio_buffer_ring_keeps_the_last_samples():
+    buffer = AudioBuffer(sample_width=2, capacity=10, ring=True)
+    written = []
+    for chunk in [[1, 2], [3, 4, 5], [6, 7], [8], [9, 10, 11, 12, 13, 14, 15], [16, 17]]:
+        buffer.write(np.array(chunk, dtype=np.int16).tobytes())
+        written += chunk
+        assert buffer.as_array().tolist() == written[-5:]
+        assert np.shares_memory(buffer.as_array(), buffer._data)
+    assert buffer.overflowed
+    assert buffer.as_bytes() == np.array(written[-5:], dtype=np.int16).tobytes()
+    assert buffer.as_audio_data().as_array().tolist() == written[-5:]
+
+
+def test_audio_data_write_keeps_whole_samples():
+    audio_data = AudioData(sample_width=2, max_var_size=7)
+    assert audio_data.write(np.array([1, 2, 3, 4], dtype=np.int16).tobytes()) == 6
+    assert audio_data.overflowed
+    assert audio_data.as_array().tolist() == [1, 2, 3]
+    with pytest.raises(MemoryError):
+        audio_data.extend(b"\x00\x00")
+
+
+def test_microphone_checks_the_sample_width_of_the_destination():
+    microphone = object.__new__(Microphone)
+    microphone.sample_width = 2
+    microphone.pyaudio = SimpleNamespace(terminate=lambda: None)
+    empty = AudioData(sample_width=4)
+    microphone._check_destination(empty)
+    assert empty.sample_width == 2
+    with pytest.raises(ValueError):
+        microphone._check_destination(AudioBuffer(sample_width=4, capacity=8))
+    filled = AudioData(sample_width=4)
+    filled.extend(b"\x00" * 4)
+    with pytest.raises(ValueError):
+        microphone._check_destination(filled)
+
+
+def _write_wav(path: str, samples: np.ndarray, rate: int = 16000, channels: int = 1) -> str:
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(samples.dtype.itemsize)
+        wf.setframerate(rate)
+        wf.writeframes(samples.tobytes())
+    return path
+
+
+def test_load_wav(tmp_path):
+    samples = np.arange(-5000, 5000, dtype=np.int16)
+    path = _write_wav(str(tmp_path / "a.wav"), samples, rate=22050)
+    loaded = AudioData.load(path)
+    assert loaded.sample_width == 2
+    assert loaded.as_array().tolist() == samples.tolist()
+    assert AudioData.load(path).max_var_size >= 20000
+    mapped = AudioBuffer.load(path)
+    assert isinstance(mapped._data, np.memmap)
+    assert (mapped.rate, mapped.channels) == (22050, 1)
+    assert mapped.as_array().tolist() == samples.tolist()
+    # Read-only and full.
+    assert mapped.write(b"\x00\x00") == 0
+    assert mapped.as_array().tolist() == samples.tolist()
+
+
+def test_read_wav_header_skips_chunks_and_truncates(tmp_path):
+    samples = np.arange(12, dtype=np.int16)
+    data = open(_write_wav(str(tmp_path / "a.wav"), samples, channels=2), "rb").read()
+    # A LIST chunk (odd size, padded) in front of the data chunk, and a data chunk that claims too much.
+    fmt_end = 12 + 8 + 16
+    data = data[:fmt_end] + b"LIST" + struct.pack("<I", 3) + b"abc\x00" + data[fmt_end:]
+    data = data[:-3]
+    path = str(tmp_path / "b.wav")
+    with open(path, "wb") as f:
+        f.write(data)
+    header = read_wav_header(path)
+    assert (header["channels"], header["rate"], header["sample_width"]) == (2, 16000, 2)
+    assert header["offset"] == fmt_end + 12 + 8
+    # 24 bytes written, 21 left, whole stereo frames of 4 bytes: 20.
+    assert header["size"] == 20
+    assert AudioBuffer.load(path).as_array().tolist() == samples[:10].tolist()
+    with open(path, "wb") as f:
+        f.write(b"RIFF\x00\x00\x00\x00AVI ")
+    with pytest.raises(ValueError):
+        read_wav_header(path)
+
+
+def test_iter_wav_chunks(tmp_path):
+    samples = np.arange(2500, dtype=np.int16)
+    path = _write_wav(str(tmp_path / "a.wav"), samples)
+    chunks = list(iter_wav_chunks(path, chunk_frames=1000))
+    assert [len(chunk) for chunk in chunks] == [2000, 2000, 1000]
+    assert b"".join(chunks) == samples.tobytes()
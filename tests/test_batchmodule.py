@@ -0,0 +1,84 @@
+import json
+import os
+from types import SimpleNamespace
+import wave
+
+import numpy as np
+import pytest
+
+from sound2font.batchmodule import _truncate_partial_line, completed_paths, find_recordings, transcribe_batch
+from sound2font.modelmodule import REGISTRY
+from sound2font.speech2text import Speech2Text_fw
+
+
+class FakeWhisperModel:
+    # The text is the number of samples it got.
+    def transcribe(self, audio, language=None):
+        return iter([SimpleNamespace(text=str(len(audio)))]), None
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    monkeypatch.setattr(Speech2Text_fw, "_load_model", lambda self: FakeWhisperModel())
+    yield
+    REGISTRY.clear()
+
+
+def _write_wav(path: str, seconds: float, rate: int = 16000) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.zeros(int(seconds * rate), dtype=np.int16).tobytes())
+    return path
+
+
+def _results(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_find_recordings(tmp_path):
+    a = _write_wav(str(tmp_path / "rec" / "b" / "a.wav"), 0.1)
+    b = _write_wav(str(tmp_path / "rec" / "b.WAV"), 0.1)
+    (tmp_path / "rec" / "notes.txt").write_text("x")
+    assert find_recordings(str(tmp_path / "rec")) == sorted([a, b])
+    (tmp_path / "list.txt").write_text(f"# Recordings\nrec/b.WAV\n\n{a}\n")
+    assert find_recordings(str(tmp_path / "list.txt")) == [os.path.join(str(tmp_path), "rec/b.WAV"), a]
+    (tmp_path / "list.jsonl").write_text(json.dumps({"path": "rec/b.WAV"}) + "\n")
+    assert find_recordings(str(tmp_path / "list.jsonl")) == [os.path.join(str(tmp_path), "rec/b.WAV")]
+
+
+def test_transcribe_batch_and_resume(tmp_path, fake_whisper):
+    source = tmp_path / "rec"
+    _write_wav(str(source / "a.wav"), 1., rate=16000)
+    _write_wav(str(source / "b.wav"), 0.5, rate=44100)
+    (source / "broken.wav").write_bytes(b"not a wav")
+    output = str(tmp_path / "out.jsonl")
+    assert transcribe_batch(str(source), output) == {"skipped": 0, "done": 2, "failed": 1}
+    results = {os.path.basename(result["path"]): result for result in _results(output)}
+    assert results["a.wav"]["text"] == "16000" and results["a.wav"]["duration"] == 1.
+    # Resampled to 16 kHz.
+    assert results["b.wav"]["text"] == "8000" and results["b.wav"]["duration"] == 0.5
+    assert "error" in results["broken.wav"]
+    assert completed_paths(output) == {str(source / "a.wav"), str(source / "b.wav")}
+    # An interrupted run left half a line. It is cut off, and the failed recording is tried again.
+    with open(output, "a") as f:
+        f.write('{"path": "x", "te')
+    assert transcribe_batch(str(source), output) == {"skipped": 2, "done": 0, "failed": 1}
+    lines = _results(output)
+    assert len(lines) == 4 and "error" in lines[-1]
+    assert transcribe_batch(str(source), output, resume=False) == {"skipped": 0, "done": 2, "failed": 1}
+    assert len(_results(output)) == 3
+
+
+def test_truncate_partial_line(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    for content, expected in [(b"", b""), (b"a\nb\n", b"a\nb\n"), (b"a\nb", b"a\n"), (b"x" * 10000, b"")
+                              , (b"a\n" + b"x" * 10000, b"a\n")]:
+        with open(path, "wb") as f:
+            f.write(content)
+        _truncate_partial_line(path)
+        with open(path, "rb") as f:
+            assert f.read() == expected
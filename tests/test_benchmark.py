@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from benchmark import QUICK_AUDIO_SECONDS, QUICK_TEXT_SIZES, compare, run_benchmarks
+from synthetic import synthetic_alphabet, synthetic_text
+from sound2font.text2font import Text2Font
+
+
+@pytest.fixture(scope="module")
+def synthetic_fonts(tmp_path_factory) -> dict:
+    directory = tmp_path_factory.mktemp("fonts")
+    return {connected: synthetic_alphabet(str(directory / f"{connected}.json"), connected) for connected in [True, False]}
+
+
+@pytest.mark.parametrize("ending", ["", "\nNEWPAGE"])
+@pytest.mark.parametrize("connected", [True, False], ids=["connected", "disconnected"])
+def test_convert_parallel_on_synthetic_text(synthetic_fonts, connected, ending):
+    # Outputs that must be equal, whatever the optimizations. The synthetic alphabets have all kinds of moves.
+    def text2font() -> Text2Font:
+        return Text2Font(210, 297, synthetic_fonts[connected], connected, 8, 3, string_alphabet=True, char_spacing=0.5)
+
+    text = synthetic_text(300) + ending
+    assert text2font().convert_parallel(text, workers=2) == text2font().convert(text)
+
+
+@pytest.mark.parametrize("text", ["NEWPAGE", "a\nNEWPAGE"])
+def test_convert_parallel_on_page_breaks_only(synthetic_fonts, text):
+    def text2font() -> Text2Font:
+        return Text2Font(210, 297, synthetic_fonts[True], True, 8, 3, string_alphabet=True, char_spacing=0.5)
+
+    assert text2font().convert_parallel(text, workers=2) == text2font().convert(text)
+
+
+def test_compare():
+    baseline = {"results": {"a": {"seconds": 1., "peak_bytes": 100}, "b": {"seconds": 1e-4, "peak_bytes": 100}
+                            , "c": {"seconds": 1., "peak_bytes": 100}}}
+    results = {"results": {"a": {"seconds": 1.3, "peak_bytes": 130}, "b": {"seconds": 5e-4, "peak_bytes": 100}
+                           , "c": {"seconds": 1.2, "peak_bytes": 120}, "d": {"seconds": 9., "peak_bytes": 900}}}
+    regressions = compare(results, baseline)
+    assert len(regressions) == 2 and all(regression.startswith("a:") for regression in regressions)
+
+
+@pytest.mark.manual
+def test_benchmark(tmp_path):
+    # Quick run of the benchmark suite. BENCHMARK_BASELINE=path compares against an earlier run.
+    # For the full sizes and more options, run python tests/benchmark.py.
+    results = run_benchmarks(QUICK_TEXT_SIZES, QUICK_AUDIO_SECONDS, log=print)
+    with open(tmp_path / "benchmark.json", "w") as f:
+        json.dump(results, f, indent=1)
+    baseline = os.environ.get("BENCHMARK_BASELINE")
+    if baseline is not None:
+        with open(baseline) as f:
+            assert compare(results, json.load(f)) == []
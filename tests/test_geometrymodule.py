@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from sound2font.geometrymodule import arc_bounds, arc_sweep, bezier_bounds
+from sound2font.writemodule import GCode
+
+
+def _sampled_bezier(start, p12, p43, end, n=20001):
+    t = np.linspace(0, 1, n)[:, None]
+    P = [start, start + p12, end + p43, end]
+    return (1 - t)**3 * P[0] + 3 * (1 - t)**2 * t * P[1] + 3 * (1 - t) * t**2 * P[2] + t**3 * P[3]
+
+
+def test_bezier_bounds_match_dense_sampling():
+    rng = np.random.default_rng(0)
+    starts, p12s, p43s, ends = (rng.uniform(-2, 2, (50, 2)) for _ in range(4))
+    mins, maxs = bezier_bounds(starts, p12s, p43s, ends)
+    for k in range(len(starts)):
+        points = _sampled_bezier(starts[k], p12s[k], p43s[k], ends[k])
+        np.testing.assert_allclose(mins[k], points.min(axis=0), atol=1e-6)
+        np.testing.assert_allclose(maxs[k], points.max(axis=0), atol=1e-6)
+
+
+def test_arc_bounds():
+    starts, centers, ends = np.array([[1., 0], [1., 0]]), np.zeros((2, 2)), np.array([[0., 1], [0., 1]])
+    mins, maxs = arc_bounds(starts, centers, ends, np.array([False, True]))
+    # Counterclockwise: quarter circle in the first quadrant. Clockwise: the other three quarters.
+    np.testing.assert_allclose(mins, [[0, 0], [-1, -1]], atol=1e-12)
+    np.testing.assert_allclose(maxs, [[1, 1], [1, 1]], atol=1e-12)
+
+
+def test_arc_sweep_full_circle_and_direction():
+    radius, theta_start, sweep = arc_sweep(np.array([[2., 0], [2., 0]]), np.zeros((2, 2)), np.array([[2., 0], [0., 2]])
+                                           , np.array([True, True]))
+    np.testing.assert_allclose(radius, [2, 2])
+    np.testing.assert_allclose(sweep, [-2 * np.pi, -1.5 * np.pi])
+
+
+def test_gcode_bounding_box_includes_curve_extrema():
+    gcode = GCode("G0 X0 Y0\nG0 Z9\nG5 X4 Y0 I0 J3 P0 Q3\nG0 Z0\nM7\nG0 X1 Y1\nG2 X3 Y1 I1 J0")
+    assert gcode.bounding_box() == pytest.approx((0, 0, 4, 2.25))
+    boxes = gcode.page_bounding_boxes()
+    assert boxes[0] == pytest.approx((0, 0, 4, 2.25))
+    # The clockwise half circle from (1, 1) to (3, 1) passes through (2, 2).
+    assert boxes[1] == pytest.approx((1, 1, 3, 2))
+    gcode.check_limits((0, 4), (0, 2.25))
+    with pytest.raises(ValueError):
+        gcode.check_limits((0, 4), (0, 2))
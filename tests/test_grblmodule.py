@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from fakegrbl import FakeGrbl
+from sound2font.grblmodule import RX_BUFFER_SIZE, GrblSender, gcode_lines
+from sound2font.writemodule import GCode, PEN
+
+# Many short lines, as from GCode.curves2g1(). Together they are much longer than the RX buffer.
+LINES = [f"G1 X{i % 100}.25 Y{i % 37}.5" for i in range(300)]
+
+
+@pytest.fixture
+def grbl():
+    with FakeGrbl() as fake:
+        yield fake
+
+
+def _sender(grbl: FakeGrbl, **kwargs) -> GrblSender:
+    # The welcome message is lost, if FakeGrbl writes it before open_serial() flushes the input.
+    # (GRBL resets, when the port is opened, and writes it afterwards.)
+    sender = GrblSender.open(grbl.path, timeout=5., **kwargs)
+    assert sender.wait_for_startup(timeout=0.5) in ("Grbl 1.1h ['$' for help]", None)
+    return sender
+
+
+def test_gcode_lines():
+    blocks = [GCode("# Comment\nG0 X1 Y2\n\n"), "G1 X3 Y4 # Tail\nM7"]
+    assert list(gcode_lines(blocks)) == ["G0X1Y2", "G1X3Y4#Tail", "M7"]
+    assert list(gcode_lines("G0 X1 Y2", compact=False)) == ["G0 X1 Y2"]
+
+
+def test_send_never_overflows_the_rx_buffer(grbl):
+    with _sender(grbl) as sender:
+        stats = sender.send("\n".join(LINES))
+    assert grbl.overflows == 0
+    assert 0 < grbl.max_rx_bytes <= RX_BUFFER_SIZE
+    assert grbl.received == [line.replace(" ", "") for line in LINES] + ["G4P0"]
+    assert stats["lines"] == len(LINES) + 1 and stats["stalls"] > 0 and stats["errors"] == []
+    assert stats["pages"] == 1
+
+
+def test_pause_waits_for_motion_and_calls_on_pause(grbl):
+    grbl.line_time = 0.002
+    pauses = []
+
+    def on_pause(page: int) -> None:
+        # All lines of the page are executed and all motion is done.
+        pauses.append((page, len(grbl.received), len(grbl._planner)))
+
+    text = "\n".join(LINES[:40] + [PEN["PAUSE"]] + LINES[40:80] + [PEN["PAUSE"]] + LINES[80:100])
+    with _sender(grbl, on_pause=on_pause) as sender:
+        stats = sender.send(text)
+    # Every page ends with the G4 P0 of GrblSender.wait_until_idle().
+    assert pauses == [(0, 41, 0), (1, 82, 0)]
+    assert PEN["PAUSE"] not in grbl.received
+    assert stats["pages"] == 3
+
+
+def test_forward_pause(grbl):
+    with _sender(grbl, on_pause=lambda page: None, forward_pause=True) as sender:
+        sender.send(["G0 X1", PEN["PAUSE"], "G0 X2"])
+    assert grbl.received == ["G0X1", PEN["PAUSE"], "G4P0", "G0X2", "G4P0"]
+
+
+def test_errors_are_counted(grbl):
+    # GRBL has no G5. The controller answers error:20, and streaming goes on.
+    with _sender(grbl) as sender:
+        stats = sender.send(["G0 X1", "G5 X2 Y2 I1 J1 P1 Q1", "G0 X3"])
+    assert stats["errors"] == [("G5X2Y2I1J1P1Q1", "error:20")]
+    assert grbl.received == ["G0X1", "G0X3", "G4P0"]
+
+
+def test_stop_on_error(grbl):
+    with _sender(grbl, stop_on_error=True) as sender:
+        with pytest.raises(RuntimeError, match="error:20"):
+            sender.send(["G0 X1", "G5 X2 Y2 I1 J1 P1 Q1"] + LINES)
+    # The lines sent before the error was read may have been executed, but not all of them.
+    assert len(grbl.received) < len(LINES)
+
+
+def test_wait_until_idle(grbl):
+    grbl.line_time = 0.01
+    with _sender(grbl) as sender:
+        for line in LINES[:20]:
+            sender._send_line(line)
+        start = time.monotonic()
+        sender.wait_until_idle()
+        assert not sender._in_flight and sender._in_flight_bytes == 0
+        assert len(grbl._planner) == 0
+        assert len(grbl.received) == 21
+        # The planner takes 15 of the lines at once. Those are still moving.
+        assert time.monotonic() - start >= 0.1
+
+
+def test_line_longer_than_rx_buffer(grbl):
+    with _sender(grbl) as sender:
+        with pytest.raises(ValueError, match="does not fit"):
+            sender.send("G1 X" + "1" * RX_BUFFER_SIZE)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from sound2font.layoutmodule import BREAKS, ITEMS, optimal_breaks
+
+PARAGRAPH = ("Sphinx of black quartz, judge my vow. Waltz, bad nymph, for quick jigs vex. The quick brown fox jumps "
+             "over the lazy dog, again and again. Pack my box with five dozen liquor jugs! How vexingly quick daft "
+             "zebras jump. Bright vixens jump, dozy fowl quack.")
+
+
+def test_optimal_breaks_beats_greedy():
+    # Greedy: [3 2] [2] [5] leaves 0 and 4 at the line ends. Optimal: [3] [2 2] [5] leaves 3 and 1.
+    widths = [3., 2., 2., 5.]
+    assert optimal_breaks(widths, widths, [0., 1., 1., 1.], 0., 6.) == [False, True, False, True]
+
+
+def test_optimal_breaks_gives_long_words_their_own_line():
+    assert optimal_breaks([2., 9., 2.], [2., 9., 2.], [0., 1., 1.], 0., 6.) == [False, True, True]
+
+
+def _char_right_edges(layout) -> np.ndarray:
+    return layout.char_x + layout.glyph_table.widths[layout.glyphs]
+
+
+def _raggedness(layout, width: float) -> float:
+    # Squared space left at the end of every line but the last. One paragraph on one page.
+    lines = sorted(set(layout.char_y.tolist()), reverse=True)[:-1]
+    return sum((width - layout.next_x[layout.char_y == y].max()) ** 2 for y in lines)
+
+
+def test_layout_does_not_move_the_cursor_and_replaces_unknown_characters(make_text2font):
+    text2font = make_text2font()
+    layout = text2font.layout("a€b c")
+    assert text2font.current_position == text2font.initial_position
+    assert layout.chars() == "a?bc"
+    assert layout.items.tolist() == [ITEMS["WORD"], ITEMS["WORD"]]
+    text2font.convert("a€b c")
+
+
+@pytest.mark.parametrize("optimal_fit", [False, True])
+def test_layout_lines_fit(make_text2font, optimal_fit):
+    width = 80
+    layout = make_text2font(width=width, optimal_fit=optimal_fit).layout(PARAGRAPH)
+    assert (layout.breaks == BREAKS["LINE"]).sum() >= 3
+    assert _char_right_edges(layout).max() <= width + 1e-9
+
+
+@pytest.mark.parametrize("optimal_fit", [False, True])
+def test_continued_layout(make_text2font, optimal_fit):
+    # A paragraph laid out in parts, as by DictationPipeline. Every part continues the line of the part before.
+    width = 80
+    text2font = make_text2font(width=width, optimal_fit=optimal_fit)
+    words = PARAGRAPH.split(" ")
+    positions = []
+    for i, part in enumerate([" ".join(words[i:i + 4]) for i in range(0, len(words), 4)]):
+        layout = text2font.layout(part, continued=i > 0)
+        assert layout.items.tolist() == [ITEMS["WORD"]] * len(part.split(" "))
+        assert _char_right_edges(layout).max() <= width + 1e-9
+        positions.append(np.stack([layout.char_x, layout.char_y]))
+        list(text2font._emit(layout, 0, len(layout)))
+    if not optimal_fit:
+        # Greedy line breaks do not depend on the words after them.
+        layout = make_text2font(width=width).layout(PARAGRAPH)
+        assert np.allclose(np.concatenate(positions, axis=1), [layout.char_x, layout.char_y])
+
+
+def test_optimal_fit_is_less_ragged(make_text2font):
+    text = "aaaa oo oo oooooooooo aaaa oo oo oooooooooo"
+    improved = False
+    for width in range(42, 90, 3):
+        greedy = make_text2font(width=width).layout(text)
+        optimal = make_text2font(width=width, optimal_fit=True).layout(text)
+        assert optimal.chars() == greedy.chars()
+        # Optimal fit never splits a word, which fits in a line.
+        assert not optimal.splits.any()
+        if not greedy.splits.any():
+            assert _raggedness(optimal, width) <= _raggedness(greedy, width) + 1e-9
+            improved |= _raggedness(optimal, width) < _raggedness(greedy, width)
+    assert improved
+
+
+def test_long_words_are_split_with_a_hyphen(make_text2font):
+    text2font = make_text2font(width=30)
+    layout = text2font.layout("a incomprehensibilities")
+    assert (layout.splits == BREAKS["LINE"]).sum() >= 1
+    assert _char_right_edges(layout).max() <= 30 + 1e-9
+    gcode = text2font.convert("a incomprehensibilities")
+    assert gcode.bounding_box()[2] <= 30 + 1e-9
+
+
+def test_page_breaks(make_text2font):
+    layout = make_text2font(height=30).layout(PARAGRAPH + "\nNEWPAGE\nb")
+    assert (layout.breaks == BREAKS["PAGE"]).sum() >= 1
+    assert (layout.items == ITEMS["NEWPAGE"]).sum() == 1
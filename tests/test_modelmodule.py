@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from sound2font.modelmodule import ModelRegistry
+
+
+class Loader:
+    def __init__(self, delay: float = 0.):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self) -> object:
+        self.calls += 1
+        time.sleep(self.delay)
+        return object()
+
+
+def test_models_are_loaded_once_and_shared():
+    registry = ModelRegistry()
+    loader = Loader(delay=0.05)
+    models = []
+
+    def use():
+        with registry.use(("a",), loader, size=1) as model:
+            models.append(model)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+    assert all(model is models[0] for model in models)
+    assert registry.loaded() == [("a",)]
+
+
+def test_budget_evicts_least_recently_used_idle_models():
+    registry = ModelRegistry(memory_budget=2)
+    loader = Loader()
+    with registry.use(("a",), loader, size=1):
+        pass
+    with registry.use(("b",), loader, size=1):
+        with registry.use(("a",), loader, size=1):
+            # a and b are in use. c exceeds the budget, but neither may be evicted.
+            with registry.use(("c",), loader, size=1):
+                assert registry.loaded() == [("b",), ("a",), ("c",)]
+                assert registry.memory_used() == 3
+            # c is evicted, as soon as it is idle.
+            assert registry.loaded() == [("b",), ("a",)]
+    with registry.use(("d",), loader, size=1):
+        pass
+    # b was used least recently.
+    assert registry.loaded() == [("a",), ("d",)]
+    assert loader.calls == 4
+
+
+def test_models_in_use_are_not_evicted():
+    registry = ModelRegistry()
+    model = registry.acquire(("a",), Loader(), size=1)
+    assert not registry.evict(("a",))
+    registry.clear()
+    assert registry.loaded() == [("a",)]
+    registry.release(("a",))
+    assert registry.evict(("a",))
+    assert registry.loaded() == []
+    assert model is not None
+
+
+def test_idle_models_are_evicted():
+    registry = ModelRegistry(idle_timeout=0.05)
+    loader = Loader()
+    with registry.use(("a",), loader, size=1):
+        time.sleep(0.1)
+        assert registry.evict_idle() == []
+    time.sleep(0.1)
+    # Eviction happens on the next request.
+    with registry.use(("b",), loader, size=1):
+        assert registry.loaded() == [("b",)]
+
+
+def test_sweeper_evicts_idle_models_without_requests():
+    registry = ModelRegistry(idle_timeout=0.02)
+    with registry.use(("a",), Loader(), size=1):
+        pass
+    stop = registry.start_sweeper(interval=0.01)
+    try:
+        deadline = time.monotonic() + 2
+        while registry.loaded() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.loaded() == []
+    finally:
+        stop.set()
+    with pytest.raises(ValueError):
+        ModelRegistry().start_sweeper()
+
+
+def test_failed_loads_are_not_kept():
+    registry = ModelRegistry()
+
+    def fail():
+        raise OSError("no model")
+
+    with pytest.raises(OSError):
+        registry.acquire(("a",), fail)
+    assert registry.loaded() == []
+    loader = Loader()
+    with registry.use(("a",), loader, size=1):
+        assert loader.calls == 1
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from sound2font.pipelinemodule import DictationPipeline, run_dictation
+from sound2font.writemodule import GCode
+
+
+class FakeTranscriber:
+    # An utterance is a list of segments, which are "decoded" one by one.
+
+    def transcribe_segments(self, utterance: list[str]):
+        yield from utterance
+
+
+def _recorder(utterances: list[list[str]]):
+    # record() of a dictation of utterances. An empty utterance is skipped by the pipeline.
+    remaining = iter(utterances)
+    return lambda: next(remaining, None)
+
+
+def _segments(text: str, size: int) -> list[str]:
+    # Segments of size words. Joined by spaces, they give text again.
+    words = text.split(" ")
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5])
+@pytest.mark.parametrize("clean, remove_cleaned", [(True, False), (True, True), (False, False)])
+def test_pages_equal_split_pages_of_joined_text(make_text2font, sample_text, size, clean, remove_cleaned):
+    text = sample_text + "\nNEWPAGE\nThe end."
+    segments = _segments(text, size)
+    utterances = [segments[i:i + 2] for i in range(0, len(segments), 2)]
+    expected = make_text2font(width=100, height=30).convert(text, clean=clean, remove_cleaned=remove_cleaned)
+    expected_pages = expected.split_pages()
+    assert len(expected_pages) > 2
+    written = []
+    text2font = make_text2font(width=100, height=30)
+    stats = run_dictation(_recorder(utterances[:1] + [[]] + utterances[1:]), FakeTranscriber(), text2font
+                          , lambda number, page: written.append((number, page)), clean=clean, remove_cleaned=remove_cleaned)
+    assert stats == {"utterances": len(utterances), "segments": len(segments), "pages": len(expected_pages)}
+    assert [number for number, _ in written] == list(range(len(expected_pages)))
+    # Equal up to rounding: positions within a word are summed from the start of the segment, not of the text.
+    assert [len(page) for _, page in written] == [len(page) for page in expected_pages]
+    assert all(page == expected_page for (_, page), expected_page in zip(written, expected_pages))
+
+
+def test_segments_continue_the_line(make_text2font):
+    # A segment, that does not fit in the line, starts a new line. Converted on its own, its first word is split.
+    segments = ["hello there friend wow", "extraordinary words"]
+    separate = make_text2font(width=100)
+    separate.convert(segments[0])
+    assert "New line within word" in separate.convert(segments[1]).commandstr
+    expected = make_text2font(width=100).convert(" ".join(segments))
+    assert "New line within word" not in expected.commandstr
+    written = []
+    run_dictation(_recorder([segments]), FakeTranscriber(), make_text2font(width=100)
+                  , lambda number, page: written.append(page))
+    assert len(written) == 1 and len(written[0]) == len(expected) and written[0] == expected
+
+
+def test_async_sink_and_no_segments(make_text2font):
+    written = []
+
+    async def sink(number: int, page: GCode) -> None:
+        written.append(number)
+
+    assert run_dictation(_recorder([]), FakeTranscriber(), make_text2font(), sink) \
+        == {"utterances": 0, "segments": 0, "pages": 0}
+    run_dictation(_recorder([["a b"], ["c"]]), FakeTranscriber(), make_text2font(), sink)
+    assert written == [0]
+
+
+def test_failing_stage_raises(make_text2font):
+    class BrokenTranscriber:
+        def transcribe_segments(self, utterance):
+            raise RuntimeError("broken")
+
+    pipeline = DictationPipeline(_recorder([["a"]] * 10), BrokenTranscriber(), make_text2font(), lambda *args: None)
+    with pytest.raises(RuntimeError, match="broken"):
+        asyncio.run(pipeline.run())
@@ -0,0 +1,86 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from sound2font.previewmodule import STYLES, rasterize, render_page, save_previews, segments_bounds, write_png
+from sound2font.writemodule import GCode
+
+DRAWING = ("G0 Z0\nG0 X1 Y1\nG0 Z9\nG1 X2 Y1\nG0 Z0\n"
+           "G0 X3 Y3\nG0 Z9\nG0 Z0")
+
+
+def _read_png(path: str) -> np.ndarray:
+    # Reads the PNG files of write_png().
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    width, height = struct.unpack(">II", data[16:24])
+    length = struct.unpack(">I", data[33:37])[0]
+    assert data[37:41] == b"IDAT"
+    raw = np.frombuffer(zlib.decompress(data[41:41 + length]), dtype=np.uint8).reshape(height, 3 * width + 1)
+    return raw[:, 1:].reshape(height, width, 3)
+
+
+def test_segments():
+    segments = GCode(DRAWING).segments()
+    assert segments["down"].tolist() == [[[1, 1], [2, 1]]]
+    assert segments["travel"].tolist() == [[[0, 0], [1, 1]], [[2, 1], [3, 3]]]
+    assert segments["dots"].tolist() == [[3, 3]]
+    assert segments_bounds(segments) == (0, 0, 3, 3)
+    assert segments_bounds(segments, show_moves=False) == (1, 1, 3, 3)
+
+
+def test_segments_flatten_curves():
+    segments = GCode("G0 Z9\nG2 X2 Y0 I1 J0\nG0 Z0").segments(tolerance=0.01)
+    assert len(segments["down"]) > 4
+    assert np.allclose(segments["down"][-1, 1], [2, 0])
+    assert segments["down"][:, :, 1].max() == pytest.approx(1, abs=0.01)
+
+
+def test_rasterize():
+    segments = GCode(DRAWING).segments()
+    image = rasterize(segments, pixels_per_mm=10, margin=1)
+    assert image.shape == (50, 50, 3)
+    colors = {tuple(color) for color in image.reshape(-1, 3).tolist()}
+    assert STYLES["down"]["color"] in colors and STYLES["travel"]["color"] in colors
+    image = rasterize(segments, pixels_per_mm=10, margin=1, show_moves=False)
+    assert STYLES["travel"]["color"] not in {tuple(color) for color in image.reshape(-1, 3).tolist()}
+    # The pen-down segment from (1, 1) to (2, 1) is the row at y = 1.
+    row = image[image.shape[0] - 1 - 10, 10:21]
+    assert (row == STYLES["down"]["color"]).all()
+
+
+def test_write_png(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, (7, 5, 3), dtype=np.uint8)
+    path = str(tmp_path / "image.png")
+    write_png(path, image)
+    assert (_read_png(path) == image).all()
+
+
+def test_save_previews(tmp_path, make_text2font, sample_text):
+    gcode = make_text2font(height=60).convert(sample_text)
+    pages = gcode.split_pages()
+    paths = save_previews(gcode, str(tmp_path / "serial"))
+    assert paths == [str(tmp_path / "serial" / f"page_{i:03d}.png") for i in range(len(pages))]
+    parallel = save_previews(gcode, str(tmp_path / "parallel"), workers=2)
+    for path, other in zip(paths, parallel):
+        assert (_read_png(path) == _read_png(other)).all()
+
+
+def test_render_page_matplotlib(tmp_path):
+    pytest.importorskip("matplotlib")
+    path = render_page(GCode(DRAWING), str(tmp_path / "page.png"), backend="matplotlib", canvas_size=(10, 10))
+    assert os.path.getsize(path) > 0
+    with pytest.raises(ValueError):
+        render_page(GCode(DRAWING), str(tmp_path / "page.png"), backend="svg")
+
+
+def test_plot(make_text2font, sample_text):
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    gcode = make_text2font(height=60).convert(sample_text)
+    axes = gcode.plot(return_axes=True, show=False, show_control_points=True)
+    assert sum(len(ax.collections) > 0 for ax in np.atleast_1d(axes).flatten()) == len(gcode.split_pages())
@@ -0,0 +1,129 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from sound2font.audiomodule import AudioData
+from sound2font.modelmodule import ModelRegistry
+from sound2font.speech2text import WHISPER_RATE, Speech2Text_fw, Speech2Text_vosk
+from sound2font.textmodule import TextData
+
+
+class FakeWhisperModel:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None):
+        self.calls.append((audio, language))
+        return iter([SimpleNamespace(text="hello"), SimpleNamespace(text=" world")]), None
+
+
+def test_fw_transcribe_passes_float32_at_16_khz():
+    speech2text = Speech2Text_fw(sample_rate=44100, registry=ModelRegistry())
+    model = FakeWhisperModel()
+    speech2text._load_model = lambda: model
+    audio_data = AudioData(sample_width=2)
+    audio_data.extend(np.full(44100, 16384, dtype=np.int16).tobytes())
+    assert speech2text.transcribe(audio_data).text() == "hello world"
+    (audio, language), = model.calls
+    assert language == "en"
+    assert audio.dtype == np.float32
+    assert len(audio) == WHISPER_RATE
+    assert np.allclose(audio[200:-200], 0.5, atol=1e-3)
+
+
+class FakeRecognizer:
+    # Ends an utterance after every third chunk. The text is the number of bytes of the utterance.
+    def __init__(self):
+        self.received = b""
+        self.chunks = 0
+
+    def AcceptWaveform(self, chunk: bytes) -> bool:
+        assert isinstance(chunk, bytes)
+        self.received += chunk
+        self.chunks += 1
+        return self.chunks % 3 == 0
+
+    def _text(self) -> str:
+        return str(len(self.received)) if self.received else ""
+
+    def Result(self) -> str:
+        result = json.dumps({"result": [{"word": self._text(), "start": 0., "end": 1., "conf": 1.}], "text": self._text()})
+        self.received = b""
+        return result
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": self._text()})
+
+    def FinalResult(self) -> str:
+        if not self.received:
+            return json.dumps({"text": ""})
+        return self.Result()
+
+
+def _vosk(sample_rate: int = 16000) -> Speech2Text_vosk:
+    # A recognizer for one stream. The model is not loaded.
+    speech2text = Speech2Text_vosk("model", sample_rate=sample_rate, registry=ModelRegistry())
+    speech2text._recognizer = FakeRecognizer()
+    return speech2text
+
+
+def test_vosk_stream_yields_partial_and_final_results():
+    results = list(_vosk().stream([b"ab", b"cd", b"ef", b"gh", bytearray(b"ij")]))
+    assert [(result.is_final, result.text()) for result in results] == [
+        (False, "2"), (False, "4"), (True, "6"), (False, "2"), (False, "4"), (True, "4")]
+    results = list(_vosk().stream([b"ab", b"cd", b"ef", b"gh"], partials=False))
+    assert [result.text() for result in results] == ["6", "2"]
+
+
+def test_vosk_transcribe_joins_all_utterances():
+    audio_data = AudioData(sample_width=2)
+    audio_data.extend(np.zeros(7000, dtype=np.int16).tobytes())
+    result = _vosk().transcribe(audio_data, chunk_size=1000)
+    assert result.text() == "6000 6000 2000"
+    assert [word["word"] for word in result.words()] == ["6000", "6000", "2000"]
+
+
+def test_vosk_chunks():
+    speech2text = _vosk()
+    audio_data = AudioData(sample_width=2)
+    samples = np.arange(2500, dtype=np.int16)
+    audio_data.extend(samples.tobytes())
+    chunks, audio_seconds = speech2text._chunks(audio_data, 1000)
+    chunks = list(chunks)
+    assert [len(chunk) for chunk in chunks] == [2000, 2000, 1000]
+    assert audio_seconds == 2500 / 16000
+    assert b"".join(chunks) == samples.tobytes()
+    # Other rates are resampled to the rate of the recognizer.
+    audio_data.rate = 32000
+    converted = np.frombuffer(b"".join(speech2text._chunks(audio_data, 1000)[0]), dtype=np.int16)
+    assert len(converted) == 1250
+
+
+def test_text_data():
+    final = TextData('{"result": [{"word": "hi", "start": 0.1, "end": 0.3, "conf": 1.0}], "text": "hi"}')
+    assert final.is_final and final.text() == "hi" and final.words()[0]["end"] == 0.3
+    partial = TextData('{"partial": "h"}')
+    assert not partial.is_final and partial.text() == "h" and partial.words() == []
+    empty = TextData('{"text": ""}')
+    joined = TextData.join([final, empty, TextData('{"text": "there"}')])
+    assert joined.text() == "hi there"
+    assert joined.words() == final.words()
+    assert TextData("").text() == ""
+
+
+def test_fw_model_is_pinned_while_transcribing():
+    registry = ModelRegistry()
+    speech2text = Speech2Text_fw(sample_rate=16000, registry=registry)
+    model = FakeWhisperModel()
+    speech2text._load_model = lambda: model
+
+    def segments():
+        assert not registry.evict(speech2text.model_key)
+        yield SimpleNamespace(text="hi")
+
+    model.transcribe = lambda audio, language=None: (segments(), None)
+    audio_data = AudioData(sample_width=2)
+    audio_data.extend(np.zeros(160, dtype=np.int16).tobytes())
+    assert speech2text.transcribe(audio_data).text() == "hi"
+    assert registry.evict(speech2text.model_key)
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import sound2font
+
+# Import time regression check. Heavy dependencies must only be imported, when a backend or plot is actually used:
+# Short-lived render workers only run Text2Font, and their startup should not pay for speech models or plotting.
+# Every module is imported in a fresh interpreter, so the results do not depend on what is already imported.
+HEAVY_MODULES = ["vosk", "faster_whisper", "ctranslate2", "soundfile", "recasepunc", "torch", "transformers"
+                 , "matplotlib", "pyaudio"]
+# Modules that must import without any of HEAVY_MODULES.
+LIGHT_MODULES = ["sound2font.text2font", "sound2font.writemodule", "sound2font.layoutmodule", "sound2font.previewmodule"
+                 , "sound2font.travelmodule", "sound2font.geometrymodule", "sound2font.textmodule"
+                 , "sound2font.modelmodule", "sound2font.audiomodule", "sound2font.speech2text"
+                 , "sound2font.batchmodule", "sound2font.tracemodule", "sound2font.pipelinemodule"
+                 , "sound2font.grblmodule"]
+# Generous, numpy alone takes a good part of it.
+MAX_IMPORT_SECONDS = 3.
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    # Imports module in a fresh interpreter. Returns the import time and all modules imported with it.
+    src = os.path.dirname(os.path.dirname(os.path.abspath(sound2font.__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([src] + os.environ.get("PYTHONPATH", "").split(os.pathsep)))
+    result = subprocess.run([sys.executable, "-c", _CHILD.format(module=module)]
+                            , capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_imports_without_heavy_modules(module):
+    report = measure_import(module)
+    heavy = sorted({name.split(".")[0] for name in report["modules"]} & set(HEAVY_MODULES))
+    assert heavy == []
+    assert report["seconds"] < MAX_IMPORT_SECONDS
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+
+from sound2font.writemodule import GCode, GCodeCleaner
+
+
+@pytest.mark.parametrize("remove_cleaned", [False, True])
+def test_convert_iter_joins_to_convert(make_text2font, sample_text, remove_cleaned):
+    expected = make_text2font().convert(sample_text, remove_cleaned=remove_cleaned)
+    blocks = list(make_text2font().convert_iter(sample_text, remove_cleaned=remove_cleaned))
+    assert len(blocks) > 10
+    assert GCode.concatenate(blocks).commandstr == expected.commandstr
+
+
+def test_write_streams_convert(make_text2font, sample_text, tmp_path):
+    expected = make_text2font().convert(sample_text)
+    stream = io.StringIO()
+    make_text2font().write(sample_text, stream)
+    assert stream.getvalue() == expected.commandstr
+    path = str(tmp_path / "out.gcode")
+    make_text2font().write(sample_text, path, feed_rate=1000, pure=True)
+    with open(path) as f:
+        assert f.read() == expected.add_feed_rate(1000).pure_code_str()
+
+
+def test_cleaner_on_any_split_equals_clean(make_text2font, sample_text):
+    raw = make_text2font().convert(sample_text, clean=False)
+    expected = GCode.from_arrays(*raw._arrays(), dict(raw._text))
+    expected.clean()
+    rng = np.random.default_rng(0)
+    bounds = [0] + sorted(rng.choice(np.arange(1, len(raw)), 40, replace=False).tolist()) + [len(raw)]
+    cleaner = GCodeCleaner()
+    blocks = [cleaner.feed(raw._slice(start, stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+    blocks.append(cleaner.flush())
+    assert GCode.concatenate(blocks).commandstr == expected.commandstr
+
+
+@pytest.mark.parametrize("ending", ["", "\nNEWPAGE", "\nNEWPAGE\nNEWPAGE"])
+def test_convert_parallel_equals_convert(make_text2font, sample_text, ending):
+    text = sample_text + ending
+    expected = make_text2font(width=100, height=30)
+    gcode = expected.convert(text)
+    assert len(gcode.split_pages()) > 2
+    parallel = make_text2font(width=100, height=30)
+    assert parallel.convert_parallel(text, workers=2) == gcode
+    assert parallel.current_position == expected.current_position
+    assert make_text2font(width=100, height=30).convert_parallel(text, workers=2, pages_per_task=2) == gcode
+
+
+@pytest.mark.parametrize("text", ["NEWPAGE", "a\nNEWPAGE", "a"])
+def test_convert_parallel_short_texts(make_text2font, text):
+    assert make_text2font().convert_parallel(text, workers=2) == make_text2font().convert(text)
+
+
+def test_convert_parallel_cleaned_and_flattened(make_text2font, sample_text):
+    gcode = make_text2font(width=100, height=30).convert(sample_text, remove_cleaned=True)
+    parallel = make_text2font(width=100, height=30).convert_parallel(sample_text, remove_cleaned=True, flatten=True
+                                                                     , workers=2)
+    assert parallel == gcode.curves2g1(tolerance=0.01)
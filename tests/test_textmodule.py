@@ -0,0 +1,54 @@
+import pytest
+
+from sound2font.modelmodule import ModelRegistry
+from sound2font.textmodule import GrammarAdder, _assemble, _token_words
+
+PUNCTUATION = {"O": 0, "COMMA": 1, "PERIOD": 2}
+PUNCTUATION_SYMS = ["", ",", "."]
+
+
+def test_token_words():
+    tokens = [("it", "", ""), ("'", "", ""), ("s", "", ""), ("co", "", ""), ("##op", "", ""), ("[UNK]", "", "")
+              , ("cafe", "", ""), ("2", "", ""), ("##0", "", "")]
+    assert _token_words(tokens, ["It's", "Coop", "☃", "Café", "20"]) == [0, 0, 0, 1, 1, 2, 3, 4, 4]
+
+
+def test_assemble():
+    tokens = [("hello", "CAPITALIZE", "COMMA"), ("wor", "LOWER", "O"), ("##ld", "LOWER", "PERIOD")
+              , ("nasa", "UPPER", "PERIOD")]
+    assert _assemble(tokens, PUNCTUATION, PUNCTUATION_SYMS) == "Hello, world. NASA."
+    with pytest.raises(ValueError):
+        _assemble([("a", "TITLE", "O")], PUNCTUATION, PUNCTUATION_SYMS)
+
+
+class FakePunctuator:
+    # Splits words longer than 4 characters into two tokens. Ends every window with a period.
+    def __init__(self):
+        self.windows = []
+
+    def predict(self, text: str):
+        self.windows.append(text)
+        words = text.split()
+        for i, word in enumerate(words):
+            case = "CAPITALIZE" if i == 0 else "LOWER"
+            punct = "PERIOD" if i == len(words) - 1 else "O"
+            if len(word) > 4:
+                yield (word[:3], case, "O")
+                yield ("##" + word[3:], case, punct)
+            else:
+                yield (word, case, punct)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_add_grammar_in_overlapping_windows(workers):
+    pytest.importorskip("recasepunc")
+    punctuator = FakePunctuator()
+    adder = GrammarAdder("model", "en", registry=ModelRegistry())
+    adder._load_model = lambda: punctuator
+    words = [f"word{i}" for i in range(23)]
+    output = adder.add_grammar_rcp(" ".join(words), window=8, overlap=2, workers=workers)
+    assert [word.strip(".").lower() for word in output.split()] == words
+    assert len(punctuator.windows) == 4
+    # Only the end of the last window is kept with its period.
+    assert output.count(".") == 1 and output.endswith(".")
+    assert adder.add_grammar_rcp("") == ""
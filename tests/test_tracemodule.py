@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from sound2font import tracemodule
+from sound2font.tracemodule import ChromeTraceExporter, JSONLinesExporter, count, instrument, span
+
+
+def test_disabled_by_default():
+    assert not tracemodule.enabled()
+    with span("stage", chars=3) as s:
+        s.set(glyphs=3)
+    assert s is span("other")
+    count("counter", 5)
+
+
+def test_spans_and_counters_reach_sinks():
+    events = []
+    with instrument(events.append):
+        assert tracemodule.enabled()
+        with span("stage", chars=3) as s:
+            count("counter", 5, unit="glyphs")
+            s.set(glyphs=3)
+    assert not tracemodule.enabled()
+    counter, stage = events
+    assert counter["type"] == "counter" and counter["value"] == 5 and counter["attributes"] == {"unit": "glyphs"}
+    assert stage["type"] == "span" and stage["name"] == "stage"
+    assert stage["attributes"] == {"chars": 3, "glyphs": 3}
+    assert stage["duration"] >= 0 and stage["start"] <= counter["time"]
+
+
+def test_span_records_error_and_real_time_factor():
+    events = []
+    with instrument(events.append):
+        with pytest.raises(KeyError):
+            with span("failing"):
+                raise KeyError("x")
+        with span("transcribe", audio_seconds=2.):
+            pass
+    assert events[0]["attributes"] == {"error": "KeyError"}
+    assert events[1]["attributes"]["real_time_factor"] == pytest.approx(events[1]["duration"] / 2.)
+
+
+def test_exporters(tmp_path):
+    jsonl, chrome = str(tmp_path / "trace.jsonl"), str(tmp_path / "trace.json")
+    with instrument(JSONLinesExporter(jsonl), ChromeTraceExporter(chrome)):
+        with span("stage"):
+            count("counter", 2)
+    with open(jsonl) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["type"] for line in lines] == ["counter", "span"]
+    with open(chrome) as f:
+        trace = json.load(f)["traceEvents"]
+    assert [event["ph"] for event in trace] == ["C", "X"]
+    assert trace[0]["args"] == {"counter": 2}
+    assert trace[1]["dur"] == pytest.approx(lines[1]["duration"] * 1e6)
+
+
+def test_convert_is_instrumented_and_unchanged(make_text2font, sample_text):
+    expected = make_text2font().convert(sample_text)
+    events = []
+    with instrument(events.append):
+        gcode = make_text2font().convert(sample_text)
+    assert gcode.commandstr == expected.commandstr
+    names = {event["name"] for event in events}
+    assert {"convert", "layout", "text2font.glyphs"} <= names
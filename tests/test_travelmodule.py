@@ -0,0 +1,73 @@
+from collections import Counter
+
+import numpy as np
+
+from sound2font.travelmodule import GridIndex, nearest_neighbour_order, path_length, two_opt
+from sound2font.writemodule import IS_MOVE, GCode, pen_states
+
+
+def test_grid_index_nearest():
+    rng = np.random.default_rng(1)
+    points = rng.uniform(0, 100, (200, 2))
+    index = GridIndex(points)
+    alive = np.ones(len(points), dtype=bool)
+    for i in rng.permutation(len(points))[:150].tolist():
+        query = rng.uniform(-20, 120, 2)
+        distances = np.where(alive, np.hypot(*(points - query).T), np.inf)
+        assert index.nearest(tuple(query)) == int(np.argmin(distances))
+        index.remove(i)
+        alive[i] = False
+    assert len(index) == 50
+    assert GridIndex(np.zeros((0, 2))).nearest((0, 0)) == -1
+
+
+def test_tour_is_a_permutation_and_two_opt_does_not_get_longer():
+    rng = np.random.default_rng(2)
+    starts = rng.uniform(0, 100, (60, 2))
+    ends = starts + rng.uniform(-5, 5, (60, 2))
+    reversible = rng.random(60) < 0.7
+    order, flipped = nearest_neighbour_order(starts, ends, reversible, (0, 0))
+    assert sorted(order.tolist()) == list(range(60))
+    assert not (flipped & ~reversible[order]).any()
+    improved, improved_flipped = two_opt(starts, ends, reversible, order, flipped, (0, 0))
+    assert sorted(improved.tolist()) == list(range(60))
+    assert not (improved_flipped & ~reversible[improved]).any()
+
+    def length(order, flipped):
+        return path_length(np.where(flipped[:, None], ends[order], starts[order])
+                           , np.where(flipped[:, None], starts[order], ends[order]), (0, 0))
+
+    assert length(improved, improved_flipped) <= length(order, flipped) + 1e-9
+    assert length(order, flipped) < path_length(starts, ends, (0, 0))
+
+
+def _strokes(gcode: GCode) -> Counter:
+    # Pen-down moves as undirected chords, rounded.
+    ops, _ = gcode._arrays()
+    positions = gcode._positions((0, 0))
+    down, _ = pen_states(ops, gcode._text)
+    previous = np.vstack([[0, 0], positions[:-1]])
+    chords = Counter()
+    for row in np.flatnonzero(IS_MOVE[ops] & down).tolist():
+        a, b = tuple(np.round(previous[row], 6).tolist()), tuple(np.round(positions[row], 6).tolist())
+        if a != b:
+            chords[min(a, b), max(a, b)] += 1
+    return chords
+
+
+def test_optimize_travel_keeps_the_strokes(make_text2font, sample_text):
+    gcode = make_text2font(height=60).convert(sample_text)
+    optimized, saved = gcode.optimize_travel()
+    assert saved > 0
+    assert np.isclose(gcode.travel_length() - optimized.travel_length(), saved)
+    assert len(optimized.split_pages()) == len(gcode.split_pages())
+    assert _strokes(optimized) == _strokes(gcode)
+    for page, optimized_page in zip(gcode.split_pages(), optimized.split_pages()):
+        assert _strokes(optimized_page) == _strokes(page)
+
+
+def test_convert_optimize_travel(make_text2font, sample_text):
+    text2font = make_text2font()
+    optimized = text2font.convert(sample_text, optimize_travel=True)
+    assert text2font.travel_saved > 0
+    assert _strokes(optimized) == _strokes(make_text2font().convert(sample_text))
@@ -0,0 +1,314 @@
+import numpy as np
+import pytest
+
+from sound2font.writemodule import GCode, OP, PEN, WORD_IDX, format_gcode, parse_gcode, pen_states
+
+
+def test_parse_format_round_trip():
+    text = "# Comment\nG0 X1.0 Y2.0\nG0 Z9\nG1 X3.5\nG2 X1.0 Y1.0 I0.5 J0.0\nG5 X2.0 Y0.0 I0.1 J0.2 P-0.1 Q0.3\n\nG0 Z0\nM7\nM5"
+    ops, coords, side = parse_gcode(text)
+    assert ops.tolist() == [OP["COMMENT"], OP["G0"], OP["DOWN"], OP["G1"], OP["G2"], OP["G5"], OP["COMMENT"]
+                            , OP["UP"], OP["PAUSE"], OP["OTHER"]]
+    assert coords[3, WORD_IDX["X"]] == 3.5 and np.isnan(coords[3, WORD_IDX["Y"]])
+    assert side == {0: "# Comment", 6: "", 9: "M5"}
+    assert "\n".join(format_gcode(ops, coords, side)) == text
+    assert GCode(text).commandstr == text
+
+
+def test_concatenate_equals_parsing_the_joined_text():
+    parts = ["G0 X1 Y1", GCode(PEN["DOWN"] + "\nG1 X2 Y2"), "# Comment", GCode("G0 Z7\nG1 Y3")]
+    joined = GCode.concatenate(parts)
+    expected = GCode("\n".join(part if isinstance(part, str) else part.commandstr for part in parts))
+    np.testing.assert_array_equal(joined._arrays()[0], expected._arrays()[0])
+    np.testing.assert_array_equal(joined._arrays()[1], expected._arrays()[1])
+    assert joined._text == expected._text
+
+
+def test_translate_and_rotate_change_moves_only():
+    gcode = GCode("G0 X1 Y0\nG0 Z9\nG2 X0 Y1 I-1 J0\n# Comment")
+    translated = gcode.translate((2, 3))
+    assert translated.commandstr == "G0 X3.0 Y3.0\nG0 Z9\nG2 X2.0 Y4.0 I-1.0 J0.0\n# Comment"
+    rotated = gcode.rotate(90)
+    _, coords = rotated._arrays()
+    np.testing.assert_allclose(coords[[0, 2]][:, :4], [[0, 1, np.nan, np.nan], [-1, 0, 0, -1]], atol=1e-12)
+    # The original is unchanged.
+    assert gcode.commandstr == "G0 X1 Y0\nG0 Z9\nG2 X0 Y1 I-1 J0\n# Comment"
+
+
+def test_pen_states_count_z_only_lines():
+    ops, _, text = parse_gcode("G0 Z7\nG1 X1 Y1\nG0 Z0\nG0 X2\nG0 Z9")
+    down, commands = pen_states(ops, text)
+    assert commands.tolist() == [1, -1, 0, -1, 1]
+    assert down.tolist() == [True, True, False, False, True]
+
+
+def test_clean_removes_repeated_z_only_pen_commands():
+    gcode = GCode("G0 Z0\nG0 X1.0 Y1.0\nG0 Z7\nG1 X2.0 Y2.0\nG0 Z7\nG1 X3.0 Y3.0\nG0 Z0\nG0 Z0")
+    gcode.clean()
+    assert gcode.get_lines() == ["G0 Z0", "G0 X1.0 Y1.0", "G0 Z7", "G1 X2.0 Y2.0", "# G0 Z7 CLEANED", "G1 X3.0 Y3.0"
+                                 , "G0 Z0", "# G0 Z0 CLEANED"]
+
+
+def test_unknown_words_warn_for_motion_lines():
+    with pytest.warns(UserWarning, match="G1 X1 Y1 Z3"):
+        gcode = GCode("G1 X1 Y1 Z3")
+    assert gcode._arrays()[0].tolist() == [OP["OTHER"]]
+    assert gcode.translate((1, 1)).commandstr == "G1 X1 Y1 Z3"
+    with pytest.warns(UserWarning, match="S1000"):
+        GCode("G1 X1 S1000")
+
+
+def test_pen_and_other_lines_do_not_warn(recwarn):
+    GCode("G0 Z7\nM3 S1000\nG0 Z0\nG28")
+    assert len(recwarn) == 0
+
+
+def test_equality_ignores_comments():
+    assert GCode("# A\nG0 X1 Y2\nG0 Z9") == GCode("G0 X1.0 Y2\n\nG0 Z9")
+    assert GCode("G0 X1 Y2") != GCode("G0 X1 Y2.5")
+
+
+def test_convert_round_trips_through_text(make_text2font):
+    gcode = make_text2font().convert("Hello there, friend.")
+    assert GCode(gcode.commandstr).commandstr == gcode.commandstr
+    assert GCode(gcode.commandstr) == gcode
+
+
+def _forced(gcode: GCode) -> GCode:
+    # Applies a pending transform.
+    gcode._arrays()
+    return gcode
+
+
+def test_composed_transforms_equal_stepwise_transforms():
+    gcode = GCode("G0 X1 Y0\nG0 Z9\nG1 X2\nG5 X3 Y1 I0.5 J0.5 P-0.5 Q0\nG2 X4 Y1 I0.5 J0\nG0 Z0")
+    lazy = gcode.translate((1, 2)).rotate(30).scale(2).invert_coordinate(0).translate((-3, 5))
+    stepwise = _forced(_forced(_forced(_forced(gcode.translate((1, 2))).rotate(30)).scale(2)).invert_coordinate(0))
+    stepwise = stepwise.translate((-3, 5))
+    np.testing.assert_allclose(lazy._arrays()[1], stepwise._arrays()[1], equal_nan=True)
+
+
+def test_transform_is_lazy_and_shares_the_arrays():
+    gcode = GCode("G0 X1 Y0\nG1 X2 Y3")
+    translated = gcode.translate((1, 1))
+    assert np.shares_memory(translated._coords, gcode._coords)
+    assert translated.commandstr == "G0 X2.0 Y1.0\nG1 X3.0 Y4.0"
+    assert gcode.commandstr == "G0 X1 Y0\nG1 X2 Y3"
+
+
+def test_missing_coordinates_stay_missing_without_rotation():
+    gcode = GCode("G0 X1 Y0\nG1 X2").translate((1, 1)).scale(2)
+    assert gcode.commandstr == "G0 X4.0 Y2.0\nG1 X6.0"
+    # A rotation mixes X and Y, so the missing Y is carried over from the previous move.
+    np.testing.assert_allclose(GCode("G0 X1 Y0\nG1 X2").rotate(90)._arrays()[1][1, :2], [0, 2], atol=1e-12)
+
+
+def test_invert_coordinate_mirrors_relative_vectors():
+    gcode = GCode("G5 X1 Y2 I0.1 J0.2 P0.3 Q0.4")
+    assert gcode.invert_coordinate(0).commandstr == "G5 X-1.0 Y2.0 I-0.1 J0.2 P-0.3 Q0.4"
+    assert gcode.invert_coordinate(1).commandstr == "G5 X1.0 Y-2.0 I0.1 J-0.2 P0.3 Q-0.4"
+
+
+def test_character_resize_scales_glyph_and_metrics():
+    from sound2font.writemodule import Character
+    character = Character(GCode("G0 X0 Y0\nG0 Z9\nG1 X0.5 Y1\nG0 Z0"))
+    character.resize(4)
+    assert character.gcode.commandstr == "G0 X0.0 Y0.0\nG0 Z9\nG1 X2.0 Y4.0\nG0 Z0"
+    assert character.width == pytest.approx(2)
+    assert character.final_position == pytest.approx((2, 4))
+
+
+CLEAN_INPUT = "G0 X1.0 Y1.0\nG0 X2.0\n# c\nG0 Y3.0\nG0 Z9\nG1 X4.0 Y4.0\nG0 Z9\nG0 Z0\nG0 X5.0 Y5.0\nG0 Y6.0"
+
+
+def test_clean_merges_g0_runs_and_repeated_pen_commands():
+    gcode = GCode(CLEAN_INPUT)
+    gcode.clean()
+    assert gcode.get_lines() == ["# G0 X1.0 Y1.0 CLEANED", "# G0 X2.0 CLEANED", "# c", "G0 X2.0 Y3.0", "G0 Z9"
+                                 , "G1 X4.0 Y4.0", "# G0 Z9 CLEANED", "G0 Z0", "# G0 X5.0 Y5.0 CLEANED", "G0 X5.0 Y6.0"]
+
+
+def test_clean_remove_drops_the_cleaned_lines():
+    commented, removed = GCode(CLEAN_INPUT), GCode(CLEAN_INPUT)
+    commented.clean()
+    removed.clean(remove=True)
+    assert removed.get_lines() == [line for line in commented.get_lines() if not line.endswith(" CLEANED")]
+
+
+def test_convert_remove_cleaned(make_text2font, sample_text):
+    commented = make_text2font().convert(sample_text)
+    removed = make_text2font().convert(sample_text, remove_cleaned=True)
+    assert removed.pure_code_str() == commented.pure_code_str()
+    assert len(removed) < len(commented)
+
+
+@pytest.fixture
+def connected_alphabet():
+    import os
+    from conftest import ALPHABETS
+    from sound2font.writemodule import Alphabet
+    return Alphabet.load_from_string_dict(os.path.join(ALPHABETS, "connected.json"))
+
+
+def test_alphabet_connect_caches_pairs(connected_alphabet):
+    symbols = connected_alphabet.symbols
+    pair = connected_alphabet.connect("a", "b")
+    assert connected_alphabet.connect("a", "b") is pair
+    assert pair == symbols["b"].connect([0, symbols["a"].final_position[1]], symbols["a"].final_angle)
+
+
+def test_alphabet_pair_cache_is_bounded_and_reset_by_resize(connected_alphabet):
+    connected_alphabet.max_pairs = 2
+    first = connected_alphabet.connect("a", "b")
+    connected_alphabet.connect("b", "c")
+    connected_alphabet.connect("a", "b")  # Most recently used.
+    connected_alphabet.connect("c", "d")
+    assert list(connected_alphabet._pairs) == [("a", "b"), ("c", "d")]
+    connected_alphabet.resize(2)
+    assert len(connected_alphabet._pairs) == 0
+    assert connected_alphabet.connect("a", "b") is not first
+
+
+def _polyline_distance(points: np.ndarray, polyline: np.ndarray) -> np.ndarray:
+    # Distance of every point to the closest segment of the polyline.
+    a, b = polyline[:-1], polyline[1:]
+    ab = b - a
+    t = np.clip(np.einsum("pkd,kd->pk", points[:, None] - a[None], ab) / np.maximum((ab ** 2).sum(axis=1), 1e-300), 0, 1)
+    closest = a[None] + t[..., None] * ab[None]
+    return np.linalg.norm(points[:, None] - closest, axis=2).min(axis=1)
+
+
+@pytest.mark.parametrize("tolerance", [0.1, 0.01, 0.001])
+def test_flatten_beziers_within_tolerance(tolerance):
+    from sound2font.writemodule import flatten_beziers
+    start, p12, p43, end = np.array([[0., 0]]), np.array([[1., 3]]), np.array([[-2., 2]]), np.array([[5., 0]])
+    points, counts = flatten_beziers(start, p12, p43, end, tolerance=tolerance)
+    assert counts.tolist() == [len(points)]
+    np.testing.assert_array_equal(points[-1], end[0])
+    t = np.linspace(0, 1, 2001)[:, None]
+    P = [start[0], start[0] + p12[0], end[0] + p43[0], end[0]]
+    exact = (1 - t)**3 * P[0] + 3 * (1 - t)**2 * t * P[1] + 3 * (1 - t) * t**2 * P[2] + t**3 * P[3]
+    assert _polyline_distance(exact, np.vstack([start, points])).max() <= tolerance
+
+
+@pytest.mark.parametrize("clockwise", [True, False])
+def test_flatten_arcs_within_tolerance(clockwise):
+    from sound2font.writemodule import flatten_arcs
+    tolerance = 0.01
+    start, center, end = np.array([[3., 0]]), np.array([[0., 0]]), np.array([[0., 3]])
+    points, _ = flatten_arcs(start, center, end, np.array([clockwise]), tolerance=tolerance)
+    np.testing.assert_array_equal(points[-1], end[0])
+    np.testing.assert_allclose(np.linalg.norm(points, axis=1), 3)
+    # Counterclockwise is a quarter circle, clockwise three quarters.
+    theta = np.linspace(0, -1.5 * np.pi if clockwise else 0.5 * np.pi, 2001)
+    exact = 3 * np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    assert _polyline_distance(exact, np.vstack([start, points])).max() <= tolerance
+
+
+def test_flatten_arcs_closed_arc_is_a_full_circle():
+    from sound2font.writemodule import flatten_arcs
+    points, _ = flatten_arcs(np.array([[1., 0]]), np.array([[0., 0]]), np.array([[1., 0]]), np.array([False]))
+    assert points[:, 1].max() == pytest.approx(1, abs=0.01) and points[:, 1].min() == pytest.approx(-1, abs=0.01)
+
+
+def test_curves2g1_keeps_end_points_and_feed_rate():
+    gcode = GCode("G0 X0 Y0\nG0 Z9\nG5 X5 Y0 I1 J3 P-2 Q2 F500\nG2 X7 Y2 I2 J0\nG1 X8 Y2\nG0 Z0")
+    flat = gcode.curves2g1(tolerance=0.01)
+    ops, coords = flat._arrays()
+    assert not np.isin(ops, [OP["G2"], OP["G3"], OP["G5"]]).any()
+    g1 = np.flatnonzero(ops == OP["G1"])
+    np.testing.assert_allclose(flat._positions()[g1[-1]], [8, 2])
+    assert [7, 2] in flat._positions()[g1].tolist()
+    # The Bezier rows keep their feed rate.
+    assert np.any(coords[g1, WORD_IDX["F"]] == 500)
+
+
+def test_compiled_alphabet_round_trip(tmp_path, connected):
+    import os
+    from conftest import ALPHABETS
+    from sound2font.writemodule import Alphabet
+    source = os.path.join(ALPHABETS, "connected.json" if connected else "disconnected.json")
+    alphabet = Alphabet.load_from_string_dict(source)
+    path = str(tmp_path / "alphabet.bin")
+    alphabet.compile(path)
+    opened = Alphabet.open(path)
+    assert sorted(opened.symbols) == sorted(alphabet.symbols)
+    for char, symbol in alphabet.symbols.items():
+        compiled = opened.symbols[char]
+        assert compiled.gcode == symbol.gcode
+        assert compiled.width == symbol.width
+        assert compiled.final_position == symbol.final_position
+        assert compiled.final_angle == symbol.final_angle
+    # Alphabet.load() reads both formats.
+    assert Alphabet.load(path).symbols["a"].gcode == alphabet.symbols["a"].gcode
+    assert Alphabet.load(source).symbols["a"].gcode == alphabet.symbols["a"].gcode
+
+
+def test_text2font_with_compiled_alphabet(tmp_path, make_text2font, sample_text):
+    from sound2font.writemodule import Alphabet
+    text2font = make_text2font()
+    path = str(tmp_path / "alphabet.bin")
+    Alphabet.load_from_string_dict(text2font.font_path).compile(path)
+    compiled = make_text2font(font_path=path, string_alphabet=False)
+    assert compiled.convert(sample_text).commandstr == text2font.convert(sample_text).commandstr
+
+
+def test_compactor_format_number():
+    from sound2font.writemodule import GCodeCompactor
+    compactor = GCodeCompactor(precision=3)
+    assert [compactor.format_number(value) for value in [1.2, 3., -0.0001, 2.00049, -1.5]] == ["1.2", "3", "0", "2", "-1.5"]
+    assert GCodeCompactor(precision=0).format_number(2.6) == "3"
+
+
+def test_compactor_modal_elision_and_feed_rate():
+    from sound2font.writemodule import GCodeCompactor
+    gcode = GCode("# Comment\nG0 X1.0000 Y2.0\nG0 Z9\nG1 X3.0 Y2.0 F500\nG1 X3.0 Y2.0\nG1 X3.0 Y5.0 F500\n"
+                  "G2 X4.0 Y6.0 I1.0 J0.0\nG1 X4.0 Y7.0 F800\nG0 Z0\nM7")
+    assert GCodeCompactor().feed(gcode) == ["G0 X1 Y2", "G0 Z9", "G1 X3 F500", "Y5", "G2 X4 Y6 I1 J0"
+                                            , "G1 Y7 F800", "G0 Z0", "M7"]
+    # Without modal elision, every move has its opcode and both axes, and GCode() parses the lines back.
+    # The G1 that goes nowhere is merged into the next one.
+    lines = GCodeCompactor(modal=False).feed(gcode)
+    assert lines[:5] == ["G0 X1 Y2", "G0 Z9", "G1 X3 Y2 F500", "G1 X3 Y5", "G2 X4 Y6 I1 J0"]
+    parsed, expected = GCode("\n".join(lines)), GCode(gcode.pure_code_str().replace("G1 X3.0 Y2.0\n", ""))
+    assert parsed._arrays()[0].tolist() == expected._arrays()[0].tolist()
+    np.testing.assert_allclose(parsed._positions(), expected._positions())
+
+
+def test_compactor_merges_g1_within_tolerance():
+    from sound2font.writemodule import GCodeCompactor
+    # A straight line in steps, then a zig-zag, which is further off the line than the tolerance.
+    straight = "\n".join(f"G1 X{x} Y{x / 2 + 1e-4 * (x % 2)}" for x in range(1, 11))
+    zigzag = "\n".join(f"G1 X{x} Y{5 + 0.1 * (x % 2)}" for x in range(11, 15))
+    lines = GCodeCompactor(precision=3).feed(GCode("G0 X0 Y0\nG0 Z9\n" + straight + "\n" + zigzag))
+    assert lines == ["G0 X0 Y0", "G0 Z9", "G1 X10 Y5", "X11 Y5.1", "X12 Y5", "X13 Y5.1", "X14 Y5"]
+    # A path that goes back is not merged, even though it stays on the line.
+    assert GCodeCompactor().feed(GCode("G1 X2 Y0\nG1 X1 Y0\nG1 X3 Y0")) == ["G1 X2 Y0", "X1", "X3"]
+    # A larger tolerance merges the zig-zag as well.
+    assert GCodeCompactor(tolerance=0.11).feed(GCode("G0 X10 Y5\n" + zigzag)) == ["G0 X10 Y5", "G1 X14"]
+
+
+def test_compactor_blocks_equal_whole(make_text2font, sample_text):
+    import io
+    from sound2font.writemodule import GCodeCompactor
+    gcode = make_text2font().convert(sample_text).add_feed_rate(1000)
+    compacted = gcode.pure_code_str(precision=3)
+    assert len(compacted) < len(gcode.pure_code_str()) / 1.5
+    stream = io.StringIO()
+    make_text2font().write(sample_text, stream, feed_rate=1000, precision=3)
+    assert stream.getvalue() == compacted
+    # The state carries over between blocks.
+    compactor = GCodeCompactor()
+    blocks = list(make_text2font().convert_iter(sample_text, feed_rate=1000))
+    assert "\n".join(line for block in blocks for line in compactor.feed(block)) == compacted
+    # Parsed back, every point is within the rounding error of a point of the original.
+    positions = GCode(gcode.pure_code_str(precision=3, modal=False))._positions()
+    original = gcode._positions()
+    distances = np.abs(positions[:, None, :] - original[None, :, :]).max(axis=2).min(axis=1)
+    assert distances.max() <= 0.0005 + 1e-9
+
+
+def test_pure_code_str_default_is_unchanged(make_text2font, sample_text):
+    gcode = make_text2font().convert(sample_text)
+    assert gcode.pure_code_str() == "\n".join(line for line in gcode.commandstr.split("\n")
+                                              if line.strip() and not line.startswith("#"))